@@ -2,4 +2,5 @@ from .settings import settings
 from .logger import logger
 from .security import create_token, get_current_user, TokenData
 from .websocket_manager import manager
-from .mqtt_client import mqtt_client
\ No newline at end of file
+from .mqtt_client import mqtt_client
+from .redis_pubsub import pubsub_listener
\ No newline at end of file
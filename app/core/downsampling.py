@@ -0,0 +1,52 @@
+# app/core/downsampling.py
+
+from typing import Sequence
+
+import numpy as np
+
+
+def lttb(samples: Sequence, threshold: int) -> list[tuple[int, float]]:
+    """
+    Largest-Triangle-Three-Buckets: reduce una serie [(ts_ms, valor), ...] a
+    `threshold` puntos conservando su forma (picos y valles) para graficar.
+
+    Siempre conserva el primer y el último punto. De cada bucket intermedio
+    elige el punto que forma el triángulo de mayor área con el punto elegido
+    en el bucket anterior y el promedio del bucket siguiente.
+
+    Si la serie ya tiene `threshold` puntos o menos se retorna sin cambios.
+    """
+    n = len(samples)
+    if threshold >= n or threshold < 3:
+        return [(int(ts), float(value)) for ts, value in samples]
+
+    t = np.fromiter((sample[0] for sample in samples), dtype=np.float64, count=n)
+    v = np.fromiter((sample[1] for sample in samples), dtype=np.float64, count=n)
+    t -= t[0]  # Números chicos en el cálculo de áreas
+
+    # Bucket i (de threshold - 2) = [edges[i], edges[i + 1]); el primer y
+    # último punto van en buckets propios
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Promedio del bucket siguiente (el último bucket usa el punto final)
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_t = t[next_start:next_end].mean()
+        avg_v = v[next_start:next_end].mean()
+
+        # Área (×2) del triángulo (a, candidato, promedio siguiente)
+        areas = np.abs(
+            (t[a] - avg_t) * (v[start:end] - v[a])
+            - (t[a] - t[start:end]) * (avg_v - v[a])
+        )
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+
+    return [(int(samples[i][0]), float(samples[i][1])) for i in selected.tolist()]
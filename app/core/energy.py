@@ -0,0 +1,145 @@
+# app/core/energy.py
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Dict, Sequence
+
+import numpy as np
+
+# Hueco máximo entre lecturas: si se supera, el dispositivo estuvo apagado o
+# desconectado y ese intervalo no suma energía
+MAX_GAP_SECONDS = 60.0
+
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+WATT_SECONDS_PER_KWH = 3_600_000.0
+
+
+@dataclass
+class EnergyResult:
+    """Energía integrada de una serie de potencia: total y desglose por día / hora (UTC)."""
+    total_kwh: float = 0.0
+    daily_kwh: Dict[date, float] = field(default_factory=dict)
+    hourly_kwh: Dict[datetime, float] = field(default_factory=dict)
+
+    def merge(self, other: "EnergyResult") -> "EnergyResult":
+        """Suma otro resultado (ej. otro dispositivo del mismo usuario)."""
+        self.total_kwh += other.total_kwh
+        for day, kwh in other.daily_kwh.items():
+            self.daily_kwh[day] = self.daily_kwh.get(day, 0.0) + kwh
+        for hour, kwh in other.hourly_kwh.items():
+            self.hourly_kwh[hour] = self.hourly_kwh.get(hour, 0.0) + kwh
+        return self
+
+
+def samples_to_arrays(samples: Sequence) -> tuple[np.ndarray, np.ndarray]:
+    """Convierte la respuesta de TS.RANGE ([[ts_ms, valor], ...]) en (timestamps, watts)."""
+    # np.fromiter por columna es bastante más rápido que np.asarray sobre la lista de pares
+    count = len(samples)
+    timestamps = np.fromiter((sample[0] for sample in samples), dtype=np.int64, count=count)
+    watts = np.fromiter((sample[1] for sample in samples), dtype=np.float64, count=count)
+    return timestamps, watts
+
+
+def _bins(
+    start_ms: np.ndarray, watt_seconds: np.ndarray, bin_ms: int,
+    from_ms: int | None = None, to_ms: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Suma los Ws de cada intervalo en el bin (día / hora UTC) de su inicio.
+
+    Devuelve todos los bins entre el primero y el último, incluidos los de 0 kWh,
+    extendidos a [from_ms, to_ms) si se indica.
+    """
+    edges = [int(start_ms[0]), int(start_ms[-1])] if start_ms.size else []
+    if from_ms is not None and (to_ms is None or to_ms > from_ms):
+        edges.append(from_ms)
+    if to_ms is not None and (from_ms is None or to_ms > from_ms):
+        edges.append(to_ms - 1)
+    if not edges:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    first, last = min(edges) // bin_ms, max(edges) // bin_ms
+    sums = np.bincount(start_ms // bin_ms - first, weights=watt_seconds, minlength=last - first + 1)
+    return (np.arange(sums.size, dtype=np.int64) + first) * bin_ms, sums / WATT_SECONDS_PER_KWH
+
+
+def integrate_energy(
+    timestamps_ms, watts, max_gap_seconds: float = MAX_GAP_SECONDS,
+    daily: bool = True, hourly: bool = False,
+    from_ms: int | None = None, to_ms: int | None = None
+) -> EnergyResult:
+    """
+    Integra potencia → energía (trapecio) en una sola pasada vectorizada.
+
+    - timestamps_ms / watts: arreglos (o listas) ordenados por tiempo.
+    - Los intervalos mayores a `max_gap_seconds` no suman (dispositivo apagado).
+    - Cada intervalo se asigna al día / hora UTC de su inicio.
+    - Los desgloses incluyen los días / horas sin consumo (0 kWh) de todo el
+      rango [from_ms, to_ms), aunque no tengan lecturas.
+
+    Equivale al ciclo punto a punto que usaban dashboard y reportes.
+    """
+    t = np.asarray(timestamps_ms, dtype=np.int64)
+    w = np.asarray(watts, dtype=np.float64)
+    result = EnergyResult()
+    if t.size < 2:
+        t, watt_seconds = t[:0], w[:0]
+    else:
+        dt_seconds = np.diff(t) / 1000.0
+        watt_seconds = (w[:-1] + w[1:]) * 0.5 * dt_seconds
+        watt_seconds[dt_seconds > max_gap_seconds] = 0.0
+        t = t[:-1]
+
+    result.total_kwh = float(watt_seconds.sum()) / WATT_SECONDS_PER_KWH
+
+    if daily:
+        starts, kwh = _bins(t, watt_seconds, DAY_MS, from_ms, to_ms)
+        result.daily_kwh = {
+            datetime.fromtimestamp(start / 1000, tz=timezone.utc).date(): value
+            for start, value in zip(starts.tolist(), kwh.tolist())
+        }
+    if hourly:
+        starts, kwh = _bins(t, watt_seconds, HOUR_MS, from_ms, to_ms)
+        result.hourly_kwh = {
+            datetime.fromtimestamp(start / 1000, tz=timezone.utc): value
+            for start, value in zip(starts.tolist(), kwh.tolist())
+        }
+    return result
+
+
+def integrate_samples(samples: Sequence, **kwargs) -> EnergyResult:
+    """integrate_energy() directamente sobre la respuesta de TS.RANGE."""
+    return integrate_energy(*samples_to_arrays(samples), **kwargs)
+
+
+def summarize_day(timestamps_ms, watts, day_start_ms: int, max_gap_seconds: float = MAX_GAP_SECONDS) -> dict:
+    """
+    Resumen de un día UTC de potencia: kWh, pico / mínimo, lecturas y segundos
+    del día sin energía contada (huecos mayores a `max_gap_seconds` o sin datos).
+
+    Las muestras pueden pasar de medianoche: la primera lectura del día
+    siguiente cierra el último intervalo. Como en integrate_energy(), cada
+    intervalo cuenta para el día de su inicio.
+    """
+    t = np.asarray(timestamps_ms, dtype=np.int64)
+    w = np.asarray(watts, dtype=np.float64)
+    in_day = (t >= day_start_ms) & (t < day_start_ms + DAY_MS)
+    count = int(in_day.sum())
+
+    summary = {
+        "kwh": 0.0,
+        "peak_watts": float(w[in_day].max()) if count else None,
+        "min_watts": float(w[in_day].min()) if count else None,
+        "sample_count": count,
+        "gap_seconds": DAY_MS // 1000,
+    }
+    if t.size < 2:
+        return summary
+
+    dt_seconds = np.diff(t) / 1000.0
+    counted = in_day[:-1] & (dt_seconds <= max_gap_seconds)
+    watt_seconds = (w[:-1] + w[1:]) * 0.5 * dt_seconds
+    summary["kwh"] = float(watt_seconds[counted].sum()) / WATT_SECONDS_PER_KWH
+    summary["gap_seconds"] = max(0, round(DAY_MS / 1000 - float(dt_seconds[counted].sum())))
+    return summary
@@ -0,0 +1,34 @@
+# app/core/http_cache.py
+
+import hashlib
+import json
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Compara If-None-Match (lista separada por comas, W/ opcional o "*") con el ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def etag_response(request: Request, content, max_age: int) -> Response:
+    """
+    Respuesta JSON con ETag (hash del cuerpo) y Cache-Control privado.
+
+    Si el cliente manda If-None-Match con el mismo ETag responde 304 sin cuerpo:
+    la app vuelve a pedir la gráfica y, si nada cambió, no se transfiere nada.
+    """
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}",
+        "Vary": "Authorization",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
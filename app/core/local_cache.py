@@ -0,0 +1,60 @@
+# app/core/local_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LocalTTLCache:
+    """
+    Cache en memoria del proceso (por worker) con expulsión LRU y TTL.
+
+    - max_size: número máximo de entradas; al excederlo se expulsa la menos usada.
+    - ttl_seconds: vida de cada entrada; al expirar se trata como MISS.
+
+    Thread-safe: los endpoints síncronos de FastAPI corren en un threadpool.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any = True):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
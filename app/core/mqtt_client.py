@@ -4,21 +4,48 @@ import paho.mqtt.client as mqtt
 import json
 import uuid
 import asyncio
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
 from app.core import logger
 from app.core.settings import settings
 
 # Topic único donde el backend escuchará TODAS las respuestas
 BACKEND_RESPONSE_TOPIC = "ecowatt/backend/rpc_response"
 
+# Telemetría: los Shelly Gen2/3 publican NotifyStatus en {prefix}-{mac}/events/rpc
+TELEMETRY_TOPIC = "+/events/rpc"
+TELEMETRY_DROP_LOG_INTERVAL_SECONDS = 60
+
 class MQTTClient:
     def __init__(self):
         self.client: Optional[mqtt.Client] = None
         self.is_connected = False
         self.pending_responses: Dict[int, asyncio.Future] = {}
-        
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.telemetry_handler: Optional[Callable] = None
+        self.telemetry_subscription: Optional[str] = None
+        # Acota los frames de telemetría en proceso: sin esto una ráfaga acumula
+        # corutinas sin límite en el event loop
+        self._telemetry_slots = threading.BoundedSemaphore(settings.INGEST_MQTT_MAX_INFLIGHT)
+        self._telemetry_dropped = 0
+        self._last_drop_log = 0.0
+
+    def enable_telemetry(self, handler: Callable, share_group: str):
+        """
+        Activa la ingesta de telemetría por MQTT (llamar antes de start()).
+
+        Usa una suscripción compartida ($share/{grupo}/...): el broker reparte
+        cada mensaje a UN solo worker del grupo en lugar de a todos.
+        `handler(topic, payload)` es una corutina que se ejecuta en el event loop.
+        """
+        self.telemetry_handler = handler
+        self.telemetry_subscription = f"$share/{share_group}/{TELEMETRY_TOPIC}"
+
     def start(self):
         try:
+            # paho corre en su propio hilo; guardamos el loop para despachar corutinas
+            self.loop = asyncio.get_running_loop()
             unique_id = f"ecowatt_core_{uuid.uuid4().hex[:8]}"
             self.client = mqtt.Client(client_id=unique_id, clean_session=True)
             
@@ -55,6 +82,10 @@ class MQTTClient:
             # Nos suscribimos SOLAMENTE a nuestro canal de retorno
             client.subscribe(BACKEND_RESPONSE_TOPIC)
             logger.info(f"✅ Conectado a MQTT. Escuchando en: {BACKEND_RESPONSE_TOPIC}")
+
+            if self.telemetry_subscription:
+                client.subscribe(self.telemetry_subscription, qos=0)
+                logger.info(f"📶 Telemetría MQTT activa: {self.telemetry_subscription}")
         else:
             logger.error(f"❌ Fallo conexión MQTT, código: {rc}")
 
@@ -65,6 +96,11 @@ class MQTTClient:
     def _on_message(self, client, userdata, msg):
         try:
             payload = json.loads(msg.payload.decode())
+
+            if self.telemetry_handler and mqtt.topic_matches_sub(TELEMETRY_TOPIC, msg.topic):
+                self._dispatch_telemetry(msg.topic, payload)
+                return
+
             request_id = payload.get('id')
             
             if request_id in self.pending_responses:
@@ -75,6 +111,37 @@ class MQTTClient:
         except Exception as e:
             logger.error(f"Error procesando mensaje MQTT: {e}")
 
+    def _dispatch_telemetry(self, topic: str, payload: Dict):
+        """
+        Pasa el mensaje del hilo de paho al event loop de la API.
+
+        Con INGEST_MQTT_MAX_INFLIGHT frames ya en proceso, el frame se descarta
+        (sin bloquear el hilo de paho, que también entrega las respuestas RPC).
+        """
+        if not self.loop or self.loop.is_closed():
+            return
+        if not self._telemetry_slots.acquire(blocking=False):
+            self._telemetry_dropped += 1
+            now = time.monotonic()
+            if now - self._last_drop_log >= TELEMETRY_DROP_LOG_INTERVAL_SECONDS:
+                self._last_drop_log = now
+                logger.warning(f"⚠️ Telemetría MQTT saturada: {self._telemetry_dropped} frames descartados")
+            return
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.telemetry_handler(topic, payload), self.loop)
+        except Exception:
+            self._telemetry_slots.release()
+            raise
+        future.add_done_callback(self._telemetry_done)
+
+    def _telemetry_done(self, future):
+        self._telemetry_slots.release()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error:
+            logger.error(f"❌ Error procesando telemetría MQTT: {error}")
+
     async def publish_command_async(
         self, 
         device_mac: str, 
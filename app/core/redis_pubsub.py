@@ -0,0 +1,87 @@
+# app/core/redis_pubsub.py
+
+import asyncio
+from typing import Callable, Dict, List, Optional
+from app.core.logger import logger
+
+RECONNECT_DELAY_SECONDS = 2
+
+
+class RedisPubSubListener:
+    """
+    Escucha canales de Redis Pub/Sub en cada worker y despacha los mensajes.
+
+    Sirve para mensajes entre workers (ej. invalidar caches en memoria).
+    Los handlers reciben el payload (str) y pueden ser funciones o corutinas.
+    `on_reset` se llama tras una reconexión: los mensajes perdidos mientras
+    no había conexión no se recuperan, así que el cache debe vaciarse.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable] = {}
+        self._reset_callbacks: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: Callable, on_reset: Optional[Callable] = None):
+        self._handlers[channel] = handler
+        if on_reset:
+            self._reset_callbacks.append(on_reset)
+
+    def start(self, redis_client):
+        if self._task or not self._handlers:
+            return
+        self._task = asyncio.create_task(self._run(redis_client))
+        logger.info(f"📻 Pub/Sub iniciado: {', '.join(self._handlers)}")
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, redis_client):
+        reconnecting = False
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*self._handlers)
+
+                if reconnecting:
+                    logger.info("📻 Pub/Sub reconectado, reiniciando caches locales")
+                    for callback in self._reset_callbacks:
+                        callback()
+                    reconnecting = False
+
+                async for message in pubsub.listen():
+                    handler = self._handlers.get(message["channel"])
+                    if not handler:
+                        continue
+                    try:
+                        result = handler(message["data"])
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as e:
+                        logger.error(f"❌ Error en handler Pub/Sub ({message['channel']}): {e}")
+
+                # La conexión se cerró sin excepción: volver a suscribirse
+                reconnecting = True
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Pub/Sub desconectado: {e}")
+                reconnecting = True
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+# Instancia global (una por worker)
+pubsub_listener = RedisPubSubListener()
@@ -1,3 +1,6 @@
+import os
+
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -19,8 +22,46 @@ class Settings(BaseSettings):
     MQTT_SHELLY_USER: str
     MQTT_SHELLY_PASS: str
 
+    # --- Ingesta: buffer write-behind por worker ---
+    INGEST_BUFFER_ENABLED: bool = True
+    INGEST_BUFFER_WINDOW_MS: int = 50        # Ventana máxima antes de escribir
+    INGEST_BUFFER_MAX_BATCH: int = 500       # Lecturas que disparan un flush inmediato
+    INGEST_BUFFER_MAX_PENDING: int = 10000   # Tope de memoria (lecturas en espera)
+
+    # --- Ingesta: script Lua en Redis (búsqueda + TS.MADD + publish en un round trip) ---
+    INGEST_REDIS_SCRIPT_ENABLED: bool = False
+
+    # --- Ingesta: hora del dispositivo ---
+    INGEST_MAX_CLOCK_SKEW_SECONDS: int = 120     # Adelanto tolerado del reloj del Shelly
+    INGEST_MAX_LATE_SECONDS: int = 604800        # Antigüedad máxima de una lectura atrasada (7 días)
+
+    # --- Ingesta: canales (se pueden tener ambos activos durante la migración) ---
+    INGEST_HTTP_ENABLED: bool = True                    # POST /ingest/shelly[/batch]
+    INGEST_MQTT_ENABLED: bool = False                   # NotifyStatus en +/events/rpc
+    INGEST_MQTT_SHARE_GROUP: str = "ecowatt_ingest"     # Grupo de la suscripción compartida
+    INGEST_MQTT_MAX_INFLIGHT: int = 200                 # Frames en proceso por worker; el resto se descarta
+
+    # --- Historial: cache de buckets cerrados y cache HTTP ---
+    HISTORY_CACHE_SETTLE_SECONDS: int = 300     # Un bucket se cachea 5 min después de cerrar
+    HISTORY_HTTP_MAX_AGE_SECONDS: int = 30      # Cache-Control de /history/*
+
+    # --- Reportes mensuales: usuarios por tarea de Celery (día 1 de cada mes) ---
+    REPORTS_SHARD_SIZE: int = 25
+    REPORT_DAY_CACHE_SETTLE_SECONDS: int = 900  # Un día cerrado se cachea 15 min después de medianoche
+
+    # --- Archivo frío de lecturas crudas (más allá de los 30 días de Redis) ---
+    # Ruta absoluta: el worker de Celery la escribe y la API la lee, así que no
+    # puede depender del directorio de trabajo de cada proceso
+    ARCHIVE_DIR: str = "/var/lib/ecowatt/archive"
 
     model_config = {"env_file":".env"}
 
+    @field_validator("ARCHIVE_DIR")
+    @classmethod
+    def _archive_dir_absolute(cls, value: str) -> str:
+        if not os.path.isabs(value):
+            raise ValueError(f"ARCHIVE_DIR debe ser una ruta absoluta (recibido: {value!r})")
+        return value
+
 
 settings = Settings()
@@ -1 +1 @@
-from .database import Base, get_db, get_redis_client, SessionLocal
\ No newline at end of file
+from .database import Base, get_db, get_redis_client, get_async_redis_client, SessionLocal
\ No newline at end of file
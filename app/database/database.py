@@ -4,6 +4,7 @@ from app.core import settings
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 import redis
+import redis.asyncio as aioredis
 from app.core import logger
 
 # --- Configuración de PostgreSQL ---
@@ -43,4 +44,14 @@ except redis.exceptions.ConnectionError as e:
 def get_redis_client():
     if redis_client is None:
         raise ConnectionError("No se pudo establecer la conexión con Redis.")
-    yield redis_client
\ No newline at end of file
+    yield redis_client
+
+
+# --- Cliente Redis asíncrono (redis.asyncio) ---
+# Para rutas async (ingesta) que no deben bloquear el event loop.
+# La conexión se abre de forma perezosa en el primer comando.
+async_redis_client = aioredis.from_url(settings.URL_DATABASE_REDIS, decode_responses=True)
+
+# --- Dependencia para inyectar Redis asíncrono ---
+async def get_async_redis_client():
+    yield async_redis_client
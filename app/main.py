@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-from celery import Celery
+from celery import Celery, chord, group
 from celery.schedules import crontab
 from app.core import settings, logger
 from app.services import analyze_consumption_patterns
@@ -11,6 +11,11 @@ import firebase_admin
 from firebase_admin import credentials
 from contextlib import asynccontextmanager
 from app.core.mqtt_client import mqtt_client
+from app.core.redis_pubsub import pubsub_listener
+from app.database.database import async_redis_client
+from app.services.ingest_buffer import ingest_buffer
+from app.repositories import AsyncIngestScriptRepository
+from app.services.mqtt_ingest_service import process_shelly_mqtt_message
 
 import os
 from datetime import datetime, timezone
@@ -68,6 +73,20 @@ def setup_periodic_tasks(sender, **kwargs):
         name='Generar reportes del mes anterior'
     )
     
+    # Consumo diario materializado (diario, 00:30, al cerrar el día)
+    sender.add_periodic_task(
+        crontab(minute='30', hour='0'),
+        rollup_daily_consumption_job.s(),
+        name='Materializar consumo diario'
+    )
+
+    # Archivar días cerrados de las series crudas (diario, 4 AM)
+    sender.add_periodic_task(
+        crontab(minute='0', hour='4'),
+        archive_closed_days_job.s(),
+        name='Archivar lecturas de días cerrados'
+    )
+
     # Limpiar reportes expirados (domingos, 3 AM)
     sender.add_periodic_task(
         crontab(minute='0', hour='3', day_of_week='0'),
@@ -91,95 +110,138 @@ def run_analysis():
         logger.error(f"--- [CELERY TASK]: Ocurrió un error durante el análisis: {e} ---")
         send_discord_alert(f"Error en análisis de consumo: {e}", level="ERROR")
 
+def _generate_user_report(db, redis_client, report_repo, user_id: int, month: int, year: int) -> str:
+    """Genera y guarda el reporte de un usuario. Retorna el contador que le toca: success / skipped / errors."""
+    from app.services.report_service import _generate_report_from_redis
+
+    try:
+        # Verificar si ya existe
+        existing = report_repo.get_by_month(user_id, month, year)
+        if existing:
+            logger.info(f"⏭️  Usuario {user_id}: Ya existe")
+            return "skipped"
+
+        # Generar reporte
+        logger.info(f"📊 Generando para usuario {user_id}...")
+        report = _generate_report_from_redis(db, redis_client, user_id, month, year)
+
+        if not report:
+            logger.warning(f"⚠️  Usuario {user_id}: Sin datos")
+            return "errors"
+
+        # Guardar
+        saved = report_repo.save(
+            user_id=user_id,
+            month=month,
+            year=year,
+            report_data=report.model_dump(mode='json'),
+            total_kwh=float(report.executive_summary.total_kwh_consumed),
+            total_cost=float(report.executive_summary.total_estimated_cost_mxn)
+        )
+        if not saved:
+            return "errors"
+
+        logger.info(f"✅ Usuario {user_id}: Guardado")
+        return "success"
+
+    except Exception as e:
+        logger.error(f"❌ Error usuario {user_id}: {e}")
+        return "errors"
+
+
 @celery_app.task
 def generate_previous_month_reports():
     """
     🔥 TAREA PRINCIPAL: Se ejecuta el día 1 de cada mes.
-    Genera reportes del mes anterior para todos los usuarios.
+    Reparte los usuarios con dispositivos activos en tareas de
+    REPORTS_SHARD_SIZE usuarios (group) que corren en paralelo en los workers;
+    summarize_monthly_reports junta las estadísticas al terminar (chord).
     """
-    from app.database import SessionLocal, redis_client
-    from app.repositories import DeviceRepository, ReportRepository
-    from app.services.report_service import _generate_report_from_redis
+    from app.database import SessionLocal
+    from app.repositories import DeviceRepository
     from dateutil.relativedelta import relativedelta
-    
+
     logger.info("=" * 70)
     logger.info("🚀 GENERACIÓN AUTOMÁTICA DE REPORTES MENSUALES")
     logger.info("=" * 70)
-    
+
     db = SessionLocal()
-    
+
     try:
         # Calcular mes anterior
         now = datetime.now(timezone.utc)
         prev_month = now - relativedelta(months=1)
         target_month = prev_month.month
         target_year = prev_month.year
-        
+
         logger.info(f"📅 Mes objetivo: {target_month}/{target_year}")
-        
+
         # Obtener usuarios con dispositivos activos
-        device_repo = DeviceRepository(db)
-        devices = device_repo.get_all_active_devices()
-        user_ids = list(set(d.dev_user_id for d in devices))
-        
-        logger.info(f"👥 Usuarios a procesar: {len(user_ids)}")
-        
-        report_repo = ReportRepository(db)
-        stats = {"success": 0, "skipped": 0, "errors": 0}
-        
-        for user_id in user_ids:
-            try:
-                # Verificar si ya existe
-                existing = report_repo.get_by_month(user_id, target_month, target_year)
-                if existing:
-                    logger.info(f"⏭️  Usuario {user_id}: Ya existe")
-                    stats["skipped"] += 1
-                    continue
-                
-                # Generar reporte
-                logger.info(f"📊 Generando para usuario {user_id}...")
-                report = _generate_report_from_redis(db, redis_client, user_id, target_month, target_year)
-                
-                if report:
-                    # Guardar
-                    saved = report_repo.save(
-                        user_id=user_id,
-                        month=target_month,
-                        year=target_year,
-                        report_data=report.model_dump(mode='json'),
-                        total_kwh=float(report.executive_summary.total_kwh_consumed),
-                        total_cost=float(report.executive_summary.total_estimated_cost_mxn)
-                    )
-                    
-                    if saved:
-                        logger.info(f"✅ Usuario {user_id}: Guardado")
-                        stats["success"] += 1
-                    else:
-                        stats["errors"] += 1
-                else:
-                    logger.warning(f"⚠️  Usuario {user_id}: Sin datos")
-                    stats["errors"] += 1
-                    
-            except Exception as e:
-                logger.error(f"❌ Error usuario {user_id}: {e}")
-                stats["errors"] += 1
-        
-        logger.info("=" * 70)
-        logger.info(f"📊 RESUMEN:")
-        logger.info(f"   ✅ Exitosos: {stats['success']}")
-        logger.info(f"   ⏭️  Omitidos: {stats['skipped']}")
-        logger.info(f"   ❌ Errores: {stats['errors']}")
-        logger.info(f"   📋 Total: {len(user_ids)}")
-        logger.info("=" * 70)
-        
-        return stats
-        
+        devices = DeviceRepository(db).get_all_active_devices()
+        user_ids = sorted(set(d.dev_user_id for d in devices))
+
+        if not user_ids:
+            logger.info("👥 Sin usuarios a procesar")
+            return {"success": 0, "skipped": 0, "errors": 0}
+
+        shard_size = max(1, settings.REPORTS_SHARD_SIZE)
+        shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+
+        chord(
+            group(generate_reports_shard.s(shard, target_month, target_year) for shard in shards)
+        )(summarize_monthly_reports.s(target_month, target_year, len(user_ids)))
+
+        logger.info(f"👥 Usuarios a procesar: {len(user_ids)} en {len(shards)} tareas")
+        return {"users": len(user_ids), "shards": len(shards)}
+
     except Exception as e:
         logger.exception(f"❌ Error crítico: {e}")
         return {"error": str(e)}
     finally:
         db.close()
 
+
+@celery_app.task
+def generate_reports_shard(user_ids: list, month: int, year: int) -> dict:
+    """Genera los reportes de un grupo de usuarios con una sola sesión de BD."""
+    from app.database import SessionLocal
+    from app.database.database import redis_client
+    from app.repositories import ReportRepository
+
+    db = SessionLocal()
+    stats = {"success": 0, "skipped": 0, "errors": 0}
+    try:
+        report_repo = ReportRepository(db)
+        for user_id in user_ids:
+            stats[_generate_user_report(db, redis_client, report_repo, user_id, month, year)] += 1
+        return stats
+    finally:
+        db.close()
+
+
+@celery_app.task
+def summarize_monthly_reports(results: list, month: int, year: int, total_users: int) -> dict:
+    """Callback del chord: suma las estadísticas de todas las tareas."""
+    stats = {"success": 0, "skipped": 0, "errors": 0}
+    for result in results:
+        for key in stats:
+            stats[key] += result.get(key, 0)
+
+    logger.info("=" * 70)
+    logger.info(f"📊 RESUMEN {month}/{year}:")
+    logger.info(f"   ✅ Exitosos: {stats['success']}")
+    logger.info(f"   ⏭️  Omitidos: {stats['skipped']}")
+    logger.info(f"   ❌ Errores: {stats['errors']}")
+    logger.info(f"   📋 Total: {total_users}")
+    logger.info("=" * 70)
+
+    if stats["errors"]:
+        send_discord_alert(
+            f"Reportes {month}/{year}: {stats['errors']} errores de {total_users} usuarios",
+            level="WARN"
+        )
+    return stats
+
 @celery_app.task
 def cleanup_expired_reports_job():
     """Elimina reportes con más de 1 año"""
@@ -196,6 +258,38 @@ def cleanup_expired_reports_job():
         db.close()
 
 
+@celery_app.task
+def rollup_daily_consumption_job():
+    """Guarda en tbdailyconsumption los días cerrados (y recalcula los que aún reciben lecturas atrasadas)"""
+    from app.database import SessionLocal
+    from app.database.database import redis_client
+    from app.services.daily_consumption_service import rollup_daily_consumption
+
+    db = SessionLocal()
+    try:
+        return rollup_daily_consumption(db, redis_client)
+    except Exception as e:
+        logger.exception(f"❌ Error materializando consumo diario: {e}")
+        send_discord_alert(f"Error materializando consumo diario: {e}", level="ERROR")
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+
+@celery_app.task
+def archive_closed_days_job():
+    """Copia al archivo frío los días cerrados antes de que expiren en Redis"""
+    from app.database.database import redis_client
+    from app.services.archive_service import archive_closed_days
+
+    try:
+        return archive_closed_days(redis_client)
+    except Exception as e:
+        logger.exception(f"❌ Error archivando lecturas: {e}")
+        send_discord_alert(f"Error archivando lecturas: {e}", level="ERROR")
+        return {"error": str(e)}
+
+
 # --- Configuración de FastAPI ---
 api_description = """
 API para el monitoreo de consumo eléctrico EcoWatt.
@@ -216,13 +310,23 @@ así como un endpoint de WebSocket para la transmisión de datos en tiempo real.
 async def lifespan(app: FastAPI):
     # --- CÓDIGO DE ARRANQUE (Startup) ---
     logger.info("🚀 Iniciando API EcoWatt...")
+    if settings.INGEST_MQTT_ENABLED:
+        mqtt_client.enable_telemetry(process_shelly_mqtt_message, settings.INGEST_MQTT_SHARE_GROUP)
     mqtt_client.start()
+    pubsub_listener.start(async_redis_client)
+    if settings.INGEST_BUFFER_ENABLED:
+        ingest_buffer.start(async_redis_client)
+    if settings.INGEST_REDIS_SCRIPT_ENABLED:
+        await AsyncIngestScriptRepository(async_redis_client).load()
     
     yield  # <-- Aquí es donde la API se queda corriendo y escuchando peticiones
     
     # --- CÓDIGO DE CIERRE (Shutdown) ---
     logger.info("🛑 Deteniendo servicios...")
     mqtt_client.stop()
+    await ingest_buffer.stop()  # Escribe las lecturas pendientes antes de cerrar Redis
+    await pubsub_listener.stop()
+    await async_redis_client.aclose()
 
 
 app = FastAPI(
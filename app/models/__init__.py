@@ -7,4 +7,5 @@ from .alert import Alert
 from .recommendation import Recommendation
 from .refresh_token import RefreshToken 
 from .password_reset_token import PasswordResetToken
-from .fcm_token import FCMToken
\ No newline at end of file
+from .fcm_token import FCMToken
+from .daily_consumption import DailyConsumption
\ No newline at end of file
@@ -1,5 +1,5 @@
 from app.database import Base
-from sqlalchemy import Column, Integer, TIMESTAMP, Boolean, ForeignKey, String, Text
+from sqlalchemy import Column, Integer, TIMESTAMP, Boolean, ForeignKey, Index, String, Text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship 
 
@@ -13,4 +13,9 @@ class Alert(Base):
     ale_is_read =    Column(Boolean, server_default="false")
     ale_created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
-    user = relationship("User", back_populates="alerts")
\ No newline at end of file
+    user = relationship("User", back_populates="alerts")
+
+    __table_args__ = (
+        # Consultas por usuario y rango de fechas (reportes mensuales)
+        Index('idx_alerts_user_created', 'ale_user_id', 'ale_created_at'),
+    )
\ No newline at end of file
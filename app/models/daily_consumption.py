@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, DECIMAL, Date, ForeignKey, TIMESTAMP, UniqueConstraint
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class DailyConsumption(Base):
+    """Consumo de un dispositivo en un día UTC, materializado desde las series crudas."""
+    __tablename__ = "tbdailyconsumption"
+
+    dc_id =           Column(Integer, primary_key=True, index=True)
+    dc_user_id =      Column(Integer, ForeignKey("tbusers.user_id", ondelete="CASCADE"), nullable=False)
+    dc_device_id =    Column(Integer, ForeignKey("tbdevice.dev_id", ondelete="CASCADE"), nullable=False)
+    dc_date =         Column(Date, nullable=False)
+
+    dc_kwh =          Column(DECIMAL(12, 5), nullable=False, server_default="0")
+    dc_peak_watts =   Column(DECIMAL(10, 2))
+    dc_min_watts =    Column(DECIMAL(10, 2))
+    dc_sample_count = Column(Integer, nullable=False, server_default="0")
+    dc_gap_seconds =  Column(Integer, nullable=False, server_default="0")   # Segundos del día sin energía contada
+
+    dc_updated_at =   Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    user = relationship("User", back_populates="daily_consumption")
+
+    __table_args__ = (
+        # También es el índice de las consultas por usuario y rango de fechas
+        UniqueConstraint('dc_user_id', 'dc_date', 'dc_device_id', name='unique_daily_consumption'),
+    )
@@ -1,5 +1,5 @@
 from app.database import Base
-from sqlalchemy import Column, Integer, TIMESTAMP, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, TIMESTAMP, Boolean, ForeignKey, Index, Text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship 
 
@@ -12,4 +12,9 @@ class Recommendation(Base):
     rec_is_read =    Column(Boolean, server_default="false")
     rec_created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
-    user = relationship("User", back_populates="recommendations")
\ No newline at end of file
+    user = relationship("User", back_populates="recommendations")
+
+    __table_args__ = (
+        # Consultas por usuario y rango de fechas (reportes mensuales)
+        Index('idx_recommendations_user_created', 'rec_user_id', 'rec_created_at'),
+    )
\ No newline at end of file
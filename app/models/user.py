@@ -23,4 +23,5 @@ class User(Base):
     recommendations = relationship("Recommendation", back_populates="user", cascade="all, delete-orphan") 
     refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan") 
     fcm_tokens = relationship("FCMToken", back_populates="user", cascade="all, delete-orphan")
+    daily_consumption = relationship("DailyConsumption", back_populates="user", cascade="all, delete-orphan")
 
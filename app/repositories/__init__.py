@@ -3,10 +3,16 @@
 from .user_repository import UserRepository
 from .device_repository import DeviceRepository
 from .report_repository import ReportRepository
+from .daily_consumption_repository import DailyConsumptionRepository
 from .tarrif_repository import TarrifRepository 
 from .alert_repository import AlertRepository 
 from .recommendation_repository import RecommendationRepository 
 from .refresh_token_repository import RefreshTokenRepository 
 from .password_reset_repository import PasswordResetRepository
-from .timeseries_repository import TimeSeriesRepository
+from .timeseries_repository import TimeSeriesRepository, AsyncTimeSeriesRepository
+from .device_cache_repository import DeviceCacheRepository, AsyncDeviceCacheRepository
+from .ingest_script_repository import AsyncIngestScriptRepository
+from .history_cache_repository import HistoryCacheRepository, AsyncHistoryCacheRepository
+from .report_day_cache_repository import ReportDayCacheRepository
+from .archive_repository import ArchiveRepository
 from .fcm_token_repository import FCMTokenRepository
\ No newline at end of file
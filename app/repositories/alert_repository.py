@@ -1,4 +1,6 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from datetime import datetime
 from app.models import Alert
 from app.core import logger
 
@@ -20,4 +22,19 @@ class AlertRepository:
             return None
 
     def get_alerts_by_user(self, user_id: int) -> list[Alert]:
-        return self.db.query(Alert).filter(Alert.ale_user_id == user_id).order_by(Alert.ale_created_at.desc()).all()
\ No newline at end of file
+        return self.db.query(Alert).filter(Alert.ale_user_id == user_id).order_by(Alert.ale_created_at.desc()).all()
+
+    def get_alerts_by_user_between(self, user_id: int, start: datetime, end: datetime) -> list[Alert]:
+        """Alertas del usuario creadas en [start, end] (índice idx_alerts_user_created)"""
+        return (
+            self.db.query(Alert)
+            .filter(
+                and_(
+                    Alert.ale_user_id == user_id,
+                    Alert.ale_created_at >= start,
+                    Alert.ale_created_at <= end
+                )
+            )
+            .order_by(Alert.ale_created_at.desc())
+            .all()
+        )
\ No newline at end of file
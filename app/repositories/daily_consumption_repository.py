@@ -0,0 +1,82 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert
+from app.models import DailyConsumption
+from app.core import logger
+from datetime import date, datetime, timezone
+from typing import Optional, List
+
+class DailyConsumptionRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_range(self, user_id: int, from_date: date, to_date: date, device_ids: Optional[list] = None) -> List[DailyConsumption]:
+        """Filas por dispositivo y día en [from_date, to_date]"""
+        query = self.db.query(DailyConsumption).filter(
+            and_(
+                DailyConsumption.dc_user_id == user_id,
+                DailyConsumption.dc_date >= from_date,
+                DailyConsumption.dc_date <= to_date
+            )
+        )
+        if device_ids is not None:
+            query = query.filter(DailyConsumption.dc_device_id.in_(device_ids))
+        return query.order_by(DailyConsumption.dc_date, DailyConsumption.dc_device_id).all()
+
+    def get_updated_at(self, user_id: int, from_date: date, to_date: date) -> dict[tuple[int, date], datetime]:
+        """{(device_id, fecha): última actualización} de las filas del rango"""
+        rows = (
+            self.db.query(DailyConsumption.dc_device_id, DailyConsumption.dc_date, DailyConsumption.dc_updated_at)
+            .filter(
+                and_(
+                    DailyConsumption.dc_user_id == user_id,
+                    DailyConsumption.dc_date >= from_date,
+                    DailyConsumption.dc_date <= to_date
+                )
+            )
+            .all()
+        )
+        return {(device_id, day): updated_at for device_id, day, updated_at in rows}
+
+    def upsert_many(self, user_id: int, rows: list[dict]) -> bool:
+        """
+        Inserta o reemplaza filas {device_id, date, kwh, peak_watts, min_watts,
+        sample_count, gap_seconds} de un usuario (un día se recalcula mientras
+        pueda recibir lecturas atrasadas)
+        """
+        if not rows:
+            return True
+        try:
+            now = datetime.now(timezone.utc)
+            stmt = insert(DailyConsumption).values([
+                {
+                    "dc_user_id": user_id,
+                    "dc_device_id": row["device_id"],
+                    "dc_date": row["date"],
+                    "dc_kwh": row["kwh"],
+                    "dc_peak_watts": row["peak_watts"],
+                    "dc_min_watts": row["min_watts"],
+                    "dc_sample_count": row["sample_count"],
+                    "dc_gap_seconds": row["gap_seconds"],
+                    "dc_updated_at": now,
+                }
+                for row in rows
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint="unique_daily_consumption",
+                set_={
+                    "dc_kwh": stmt.excluded.dc_kwh,
+                    "dc_peak_watts": stmt.excluded.dc_peak_watts,
+                    "dc_min_watts": stmt.excluded.dc_min_watts,
+                    "dc_sample_count": stmt.excluded.dc_sample_count,
+                    "dc_gap_seconds": stmt.excluded.dc_gap_seconds,
+                    "dc_updated_at": stmt.excluded.dc_updated_at,
+                }
+            )
+            self.db.execute(stmt)
+            self.db.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando consumo diario de user {user_id}: {e}")
+            self.db.rollback()
+            return False
@@ -0,0 +1,135 @@
+# app/repositories/device_cache_repository.py
+
+import json
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from app.core import logger, pubsub_listener
+from app.core.local_cache import LocalTTLCache
+
+DEVICE_CACHE_TTL = 3600         # Dispositivo registrado: 1 hora
+DEVICE_NOT_FOUND_TTL = 300      # "No existe": 5 minutos para no saturar la BD
+
+# Nivel 1: cache en memoria de cada worker (LRU + TTL) delante de Redis.
+# Se invalida por Pub/Sub cuando un dispositivo cambia; el TTL corto es la red
+# de seguridad si un mensaje se pierde.
+LOCAL_DEVICE_CACHE_MAX = 10_000
+LOCAL_DEVICE_CACHE_TTL = 60
+DEVICE_INVALIDATION_CHANNEL = "ecowatt:device:invalidate"
+
+_local_devices = LocalTTLCache(max_size=LOCAL_DEVICE_CACHE_MAX, ttl_seconds=LOCAL_DEVICE_CACHE_TTL)
+
+# Cada worker borra su copia local al recibir la MAC invalidada
+pubsub_listener.subscribe(DEVICE_INVALIDATION_CHANNEL, _local_devices.discard, on_reset=_local_devices.clear)
+
+
+def _cache_key(hardware_id: str) -> str:
+    return f"device:mac:{hardware_id}"
+
+
+def _decode(hardware_id: str, raw: str | None) -> dict | None:
+    """
+    Decodifica la entrada cacheada.
+
+    Retorna el dict cacheado ({id, user_id, active, name, billing_day, exists}) o None en un MISS
+    (incluye entradas corruptas, que el llamador debe borrar).
+    """
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Error decodificando cache para {hardware_id}: {e}")
+        return None
+
+
+def device_to_cache(device) -> dict:
+    """
+    Datos mínimos de un Device que necesita la ingesta.
+
+    Incluye el día de corte del dueño (acumulador del ciclo de facturación):
+    accede a `device.user`, así que debe llamarse con la sesión abierta.
+    """
+    return {
+        "id": device.dev_id,
+        "user_id": device.dev_user_id,
+        "active": device.dev_status,
+        "name": device.dev_name,
+        "billing_day": device.user.user_billing_day if device.user else None,
+        "exists": True
+    }
+
+
+class DeviceCacheRepository:
+    """Cache MAC → dispositivo: memoria del worker + Redis (`device:mac:{mac}`)."""
+
+    def __init__(self, redis_client: Redis):
+        self.redis = redis_client
+
+    def get(self, hardware_id: str) -> dict | None:
+        data = _local_devices.get(hardware_id)
+        if data is not None:
+            return data
+
+        raw = self.redis.get(_cache_key(hardware_id))
+        data = _decode(hardware_id, raw)
+        if raw and data is None:
+            self.redis.delete(_cache_key(hardware_id))
+        if data is not None:
+            _local_devices.set(hardware_id, data)
+        return data
+
+    def set(self, hardware_id: str, device_data: dict):
+        self.redis.setex(_cache_key(hardware_id), DEVICE_CACHE_TTL, json.dumps(device_data))
+        _local_devices.set(hardware_id, device_data)
+
+    def set_not_found(self, hardware_id: str):
+        self.redis.setex(_cache_key(hardware_id), DEVICE_NOT_FOUND_TTL, json.dumps({"exists": False}))
+        _local_devices.set(hardware_id, {"exists": False})
+
+    def invalidate(self, hardware_id: str):
+        """Borra la entrada en Redis y avisa a todos los workers para que borren su copia."""
+        _local_devices.discard(hardware_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(_cache_key(hardware_id))
+        pipe.publish(DEVICE_INVALIDATION_CHANNEL, hardware_id)
+        pipe.execute()
+
+
+class AsyncDeviceCacheRepository:
+    """
+    Variante asíncrona (redis.asyncio) del cache MAC → dispositivo.
+
+    ✅ En estado estable la ingesta resuelve la MAC sin ningún round trip a Redis.
+    """
+
+    def __init__(self, redis_client: AsyncRedis):
+        self.redis = redis_client
+
+    async def get(self, hardware_id: str) -> dict | None:
+        data = _local_devices.get(hardware_id)
+        if data is not None:
+            return data
+
+        raw = await self.redis.get(_cache_key(hardware_id))
+        data = _decode(hardware_id, raw)
+        if raw and data is None:
+            await self.redis.delete(_cache_key(hardware_id))
+        if data is not None:
+            _local_devices.set(hardware_id, data)
+        return data
+
+    async def set(self, hardware_id: str, device_data: dict):
+        await self.redis.setex(_cache_key(hardware_id), DEVICE_CACHE_TTL, json.dumps(device_data))
+        _local_devices.set(hardware_id, device_data)
+
+    async def set_not_found(self, hardware_id: str):
+        await self.redis.setex(_cache_key(hardware_id), DEVICE_NOT_FOUND_TTL, json.dumps({"exists": False}))
+        _local_devices.set(hardware_id, {"exists": False})
+
+    async def invalidate(self, hardware_id: str):
+        """Borra la entrada en Redis y avisa a todos los workers para que borren su copia."""
+        _local_devices.discard(hardware_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(_cache_key(hardware_id))
+        pipe.publish(DEVICE_INVALIDATION_CHANNEL, hardware_id)
+        await pipe.execute()
@@ -0,0 +1,112 @@
+# app/repositories/history_cache_repository.py
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from app.core import logger
+
+# Buckets cerrados del historial (promedio de watts por dispositivo). Un bucket
+# que ya cerró no vuelve a cambiar, así que se guarda una vez y solo se calcula
+# el bucket en curso. Se agrupan en hashes de HISTORY_CHUNK_BUCKETS buckets:
+# cada hash deja de escribirse cuando sus buckets salen de la ventana del
+# historial y expira solo.
+HISTORY_CHUNK_BUCKETS = 32
+HISTORY_CACHE_TTL = 35 * 86400      # Mayor que el periodo más largo (30 días)
+
+# Valor de un bucket cerrado sin lecturas (también se cachea)
+EMPTY_BUCKET = ""
+
+# Tamaños de bucket del historial (horas y días UTC, alineados al reloj)
+HISTORY_BUCKETS_MS = (3_600_000, 86_400_000)
+
+
+def _chunk_key(user_id: int, bucket_ms: int, bucket_start: int) -> str:
+    chunk = bucket_start // (bucket_ms * HISTORY_CHUNK_BUCKETS)
+    return f"history:closed:{user_id}:{bucket_ms}:{chunk}"
+
+
+class HistoryCacheRepository:
+    """Cache de buckets cerrados: (usuario, resolución, dispositivo, inicio del bucket) → watts promedio."""
+
+    def __init__(self, redis_client: Redis):
+        self.redis = redis_client
+
+    def get_many(self, user_id: int, bucket_ms: int, device_ids: list, bucket_starts: list) -> dict:
+        """
+        Retorna {(device_id, bucket_start): watts | None} de los buckets cacheados
+        (None = bucket cerrado sin lecturas). Los que no están se omiten.
+        """
+        requests = [(device_id, start) for start in bucket_starts for device_id in device_ids]
+        if not requests:
+            return {}
+
+        pipe = self.redis.pipeline(transaction=False)
+        for device_id, start in requests:
+            pipe.hget(_chunk_key(user_id, bucket_ms, start), f"{device_id}:{start}")
+        try:
+            values = pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ Error leyendo cache de historial de user {user_id}: {e}")
+            return {}
+
+        cached = {}
+        for request, value in zip(requests, values):
+            if value is None:
+                continue
+            cached[request] = None if value == EMPTY_BUCKET else float(value)
+        return cached
+
+    def set_many(self, user_id: int, bucket_ms: int, values: dict):
+        """Guarda {(device_id, bucket_start): watts | None} de buckets ya cerrados."""
+        if not values:
+            return
+
+        by_key = {}
+        for (device_id, start), watts in values.items():
+            field = f"{device_id}:{start}"
+            by_key.setdefault(_chunk_key(user_id, bucket_ms, start), {})[field] = (
+                EMPTY_BUCKET if watts is None else repr(float(watts))
+            )
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key, mapping in by_key.items():
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, HISTORY_CACHE_TTL)
+        try:
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ Error guardando cache de historial de user {user_id}: {e}")
+
+
+class AsyncHistoryCacheRepository:
+    """Variante asíncrona (redis.asyncio) para la ingesta: invalida buckets con lecturas atrasadas."""
+
+    def __init__(self, redis_client: AsyncRedis):
+        self.redis = redis_client
+
+    async def invalidate_late(self, measurements: list, settled_before_ms: int):
+        """
+        Borra de la cache los buckets (de todos los tamaños) que recibieron una
+        lectura con hora anterior a `settled_before_ms`: ya pudieron haberse
+        cacheado como cerrados sin ella.
+        """
+        fields = set()
+        for measurement in measurements:
+            timestamp = measurement.get("timestamp")
+            if not timestamp or timestamp >= settled_before_ms:
+                continue
+            for bucket_ms in HISTORY_BUCKETS_MS:
+                start = timestamp - timestamp % bucket_ms
+                fields.add((
+                    _chunk_key(measurement["user_id"], bucket_ms, start),
+                    f"{measurement['device_id']}:{start}"
+                ))
+        if not fields:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key, field in fields:
+            pipe.hdel(key, field)
+        try:
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ Error invalidando cache de historial: {e}")
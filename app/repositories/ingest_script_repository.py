@@ -0,0 +1,133 @@
+# app/repositories/ingest_script_repository.py
+
+from datetime import datetime, timezone
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import NoScriptError
+from app.core import logger
+from app.repositories.timeseries_repository import ENERGY_LUA_FUNCTION, ENERGY_MAX_GAP_MS
+
+# Canal donde se publican las lecturas en vivo (lo consumen todos los workers)
+LIVE_CHANNEL = "ecowatt:live"
+
+# Ingesta completa en el servidor Redis, en un solo EVALSHA y de forma atómica:
+#   1. Resuelve MAC → dispositivo desde el cache `device:mac:{mac}` (KEYS[1])
+#   2. Valida que exista y esté activo
+#   3. TS.MADD de watts / volts / amps
+#   4. Contador de energía acumulada y acumulado del ciclo de facturación
+#      (update_energy, ver timeseries_repository)
+#   5. PUBLISH del valor en vivo
+#
+# ARGV: timestamp_ms, watts, volts, amps, canal, aenergy.total ('' si no viene), max_gap_ms
+# Retorna {estado, device_id?}. Estados: ok | inactive | not_found | miss | ts_missing
+# "miss" y "ts_missing" indican que la ruta Python debe encargarse (consultar la
+# BD / crear las series).
+#
+# Nota: las claves ts:* se calculan dentro del script (no van en KEYS); es válido
+# en Redis standalone, que es como se despliega EcoWatt.
+INGEST_LUA = ENERGY_LUA_FUNCTION + """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    return {'miss'}
+end
+
+local decoded, device = pcall(cjson.decode, raw)
+if not decoded then
+    return {'miss'}
+end
+if device['exists'] == false then
+    return {'not_found'}
+end
+if not device['active'] then
+    return {'inactive', tostring(device['id'])}
+end
+
+local prefix = 'ts:user:' .. device['user_id'] .. ':device:' .. device['id']
+local ts = ARGV[1]
+local result = redis.pcall(
+    'TS.MADD',
+    prefix .. ':watts', ts, ARGV[2],
+    prefix .. ':volts', ts, ARGV[3],
+    prefix .. ':amps',  ts, ARGV[4]
+)
+if type(result) == 'table' and result['err'] then
+    return {'ts_missing', tostring(device['id'])}
+end
+for _, item in ipairs(result) do
+    if type(item) == 'table' and item['err'] then
+        return {'ts_missing', tostring(device['id'])}
+    end
+end
+
+local energy_ok = update_energy(
+    'energy:state:' .. device['id'], prefix .. ':energy',
+    tonumber(ts), tonumber(ARGV[2]), tonumber(ARGV[6]), tonumber(ARGV[7]),
+    'energy:cycle:' .. device['user_id'], 'device:' .. device['id'], tonumber(device['billing_day'])
+)
+if not energy_ok then
+    return {'ts_missing', tostring(device['id'])}
+end
+
+redis.call('PUBLISH', ARGV[5], cjson.encode({
+    device_id = device['id'],
+    watts = tonumber(ARGV[2]),
+    volts = tonumber(ARGV[3]),
+    amps = tonumber(ARGV[4])
+}))
+return {'ok', tostring(device['id'])}
+"""
+
+# SHA del script cargado (por worker); None = no cargado
+_script_sha: str | None = None
+
+
+class AsyncIngestScriptRepository:
+    """Ingesta de una lectura en un solo round trip mediante un script Lua en Redis."""
+
+    def __init__(self, redis_client: AsyncRedis):
+        self.redis = redis_client
+
+    async def load(self) -> bool:
+        """SCRIPT LOAD del script de ingesta (al arrancar el worker)."""
+        global _script_sha
+        try:
+            _script_sha = await self.redis.script_load(INGEST_LUA)
+            logger.info(f"📜 Script de ingesta cargado en Redis: {_script_sha}")
+            return True
+        except Exception as e:
+            _script_sha = None
+            logger.error(f"❌ No se pudo cargar el script de ingesta: {e}")
+            return False
+
+    async def ingest(
+        self, hardware_id: str, watts: float, volts: float, amps: float,
+        timestamp: int | None = None, energy_total: float | None = None
+    ) -> tuple[str, int | None]:
+        """
+        Ejecuta la ingesta completa con EVALSHA.
+
+        `timestamp` (ms) es la hora de la lectura; si no viene se usa la actual.
+
+        Retorna (estado, device_id). Si el script no está cargado en Redis
+        (ej. tras un reinicio o SCRIPT FLUSH) retorna ("unavailable", None)
+        y se reintenta la carga en la siguiente lectura.
+        """
+        global _script_sha
+        if _script_sha is None and not await self.load():
+            return "unavailable", None
+
+        if not timestamp:
+            timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
+        try:
+            result = await self.redis.evalsha(
+                _script_sha, 1, f"device:mac:{hardware_id}",
+                timestamp, watts, volts, amps, LIVE_CHANNEL,
+                "" if energy_total is None else energy_total, ENERGY_MAX_GAP_MS
+            )
+        except NoScriptError:
+            logger.warning("⚠️ Script de ingesta no encontrado en Redis, usando ruta Python")
+            _script_sha = None
+            return "unavailable", None
+
+        status = result[0]
+        device_id = int(result[1]) if len(result) > 1 else None
+        return status, device_id
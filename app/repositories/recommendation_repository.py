@@ -1,4 +1,6 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from datetime import datetime
 from app.models import Recommendation
 from app.core import logger
 
@@ -21,6 +23,21 @@ class RecommendationRepository:
     
     def get_recommendations_by_user(self, user_id: int) -> list[Recommendation]:
         return self.db.query(Recommendation).filter(Recommendation.rec_user_id == user_id).order_by(Recommendation.rec_created_at.desc()).all()
+
+    def get_recommendations_by_user_between(self, user_id: int, start: datetime, end: datetime) -> list[Recommendation]:
+        """Recomendaciones del usuario creadas en [start, end] (índice idx_recommendations_user_created)"""
+        return (
+            self.db.query(Recommendation)
+            .filter(
+                and_(
+                    Recommendation.rec_user_id == user_id,
+                    Recommendation.rec_created_at >= start,
+                    Recommendation.rec_created_at <= end
+                )
+            )
+            .order_by(Recommendation.rec_created_at.desc())
+            .all()
+        )
     
     def get_latest_recommendation_by_user(self, user_id: int) -> Recommendation | None:
         return self.db.query(Recommendation).filter(Recommendation.rec_user_id == user_id).order_by(Recommendation.rec_created_at.desc()).first()
\ No newline at end of file
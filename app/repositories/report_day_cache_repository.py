@@ -0,0 +1,122 @@
+# app/repositories/report_day_cache_repository.py
+
+from datetime import date
+
+from redis import Redis
+from app.core import logger
+
+# kWh por día cerrado del reporte del mes en curso (suma de los dispositivos
+# activos del usuario), un hash por ciclo: report:days:{u}:{inicio del ciclo}.
+# El campo `devices` guarda qué dispositivos se sumaron: si cambian, el cache
+# no aplica. El job de consumo diario borra los días cuyo valor cambió
+# (lecturas atrasadas) e incrementa `version`: un reporte que leyó el cache
+# antes de eso calculó con datos viejos y ya no puede escribir.
+REPORT_DAY_CACHE_TTL = 35 * 86400      # Mayor que un ciclo de facturación
+DEVICES_FIELD = "devices"
+VERSION_FIELD = "version"
+
+# Escritura atómica: verificar versión y dispositivos y guardar en un solo paso
+# KEYS: hash del ciclo
+# ARGV: versión leída, firma de dispositivos, ttl, día1, kwh1, día2, kwh2, ...
+SET_DAYS_LUA = """
+local version = redis.call('HGET', KEYS[1], 'version') or '0'
+if version ~= ARGV[1] then
+    return 0
+end
+if redis.call('HGET', KEYS[1], 'devices') ~= ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    if version ~= '0' then
+        redis.call('HSET', KEYS[1], 'version', version)
+    end
+end
+redis.call('HSET', KEYS[1], 'devices', ARGV[2], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# Diferencia (kWh) a partir de la cual un día recalculado reemplaza al cacheado
+REPORT_DAY_CACHE_TOLERANCE_KWH = 1e-4
+
+
+def _key(user_id: int, cycle_start: date) -> str:
+    return f"report:days:{user_id}:{cycle_start.isoformat()}"
+
+
+def _devices_signature(device_ids: list) -> str:
+    return ",".join(str(device_id) for device_id in sorted(device_ids))
+
+
+class ReportDayCacheRepository:
+    """Cache de días cerrados del reporte: (usuario, ciclo, día) → kWh."""
+
+    def __init__(self, redis_client: Redis):
+        self.redis = redis_client
+
+    def get(self, user_id: int, cycle_start: date, device_ids: list) -> tuple[dict[date, float], str | None]:
+        """
+        ({día: kWh} cacheados del ciclo para este conjunto de dispositivos, versión).
+
+        Los días quedan vacíos si no hay cache o cambiaron los dispositivos. La
+        versión se pasa a set_many(); es None si Redis falló (no se escribe).
+        """
+        try:
+            values = self.redis.hgetall(_key(user_id, cycle_start))
+        except Exception as e:
+            logger.error(f"❌ Error leyendo cache de reporte de user {user_id}: {e}")
+            return {}, None
+
+        version = values.get(VERSION_FIELD, "0")
+        if values.get(DEVICES_FIELD) != _devices_signature(device_ids):
+            return {}, version
+        return {
+            date.fromisoformat(field): float(kwh)
+            for field, kwh in values.items() if field not in (DEVICES_FIELD, VERSION_FIELD)
+        }, version
+
+    def set_many(self, user_id: int, cycle_start: date, device_ids: list, daily_kwh: dict, version: str | None):
+        """
+        Guarda {día: kWh} de días cerrados si el cache sigue en la `version` leída
+        con get(); si cambió el conjunto de dispositivos, reemplaza el hash.
+        """
+        if not daily_kwh or version is None:
+            return
+
+        args = [version, _devices_signature(device_ids), REPORT_DAY_CACHE_TTL]
+        for day, kwh in daily_kwh.items():
+            args += [day.isoformat(), repr(float(kwh))]
+        try:
+            script = self.redis.register_script(SET_DAYS_LUA)
+            if not script(keys=[_key(user_id, cycle_start)], args=args):
+                logger.info(f"🔄 Cache de reporte de user {user_id} recalculado mientras se generaba, no se guarda")
+        except Exception as e:
+            logger.error(f"❌ Error guardando cache de reporte de user {user_id}: {e}")
+
+    def drop_changed(self, user_id: int, cycle_start: date, daily_kwh: dict) -> int:
+        """
+        Borra los días cacheados cuyo kWh difiere del recalculado ({día: kWh}).
+        Retorna cuántos se borraron.
+
+        Primero sube la versión: un reporte en curso que leyó el cache antes ya
+        no puede guardar días calculados sin estos valores.
+        """
+        if not daily_kwh:
+            return 0
+
+        key = _key(user_id, cycle_start)
+        days = list(daily_kwh)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hincrby(key, VERSION_FIELD, 1)
+            pipe.expire(key, REPORT_DAY_CACHE_TTL)
+            pipe.hmget(key, [day.isoformat() for day in days])
+            _, _, cached = pipe.execute()
+            stale = [
+                day.isoformat() for day, value in zip(days, cached)
+                if value is not None and abs(float(value) - daily_kwh[day]) > REPORT_DAY_CACHE_TOLERANCE_KWH
+            ]
+            if stale:
+                self.redis.hdel(key, *stale)
+            return len(stale)
+        except Exception as e:
+            logger.error(f"❌ Error invalidando cache de reporte de user {user_id}: {e}")
+            return 0
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import Text, and_, cast
 from app.models import Report
 from app.core import logger
 from datetime import datetime, timezone, timedelta
@@ -24,6 +24,25 @@ class ReportRepository:
             .first()
         )
 
+    def get_report_json(self, user_id: int, month: int, year: int) -> Optional[str]:
+        """
+        JSON guardado de un mes (no expirado) como texto, tal como lo devuelve
+        Postgres (mr_report_data::text): sin decodificar el JSONB en Python.
+        """
+        row = (
+            self.db.query(cast(Report.mr_report_data, Text))
+            .filter(
+                and_(
+                    Report.mr_user_id == user_id,
+                    Report.mr_month == month,
+                    Report.mr_year == year,
+                    Report.mr_expires_at > datetime.now(timezone.utc)
+                )
+            )
+            .first()
+        )
+        return row[0] if row else None
+
     def get_all_by_user(self, user_id: int) -> List[Report]:
         """Obtiene todos los reportes no expirados de un usuario"""
         return (
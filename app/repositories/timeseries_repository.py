@@ -2,21 +2,474 @@
 
 from datetime import datetime, timezone
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from app.core import logger
-from typing import Dict
+from app.core.local_cache import LocalTTLCache
+from typing import Dict, Iterator, List
 
 # ✅ CONSTANTE ÚNICA para retention (30 días en milisegundos)
 RETENTION_MS = 2592000000  # 30 días
 
-class TimeSeriesRepository:
+DAY_MS = 86_400_000
+
+# Tiers de compactación (TS.CREATERULE): (nombre, bucket_ms, retention_ms).
+# Redis los calcula al cerrar cada bucket; los lectores consultan el tier más
+# grueso que les alcance en lugar de los puntos crudos (~1 Hz).
+COMPACTION_TIERS = [
+    ("1m", 60_000,    90 * DAY_MS),     # 90 días
+    ("1h", 3_600_000, 730 * DAY_MS),    # 2 años
+    ("1d", DAY_MS,    3650 * DAY_MS),   # 10 años
+]
+
+# Agregaciones por tipo de serie. En watts, "twa" (promedio ponderado en el
+# tiempo) es la energía precalculada del bucket: Wh = twa × horas del bucket.
+COMPACTION_AGGREGATIONS = {
+    "watts":  ("avg", "twa"),
+    "volts":  ("avg",),
+    "amps":   ("avg",),
+    "energy": ("last",),    # Contador acumulado: el último valor del bucket
+}
+
+# Hueco máximo entre lecturas para integrar potencia → energía (mismo criterio
+# que la integración trapezoidal del dashboard)
+ENERGY_MAX_GAP_MS = 60_000
+
+# Contador de energía acumulada por dispositivo (Wh, monótono), en la serie
+# ts:user:{u}:device:{d}:energy. El estado vive en el hash energy:state:{d}.
+#
+# - Con `aenergy.total` del Shelly se suma la diferencia entre lecturas; si el
+#   total baja, el Shelly se reinició y el nuevo total es lo consumido desde entonces.
+# - Sin él, se integra la potencia (trapecio) entre lecturas a menos de max_gap_ms.
+# - Las muestras atrasadas no mueven el contador (nunca retrocede).
+#
+# Además acumula el consumo del ciclo de facturación en curso en el hash
+# energy:cycle:{u} (campo device:{d}, Wh). Al empezar un ciclo nuevo el hash se
+# reinicia y queda marcado complete=1; si se creó a mitad de ciclo (primer
+# despliegue) queda complete=0 y el dashboard no lo usa hasta el siguiente ciclo.
+# El inicio del ciclo replica billing_cycle_start() (app/services/billing_cycle.py).
+#
+# Se ejecuta atómicamente en Redis: varios workers pueden recibir lecturas del
+# mismo dispositivo. Si la serie no existe no toca el estado y retorna false
+# para que el llamador la cree y reintente.
+ENERGY_LUA_FUNCTION = """
+local function days_from_civil(y, m, d)
+    if m <= 2 then y = y - 1 end
+    local era = math.floor(y / 400)
+    local yoe = y - era * 400
+    local doy = math.floor((153 * ((m + 9) % 12) + 2) / 5) + d - 1
+    local doe = yoe * 365 + math.floor(yoe / 4) - math.floor(yoe / 100) + doy
+    return era * 146097 + doe - 719468
+end
+
+local function civil_from_days(z)
+    z = z + 719468
+    local era = math.floor(z / 146097)
+    local doe = z - era * 146097
+    local yoe = math.floor((doe - math.floor(doe / 1460) + math.floor(doe / 36524) - math.floor(doe / 146096)) / 365)
+    local doy = doe - (365 * yoe + math.floor(yoe / 4) - math.floor(yoe / 100))
+    local mp = math.floor((5 * doy + 2) / 153)
+    local d = doy - math.floor((153 * mp + 2) / 5) + 1
+    local m = mp < 10 and mp + 3 or mp - 9
+    local y = yoe + era * 400
+    if m <= 2 then y = y + 1 end
+    return y, m, d
+end
+
+local function cut_off_day(y, m, billing_day)
+    local next_y, next_m = y, m + 1
+    if next_m == 13 then
+        next_y, next_m = y + 1, 1
+    end
+    local days_in_month = days_from_civil(next_y, next_m, 1) - days_from_civil(y, m, 1)
+    return math.min(billing_day, days_in_month)
+end
+
+local function billing_cycle_start(ts, billing_day)
+    local y, m, d = civil_from_days(math.floor(ts / 86400000))
+    if d < cut_off_day(y, m, billing_day) then
+        m = m - 1
+        if m == 0 then
+            m = 12
+            y = y - 1
+        end
+    end
+    return days_from_civil(y, m, cut_off_day(y, m, billing_day)) * 86400000
+end
+
+local function add_to_cycle(cycle_key, device_field, ts, billing_day, delta)
+    local cycle_start = billing_cycle_start(ts, billing_day)
+    local stored = tonumber(redis.call('HGET', cycle_key, 'cycle_start'))
+
+    if not stored or cycle_start > stored then
+        redis.call('DEL', cycle_key)
+        redis.call('HSET', cycle_key, 'cycle_start', cycle_start, 'complete', stored and 1 or 0)
+        redis.call('PEXPIRE', cycle_key, 64 * 86400000)
+    elseif cycle_start < stored then
+        return
+    end
+
+    if delta > 0 then
+        redis.call('HINCRBYFLOAT', cycle_key, device_field, delta)
+    end
+end
+
+local function update_energy(state_key, energy_key, ts, watts, device_total, max_gap_ms, cycle_key, device_field, billing_day)
+    local state = redis.call('HMGET', state_key, 'ts', 'watts', 'device_total', 'total_wh')
+    local last_ts = tonumber(state[1])
+    local total_wh = tonumber(state[4]) or 0
+
+    if last_ts and ts <= last_ts then
+        return true
+    end
+
+    local delta = 0
+    if device_total then
+        local last_device_total = tonumber(state[3])
+        if last_device_total then
+            if device_total >= last_device_total then
+                delta = device_total - last_device_total
+            else
+                delta = device_total
+            end
+        end
+    elseif last_ts and (ts - last_ts) <= max_gap_ms then
+        delta = (tonumber(state[2]) + watts) / 2 * (ts - last_ts) / 3600000
+    end
+    total_wh = total_wh + delta
+
+    -- TS.ADD crearía la serie sin labels ni reglas: la crea el llamador
+    if redis.call('EXISTS', energy_key) == 0 then
+        return false
+    end
+    redis.call('TS.ADD', energy_key, ts, total_wh)
+    redis.call('HSET', state_key, 'ts', ts, 'watts', watts, 'device_total', device_total or '', 'total_wh', total_wh)
+
+    if billing_day then
+        add_to_cycle(cycle_key, device_field, ts, billing_day, delta)
+    end
+    return true
+end
+"""
+
+# KEYS: state_key, energy_key, cycle_key
+# ARGV: ts, watts, device_total ('' si no viene), max_gap_ms, device_field, billing_day ('' si no se conoce)
+ENERGY_UPDATE_LUA = ENERGY_LUA_FUNCTION + """
+local ok = update_energy(
+    KEYS[1], KEYS[2], tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]),
+    KEYS[3], ARGV[5], tonumber(ARGV[6])
+)
+if ok then
+    return 1
+end
+return 0
+"""
+
+# Muestras por comando TS.MADD en la ingesta por lotes (3 muestras por lectura)
+MADD_CHUNK_SAMPLES = 1500
+
+# Registro (por worker) de series ya verificadas/creadas.
+# Evita un TS.INFO por serie en cada lectura; el TTL fuerza una revalidación
+# periódica de la configuración y el tamaño acota la memoria.
+KNOWN_SERIES_MAX = 50_000
+KNOWN_SERIES_TTL_SECONDS = 3600
+
+# Muestras por serie en cada página de TS.RANGE ... COUNT (exportación)
+EXPORT_CHUNK_SAMPLES = 5000
+_known_series = LocalTTLCache(max_size=KNOWN_SERIES_MAX, ttl_seconds=KNOWN_SERIES_TTL_SECONDS)
+
+def compaction_key(raw_key: str, aggregation: str, tier: str) -> str:
+    """Clave de la serie compactada: ts:user:{u}:device:{d}:{tipo}:{agg}:{tier}."""
+    return f"{raw_key}:{aggregation}:{tier}"
+
+
+def tier_for_bucket(bucket_ms: int, align_ms: int = 0) -> str | None:
+    """
+    Tier más grueso que sirve para agregar en buckets de `bucket_ms`.
+
+    El bucket pedido y su alineación (`align_ms`, ej. el inicio del rango con
+    ALIGN start) deben ser múltiplos del tier. Retorna None si solo los datos
+    crudos alcanzan (bucket menor a 1 minuto o alineación arbitraria).
+    """
+    best = None
+    for tier, tier_bucket_ms, _ in COMPACTION_TIERS:
+        if bucket_ms % tier_bucket_ms == 0 and align_ms % tier_bucket_ms == 0:
+            best = tier
+    return best
+
+
+def bucket_for_range(from_ts: int, to_ts: int, max_buckets: int) -> int:
+    """Bucket (ms, múltiplo de 1 s) para cubrir [from_ts, to_ts] en a lo más `max_buckets` buckets."""
+    needed_ms = max(1000, -(-(to_ts - from_ts) // max(1, max_buckets)))  # ceil, mínimo 1 s
+    return -(-needed_ms // 1000) * 1000
+
+
+def resolution_for_range(from_ts: int, to_ts: int, max_buckets: int, now_ms: int) -> tuple[str | None, int]:
+    """
+    Fuente y tamaño de bucket para leer [from_ts, to_ts] en a lo más ~`max_buckets` buckets.
+
+    Retorna (tier, bucket_ms): el tier compactado más grueso cuyo bucket cabe en
+    el bucket necesario (None = datos crudos) y el bucket redondeado a un
+    múltiplo de él. Si la fuente ya no conserva `from_ts` (retención), se pasa
+    a un tier más grueso. Así Redis nunca recorre más de unas cuantas veces
+    `max_buckets` muestras, sin importar qué tan amplio sea el rango.
+    """
+    needed_ms = bucket_for_range(from_ts, to_ts, max_buckets)
+
+    # De la fuente más fina a la más gruesa (crudos ≈ 1 muestra por segundo)
+    candidates = [(None, 1000, RETENTION_MS)] + COMPACTION_TIERS
+    chosen = None
+    for candidate in candidates:
+        _, tier_bucket_ms, retention_ms = candidate
+        if from_ts < now_ms - retention_ms:
+            continue  # Ya expiró el inicio del rango en esta fuente
+        if chosen is not None and tier_bucket_ms > needed_ms:
+            break
+        chosen = candidate
+
+    tier, tier_bucket_ms, _ = chosen or candidates[-1]
+    bucket_ms = max(tier_bucket_ms, -(-needed_ms // tier_bucket_ms) * tier_bucket_ms)
+    return tier, bucket_ms
+
+
+def energy_state_key(device_id) -> str:
+    return f"energy:state:{device_id}"
+
+
+def energy_cycle_key(user_id) -> str:
+    """Hash con los Wh del ciclo de facturación en curso de cada dispositivo del usuario."""
+    return f"energy:cycle:{user_id}"
+
+
+def rule_destinations(info) -> set:
+    """Claves destino de las reglas de una serie (TS.INFO; RESP2 lista, RESP3 dict)."""
+    rules = info.rules or []
+    destinations = rules.keys() if isinstance(rules, dict) else [rule[0] for rule in rules]
+    return {d.decode() if isinstance(d, bytes) else d for d in destinations}
+
+
+class _TimeSeriesBase:
+    """Lógica pura compartida por el repositorio síncrono y el asíncrono (sin I/O)."""
+
+    def _series_for_device(self, user_id: int, device_id) -> list[tuple[str, Dict]]:
+        """Claves y labels de las 3 series (watts, volts, amps) de un dispositivo."""
+        return [
+            (f"ts:user:{user_id}:device:{device_id}:{ts_type}", {
+                "user_id": str(user_id),
+                "device_id": str(device_id),
+                "type": ts_type
+            })
+            for ts_type in ("watts", "volts", "amps")
+        ]
+
+    def _energy_series(self, user_id: int, device_id) -> tuple[str, Dict]:
+        """Clave y labels del contador de energía acumulada (Wh) de un dispositivo."""
+        return f"ts:user:{user_id}:device:{device_id}:energy", {
+            "user_id": str(user_id),
+            "device_id": str(device_id),
+            "type": "energy"
+        }
+
+    def _create_args(self, key: str, labels: Dict, retention_ms: int = RETENTION_MS) -> list:
+        """
+        Argumentos de TS.CREATE con la configuración estándar de las series.
+
+        Las series crudas no llevan label `tier` (FILTER ... tier= las selecciona);
+        las compactadas agregan `agg` y `tier`.
+        """
+        args = [
+            'TS.CREATE', key,
+            'RETENTION', str(retention_ms),
+            'DUPLICATE_POLICY', 'LAST',
+            'LABELS',
+            'user_id', str(labels.get('user_id', '')),
+            'device_id', str(labels.get('device_id', '')),
+            'type', str(labels.get('type', ''))
+        ]
+        for name in ('agg', 'tier'):
+            if name in labels:
+                args.extend((name, str(labels[name])))
+        return args
+
+    def _compaction_commands(self, key: str, labels: Dict, existing: set = frozenset()) -> list[list]:
+        """
+        TS.CREATE + TS.CREATERULE de cada tier de compactación de una serie cruda.
+
+        `existing`: destinos que ya tienen regla (se omiten).
+        """
+        commands = []
+        for aggregation in COMPACTION_AGGREGATIONS.get(labels.get('type'), ()):
+            for tier, bucket_ms, retention_ms in COMPACTION_TIERS:
+                dest = compaction_key(key, aggregation, tier)
+                if dest in existing:
+                    continue
+                dest_labels = {**labels, 'agg': aggregation, 'tier': tier}
+                commands.append(self._create_args(dest, dest_labels, retention_ms))
+                commands.append(['TS.CREATERULE', key, dest, 'AGGREGATION', aggregation, str(bucket_ms)])
+        return commands
+
+    def _check_config(self, key: str, info) -> None:
+        """Advierte si una serie existente no tiene la configuración esperada."""
+        current_retention = info.retention_msecs
+        current_dup_policy = info.duplicate_policy
+
+        # Convertir bytes a string si es necesario
+        if isinstance(current_dup_policy, bytes):
+            current_dup_policy = current_dup_policy.decode()
+
+        config_is_correct = (
+            current_retention == RETENTION_MS and
+            str(current_dup_policy).lower() == 'last'
+        )
+
+        if not config_is_correct:
+            logger.warning(
+                f"⚠️ Configuración incorrecta en {key}: "
+                f"retention={current_retention}ms (esperado: {RETENTION_MS}ms), "
+                f"dup_policy={current_dup_policy} (esperado: last)"
+            )
+
+    def _energy_update(
+        self, user_id: int, device_id, timestamp: int, watts: float,
+        energy_total: float | None, billing_day: int | None
+    ) -> tuple[list, list]:
+        """(KEYS, ARGV) de ENERGY_UPDATE_LUA para una lectura."""
+        energy_key, _ = self._energy_series(user_id, device_id)
+        return (
+            [energy_state_key(device_id), energy_key, energy_cycle_key(user_id)],
+            [
+                timestamp, watts, _energy_arg(energy_total), ENERGY_MAX_GAP_MS,
+                f"device:{device_id}", "" if billing_day is None else billing_day
+            ]
+        )
+
+    def _build_batch(self, readings: List[Dict], base_timestamp: int) -> tuple[list, Dict[str, Dict], list]:
+        """
+        Convierte lecturas en muestras (key, timestamp, valor) para TS.MADD.
+
+        Usa el "timestamp" (ms) de la lectura si viene (hora del dispositivo o
+        de llegada al buffer); si no, lecturas sucesivas reciben +1 ms para no
+        pisarse dentro de la misma serie. Las 3 series de una lectura comparten
+        el mismo timestamp. Los timestamps no tienen que venir en orden:
+        RedisTimeSeries acepta muestras atrasadas dentro del RETENTION.
+        Retorna (muestras, labels por clave de todas las series involucradas,
+        actualizaciones del contador de energía ordenadas por timestamp).
+        El "energy_total" opcional de la lectura es `aenergy.total` (Wh) y
+        "billing_day" el día de corte del usuario (acumulador del ciclo).
+        """
+        samples = []
+        labels_by_key = {}
+        energy_updates = []
+
+        for offset, reading in enumerate(readings):
+            timestamp = reading.get("timestamp") or base_timestamp + offset
+
+            series = self._series_for_device(reading["user_id"], reading["device_id"])
+            (key_watts, _), (key_volts, _), (key_amps, _) = series
+            labels_by_key.update(series)
+
+            samples.extend((
+                (key_watts, timestamp, reading["watts"]),
+                (key_volts, timestamp, reading["volts"]),
+                (key_amps,  timestamp, reading["amps"])
+            ))
+
+            energy_key, energy_labels = self._energy_series(reading["user_id"], reading["device_id"])
+            labels_by_key[energy_key] = energy_labels
+            energy_updates.append(self._energy_update(
+                reading["user_id"], reading["device_id"], timestamp, reading["watts"],
+                reading.get("energy_total"), reading.get("billing_day")
+            ))
+
+        # El contador se integra en orden cronológico
+        energy_updates.sort(key=lambda update: update[1][0])
+        return samples, labels_by_key, energy_updates
+
+    def _mrange_args(
+        self, user_id: int, from_ts, to_ts, ts_type, device_ids: list | None,
+        aggregation: str | None, bucket_ms: int | None, align,
+        tier: str | None, tier_agg: str, reduce: str | None, group_by: str = "user_id"
+    ) -> list:
+        """
+        Argumentos de TS.MRANGE sobre las series de un usuario, seleccionadas por labels.
+
+        - `ts_type`: un tipo ("watts") o varios (("watts", "volts", "amps")).
+        - `tier`: lee el tier compactado (labels agg/tier); sin él, solo las crudas (`tier=`).
+        - `device_ids`: restringe a esos dispositivos (ej. solo los activos).
+        - `reduce`: GROUPBY <group_by> REDUCE <reduce> → una serie por valor del label
+          (con "user_id", una sola serie combinada).
+        """
+        args = ['TS.MRANGE', from_ts, to_ts]
+        if aggregation:
+            if align is not None:  # "start" / "end" o un timestamp
+                args.extend(('ALIGN', align))
+            args.extend(('AGGREGATION', aggregation, bucket_ms))
+
+        types = ts_type if isinstance(ts_type, str) else f"({','.join(ts_type)})"
+        args.extend(('FILTER', f'user_id={user_id}', f'type={types}'))
+        if tier:
+            args.extend((f'agg={tier_agg}', f'tier={tier}'))
+        else:
+            args.append('tier=')
+        if device_ids is not None:
+            args.append(f"device_id=({','.join(str(d) for d in device_ids)})")
+
+        if reduce:
+            args.extend(('GROUPBY', group_by, 'REDUCE', reduce))
+        return args
+
+    def _chunks(self, samples: list) -> list[list]:
+        return [
+            samples[start:start + MADD_CHUNK_SAMPLES]
+            for start in range(0, len(samples), MADD_CHUNK_SAMPLES)
+        ]
+
+    def _failed_samples(self, chunks: list[list], results: list) -> list:
+        """Muestras rechazadas por TS.MADD porque su serie ya no existe."""
+        retry = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                # Falló el comando completo
+                failed = chunk if _is_missing_key_error(result) else []
+                if not failed:
+                    logger.error(f"❌ Error en TS.MADD: {result}")
+            else:
+                # TS.MADD reporta errores por elemento
+                failed = [
+                    sample for sample, item in zip(chunk, result)
+                    if isinstance(item, Exception) and _is_missing_key_error(item)
+                ]
+            retry.extend(failed)
+        return retry
+
+    def _failed_energy_updates(self, updates: list, results: list) -> list:
+        """Actualizaciones de energía rechazadas porque la serie no existe."""
+        retry = []
+        for update, result in zip(updates, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Error actualizando energía {update[0][1]}: {result}")
+            elif result != 1:
+                retry.append(update)
+        return retry
+
+    def _forget_missing(self, retry: list) -> set:
+        missing_keys = {key for key, _, _ in retry}
+        logger.warning(f"⚠️ Series desaparecidas, recreando: {sorted(missing_keys)}")
+        for key in missing_keys:
+            _known_series.discard(key)
+        return missing_keys
+
+
+class TimeSeriesRepository(_TimeSeriesBase):
     def __init__(self, redis_client: Redis):
         self.redis = redis_client
 
-    def _ensure_ts_exists(self, key: str, labels: Dict):
+    def _ensure_ts_exists(self, key: str, labels: Dict) -> bool:
         """
         Crea la serie de tiempo solo si no existe.
     
         ✅ FIXED: Verifica correctamente si la serie existe antes de crear
+
+        Retorna True si la serie existe (o se creó) al terminar.
         """
     
         try:
@@ -24,28 +477,10 @@ class TimeSeriesRepository:
             info = self.redis.ts().info(key)
         
             # ✅ Serie existe - Validar configuración
-            current_retention = info.retention_msecs
-            current_dup_policy = info.duplicate_policy
-        
-            # Convertir bytes a string si es necesario
-            if isinstance(current_dup_policy, bytes):
-                current_dup_policy = current_dup_policy.decode()
-        
-            # Verificar configuración correcta
-            config_is_correct = (
-                current_retention == RETENTION_MS and 
-                current_dup_policy.lower() == 'last'
-            )
-        
-            if not config_is_correct:
-                logger.warning(
-                    f"⚠️ Configuración incorrecta en {key}: "
-                    f"retention={current_retention}ms (esperado: {RETENTION_MS}ms), "
-                    f"dup_policy={current_dup_policy} (esperado: last)"
-                )      
+            self._check_config(key, info)
         
             # ✅ Serie existe y está configurada - NO hacer nada más
-            return
+            return True
         
         except Exception as e:
             error_msg = str(e).lower()
@@ -53,21 +488,14 @@ class TimeSeriesRepository:
             # ✅ Solo crear si el error es "no existe"
             if "does not exist" not in error_msg and "no such key" not in error_msg:
                 logger.error(f"❌ Error inesperado verificando {key}: {e}")
-                return  # No intentar crear si hay otro tipo de error
+                return False  # No intentar crear si hay otro tipo de error
         
             # ✅ La serie NO existe - Crear
             try:
                 logger.info(f"📝 Creando nueva serie: {key}")
             
-                self.redis.execute_command(
-                    'TS.CREATE', key,
-                    'RETENTION', str(RETENTION_MS),
-                    'DUPLICATE_POLICY', 'LAST',
-                    'LABELS',
-                    'user_id', str(labels.get('user_id', '')),
-                    'device_id', str(labels.get('device_id', '')),
-                    'type', str(labels.get('type', ''))
-                )
+                self.redis.execute_command(*self._create_args(key, labels))
+                self._ensure_compactions(key, labels)
             
                 # ✅ Verificar creación
                 verify_info = self.redis.ts().info(key)
@@ -82,6 +510,7 @@ class TimeSeriesRepository:
                     f"   • RETENTION: {verify_retention}ms ({verify_retention / 86400000:.1f} días)\n"
                     f"   • DUPLICATE_POLICY: {verify_dup_policy}"
                 )
+                return True
             
             except Exception as create_error:
                 create_error_msg = str(create_error).lower()
@@ -89,51 +518,127 @@ class TimeSeriesRepository:
                 if "already exists" in create_error_msg or "tsdb: key already exists" in create_error_msg:
                     # Otro worker la creó justo ahora - está bien
                     logger.debug(f"✅ Serie ya existe (creada por otro worker): {key}")
+                    return True
                 else:
                     logger.error(f"❌ Error creando serie {key}: {create_error}")
                     raise
 
-    def add_measurements(self, user_id: int, device_id: str, watts: float, volts: float, amps: float):
+    def _ensure_compactions(self, key: str, labels: Dict, existing: set = frozenset()) -> int:
+        """
+        Crea las series compactadas y sus reglas (tolera que ya existan).
+
+        Retorna el número de reglas creadas.
+        """
+        created = 0
+        for args in self._compaction_commands(key, labels, existing):
+            try:
+                self.redis.execute_command(*args)
+                if args[0] == 'TS.CREATERULE':
+                    created += 1
+            except Exception as e:
+                # Serie destino o regla creada antes (u otro worker): está bien
+                if "already" not in str(e).lower():
+                    logger.error(f"❌ Error en {args[0]} (compactación de {key}): {e}")
+        return created
+
+    def _ensure_known(self, series: list[tuple[str, Dict]]):
+        """
+        Verifica/crea solo las series que este worker aún no conoce.
+
+        ✅ En estado estable no hay ningún TS.INFO: la serie ya está en el registro.
+        """
+        for key, labels in series:
+            if key in _known_series:
+                continue
+            if self._ensure_ts_exists(key, labels):
+                _known_series.set(key)
+
+    def _madd(self, samples: list[tuple[str, int, float]], labels_by_key: Dict[str, Dict]):
+        """
+        Inserta muestras (key, timestamp, valor) con TS.MADD en un único pipeline.
+
+        Si Redis responde "TSDB: key does not exist" (serie borrada o expirada),
+        se olvida la serie del registro, se recrea y se reintenta una vez.
+        """
+        chunks = self._chunks(samples)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for chunk in chunks:
+            pipe.execute_command('TS.MADD', *[arg for sample in chunk for arg in sample])
+        results = pipe.execute(raise_on_error=False)
+
+        retry = self._failed_samples(chunks, results)
+        if not retry:
+            return
+
+        missing_keys = self._forget_missing(retry)
+        self._ensure_known([(key, labels_by_key[key]) for key in missing_keys])
+
+        self.redis.execute_command('TS.MADD', *[arg for sample in retry for arg in sample])
+
+    def _update_energy(self, updates: list, labels_by_key: Dict[str, Dict]):
+        """
+        Actualiza los contadores de energía (script Lua atómico) en un único pipeline.
+
+        Si una serie de energía desapareció se recrea y se reintenta una vez.
+        """
+        if not updates:
+            return
+
+        script = self.redis.register_script(ENERGY_UPDATE_LUA)
+        pipe = self.redis.pipeline(transaction=False)
+        for keys, args in updates:
+            script(keys=keys, args=args, client=pipe)
+        results = pipe.execute(raise_on_error=False)
+
+        retry = self._failed_energy_updates(updates, results)
+        if not retry:
+            return
+
+        missing_keys = self._forget_missing([(keys[1], None, None) for keys, _ in retry])
+        self._ensure_known([(key, labels_by_key[key]) for key in missing_keys])
+        for keys, args in retry:
+            script(keys=keys, args=args)
+
+    def add_measurements(
+        self, user_id: int, device_id: str, watts: float, volts: float, amps: float,
+        timestamp: int | None = None, energy_total: float | None = None, billing_day: int | None = None
+    ):
         """
         Guarda las mediciones de un dispositivo en Redis TimeSeries.
         
-        ✅ Multi-worker safe: Cada worker verifica en Redis antes de insertar.
+        ✅ Multi-worker safe: La creación de series tolera carreras entre workers.
+        ✅ Registro local de series conocidas: sin TS.INFO en estado estable.
         ✅ Optimización: Usa TS.MADD para insertar 3 valores en una operación.
+        ✅ `timestamp` (ms, ej. hora del dispositivo) permite insertar lecturas atrasadas.
+        ✅ Actualiza el contador de energía acumulada (`energy_total` = aenergy.total)
+           y el acumulado del ciclo de facturación (`billing_day` del usuario).
         """
-        # Generar timestamp UTC actual
-        base_timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
+        # Hora de la lectura, o timestamp UTC actual
+        base_timestamp = timestamp or int(datetime.now(timezone.utc).timestamp() * 1000)
         
         # Construir nombres de las series
-        key_watts = f"ts:user:{user_id}:device:{device_id}:watts"
-        key_volts = f"ts:user:{user_id}:device:{device_id}:volts"
-        key_amps  = f"ts:user:{user_id}:device:{device_id}:amps"
+        series = self._series_for_device(user_id, device_id)
+        (key_watts, _), (key_volts, _), (key_amps, _) = series
+        energy_key, energy_labels = self._energy_series(user_id, device_id)
 
         try:
-            # ✅ Asegurar que las series existan
-            # Cada worker verifica en Redis (no en cache local)
-            self._ensure_ts_exists(key_watts, {
-                "user_id": str(user_id),
-                "device_id": str(device_id),
-                "type": "watts"
-            })
-            self._ensure_ts_exists(key_volts, {
-                "user_id": str(user_id),
-                "device_id": str(device_id),
-                "type": "volts"
-            })
-            self._ensure_ts_exists(key_amps, {
-                "user_id": str(user_id),
-                "device_id": str(device_id),
-                "type": "amps"
-            })
+            # ✅ Asegurar que las series existan (solo la primera vez por worker)
+            self._ensure_known(series + [(energy_key, energy_labels)])
 
             # ✅ Insertar datos usando TS.MADD
-            # Timestamps ligeramente diferentes para evitar colisiones
-            self.redis.execute_command(
-                'TS.MADD',
-                key_watts, base_timestamp, watts,
-                key_volts, base_timestamp + 1, volts,
-                key_amps,  base_timestamp + 2, amps
+            # Mismo timestamp en las 3 series: son claves distintas, no colisionan
+            self._madd(
+                [
+                    (key_watts, base_timestamp, watts),
+                    (key_volts, base_timestamp, volts),
+                    (key_amps,  base_timestamp, amps)
+                ],
+                dict(series)
+            )
+            self._update_energy(
+                [self._energy_update(user_id, device_id, base_timestamp, watts, energy_total, billing_day)],
+                {energy_key: energy_labels}
             )
             
             logger.debug(
@@ -147,6 +652,432 @@ class TimeSeriesRepository:
             )
             # No re-lanzar - permitir que otras peticiones continúen
 
+    def add_measurements_batch(self, readings: List[Dict]) -> int:
+        """
+        Guarda un lote de mediciones (de uno o varios dispositivos) en Redis TimeSeries.
+
+        Cada lectura es un dict con: user_id, device_id, watts, volts, amps
+        y opcionalmente timestamp (ms).
+
+        ✅ Las series se verifican una sola vez por dispositivo del lote.
+        ✅ Todas las muestras viajan en TS.MADD dentro de un único pipeline.
+
+        Retorna el número de lecturas guardadas.
+        """
+        if not readings:
+            return 0
+
+        # Generar timestamp UTC actual
+        base_timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+        try:
+            samples, labels_by_key, energy_updates = self._build_batch(readings, base_timestamp)
+
+            # ✅ Asegurar que las series existan (una vez por serie del lote)
+            self._ensure_known(list(labels_by_key.items()))
+
+            # ✅ Insertar todo el lote: TS.MADD en bloques dentro de un solo pipeline
+            self._madd(samples, labels_by_key)
+            self._update_energy(energy_updates, labels_by_key)
+
+            logger.debug(
+                f"💾 Lote guardado: {len(readings)} lecturas, "
+                f"{len(labels_by_key) // 3} dispositivos, ts={base_timestamp}"
+            )
+            return len(readings)
+
+        except Exception as e:
+            logger.error(f"❌ Error guardando lote de {len(readings)} lecturas: {e}")
+            return 0
+
+
+    def _energy_at(self, energy_key: str, timestamp: int) -> float | None:
+        """
+        Valor del contador de energía (Wh) en `timestamp`: la última muestra hasta ese momento.
+
+        Si los datos crudos ya expiraron se usa el tier compactado más fino que
+        lo tenga (solo buckets que cierran antes de `timestamp`).
+        """
+        sample = self.redis.execute_command('TS.REVRANGE', energy_key, '-', timestamp, 'COUNT', 1)
+        if sample:
+            return float(sample[0][1])
+
+        for tier, bucket_ms, _ in COMPACTION_TIERS:
+            tier_key = compaction_key(energy_key, "last", tier)
+            try:
+                sample = self.redis.execute_command('TS.REVRANGE', tier_key, '-', timestamp - bucket_ms, 'COUNT', 1)
+            except Exception:
+                continue
+            if sample:
+                return float(sample[0][1])
+        return None
+
+    def get_energy_between(self, user_id: int, device_id, from_ts: int, to_ts: int) -> float | None:
+        """
+        kWh consumidos por un dispositivo entre dos instantes (ms): diferencia de
+        dos lecturas puntuales del contador de energía acumulada.
+
+        Retorna None si el contador no cubre el rango (ej. hay lecturas de watts
+        anteriores a que existiera el contador); el llamador debe integrar los
+        watts crudos en ese caso.
+        """
+        energy_key, _ = self._energy_series(user_id, device_id)
+        watts_key = self._series_for_device(user_id, device_id)[0][0]
+
+        try:
+            end_wh = self._energy_at(energy_key, to_ts)
+            start_wh = self._energy_at(energy_key, from_ts)
+
+            if start_wh is None:
+                # El contador empezó dentro del rango: sirve solo si no hay
+                # watts anteriores a su primera muestra
+                first = self.redis.execute_command('TS.RANGE', energy_key, from_ts, to_ts, 'COUNT', 1)
+                first_ts = int(first[0][0]) if first else to_ts + 1
+                uncovered = self.redis.execute_command('TS.RANGE', watts_key, from_ts, first_ts - 1, 'COUNT', 1)
+                if uncovered:
+                    return None
+                if not first:
+                    return 0.0
+                start_wh = float(first[0][1])
+
+            return max(0.0, (end_wh - start_wh) / 1000.0)
+
+        except Exception as e:
+            if _is_missing_key_error(e):
+                return None
+            logger.error(f"❌ Error leyendo contador de energía {energy_key}: {e}")
+            return None
+
+
+    def get_cycle_energy(self, user_id: int, cycle_start_ts: int, device_ids: list) -> float | None:
+        """
+        kWh del ciclo de facturación en curso (suma de `device_ids`), leídos del
+        acumulador que mantiene la ingesta: un solo HGETALL.
+
+        Retorna None si el acumulador no corresponde a ese ciclo o no lo cubre
+        completo (se creó a mitad de ciclo); el llamador debe calcularlo.
+        """
+        try:
+            cycle = self.redis.hgetall(energy_cycle_key(user_id))
+        except Exception as e:
+            logger.error(f"❌ Error leyendo acumulado del ciclo de user {user_id}: {e}")
+            return None
+
+        if not cycle or cycle.get("complete") != "1":
+            return None
+        if int(float(cycle.get("cycle_start", 0))) != cycle_start_ts:
+            return None
+
+        total_wh = sum(float(cycle.get(f"device:{device_id}", 0.0)) for device_id in device_ids)
+        return total_wh / 1000.0
+
+
+    def _mrange(self, user_id: int, from_ts, to_ts, **options) -> Dict[str, list] | None:
+        try:
+            return _parse_mrange(self.redis.execute_command(*self._mrange_args(user_id, from_ts, to_ts, **options)))
+        except Exception as e:
+            logger.error(f"❌ Error en TS.MRANGE de user {user_id}: {e}")
+            return None
+
+    def get_user_series(
+        self, user_id: int, from_ts, to_ts, ts_type: str = "watts", device_ids: list | None = None,
+        aggregation: str | None = None, bucket_ms: int | None = None, align=None,
+        tier: str | None = None, tier_agg: str = "twa"
+    ) -> Dict[int, list] | None:
+        """
+        Series de todos los dispositivos del usuario en un solo TS.MRANGE
+        (en lugar de un TS.RANGE por dispositivo).
+
+        Retorna {device_id: [(ts_ms, valor), ...]} (los dispositivos sin serie no
+        aparecen) o None si Redis falla.
+        """
+        if device_ids is not None and not device_ids:
+            return {}
+        series = self._mrange(
+            user_id, from_ts, to_ts, ts_type=ts_type, device_ids=device_ids,
+            aggregation=aggregation, bucket_ms=bucket_ms, align=align,
+            tier=tier, tier_agg=tier_agg, reduce=None
+        )
+        if series is None:
+            return None
+        return {int(key.split(":")[4]): samples for key, samples in series.items()}
+
+    def get_user_total_series(
+        self, user_id: int, from_ts, to_ts, ts_type: str = "watts", device_ids: list | None = None,
+        aggregation: str | None = None, bucket_ms: int | None = None, align=None,
+        tier: str | None = None, tier_agg: str = "twa", reduce: str = "sum"
+    ) -> list | None:
+        """
+        Series de los dispositivos del usuario combinadas en Redis
+        (TS.MRANGE ... GROUPBY user_id REDUCE sum): [(ts_ms, valor), ...].
+
+        Retorna [] si no hay series y None si Redis falla.
+        """
+        if device_ids is not None and not device_ids:
+            return []
+        series = self._mrange(
+            user_id, from_ts, to_ts, ts_type=ts_type, device_ids=device_ids,
+            aggregation=aggregation, bucket_ms=bucket_ms, align=align,
+            tier=tier, tier_agg=tier_agg, reduce=reduce
+        )
+        if series is None:
+            return None
+        return next(iter(series.values()), [])
+
+    def get_user_series_by_type(
+        self, user_id: int, from_ts, to_ts, ts_types=("watts", "volts", "amps"),
+        aggregations=("avg",), bucket_ms: int = DAY_MS, reduce: str = "sum"
+    ) -> Dict[str, Dict[str, list]] | None:
+        """
+        Buckets de todas las series crudas del usuario combinadas por tipo
+        (TS.MRANGE ... GROUPBY type REDUCE <reduce>), una consulta por agregación
+        en un solo pipeline. Las series se resuelven por el índice de labels:
+        no hace falta KEYS ni SCAN.
+
+        Retorna {agregación: {tipo: [(ts_ms, valor), ...]}} o None si Redis falla.
+        Ej. aggregations=("sum", "count") da el promedio exacto de todas las
+        muestras del bucket (suma / conteo), sin importar cuántos dispositivos haya.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for aggregation in aggregations:
+            pipe.execute_command(*self._mrange_args(
+                user_id, from_ts, to_ts, ts_type=ts_types, device_ids=None,
+                aggregation=aggregation, bucket_ms=bucket_ms, align=None,
+                tier=None, tier_agg="", reduce=reduce, group_by="type"
+            ))
+        try:
+            results = pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ Error en TS.MRANGE por tipo de user {user_id}: {e}")
+            return None
+
+        # Las series agrupadas se llaman "type=<tipo>"
+        return {
+            aggregation: {key.split("=", 1)[-1]: samples for key, samples in _parse_mrange(result).items()}
+            for aggregation, result in zip(aggregations, results)
+        }
+
+
+    def list_raw_series(self, ts_type: str = "watts") -> list[tuple[int, int]]:
+        """(user_id, device_id) de todas las series crudas, por el índice de labels (TS.QUERYINDEX)."""
+        keys = self.redis.execute_command('TS.QUERYINDEX', f'type={ts_type}', 'tier=')
+        series = []
+        for key in keys:
+            key = key.decode() if isinstance(key, bytes) else key
+            parts = key.split(":")  # ts:user:{u}:device:{d}:{tipo}
+            series.append((int(parts[2]), int(parts[4])))
+        return series
+
+    def iter_device_readings(
+        self, user_id: int, device_id, from_ts: int, to_ts: int, chunk_samples: int = EXPORT_CHUNK_SAMPLES
+    ) -> Iterator[list[tuple[int, float | None, float | None, float | None]]]:
+        """
+        Recorre las lecturas crudas de un dispositivo en páginas de
+        `chunk_samples` (TS.RANGE ... COUNT de watts, volts y amps en un pipeline).
+
+        Genera listas de filas (ts_ms, watts, volts, amps) ordenadas; la memoria
+        usada no depende del tamaño del rango. Cada página llega hasta el último
+        timestamp común a las tres series y la siguiente empieza 1 ms después.
+        """
+        keys = [key for key, _ in self._series_for_device(user_id, device_id)]
+        cursor = from_ts
+
+        while cursor <= to_ts:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.execute_command('TS.RANGE', key, cursor, to_ts, 'COUNT', chunk_samples)
+            pages = []
+            for page in pipe.execute(raise_on_error=False):
+                if isinstance(page, Exception):
+                    if not _is_missing_key_error(page):
+                        raise page
+                    page = []  # La serie no existe: columna vacía
+                pages.append(page)
+
+            if not any(pages):
+                return
+
+            # Una serie que llenó la página puede tener más muestras después:
+            # la página termina en el menor de esos últimos timestamps
+            window_end = min((int(page[-1][0]) for page in pages if len(page) >= chunk_samples), default=to_ts)
+
+            rows = {}
+            for column, page in enumerate(pages):
+                for ts, value in page:
+                    ts = int(ts)
+                    if ts > window_end:
+                        break
+                    rows.setdefault(ts, [None, None, None])[column] = float(value)
+
+            yield [(ts, *values) for ts, values in sorted(rows.items())]
+            cursor = window_end + 1
+
+
+class AsyncTimeSeriesRepository(_TimeSeriesBase):
+    """
+    Variante asíncrona (redis.asyncio) para la ingesta.
+
+    Misma lógica que TimeSeriesRepository y mismo registro de series conocidas,
+    pero sin bloquear el event loop que atiende WebSockets y comandos RPC.
+    """
+
+    def __init__(self, redis_client: AsyncRedis):
+        self.redis = redis_client
+
+    async def _ensure_ts_exists(self, key: str, labels: Dict) -> bool:
+        """Crea la serie de tiempo solo si no existe. Retorna True si existe al terminar."""
+        try:
+            info = await self.redis.ts().info(key)
+            self._check_config(key, info)
+            return True
+
+        except Exception as e:
+            if not _is_missing_key_error(e):
+                logger.error(f"❌ Error inesperado verificando {key}: {e}")
+                return False
+
+            try:
+                logger.info(f"📝 Creando nueva serie: {key}")
+                await self.redis.execute_command(*self._create_args(key, labels))
+                await self._ensure_compactions(key, labels)
+                logger.info(f"✅ Serie creada: {key}")
+                return True
+
+            except Exception as create_error:
+                if "already exists" in str(create_error).lower():
+                    # Otro worker la creó justo ahora - está bien
+                    logger.debug(f"✅ Serie ya existe (creada por otro worker): {key}")
+                    return True
+                logger.error(f"❌ Error creando serie {key}: {create_error}")
+                raise
+
+    async def _ensure_compactions(self, key: str, labels: Dict):
+        """Crea las series compactadas y sus reglas (tolera que ya existan)."""
+        for args in self._compaction_commands(key, labels):
+            try:
+                await self.redis.execute_command(*args)
+            except Exception as e:
+                if "already" not in str(e).lower():
+                    logger.error(f"❌ Error en {args[0]} (compactación de {key}): {e}")
+
+    async def _ensure_known(self, series: list[tuple[str, Dict]]):
+        """Verifica/crea solo las series que este worker aún no conoce."""
+        for key, labels in series:
+            if key in _known_series:
+                continue
+            if await self._ensure_ts_exists(key, labels):
+                _known_series.set(key)
+
+    async def _madd(self, samples: list[tuple[str, int, float]], labels_by_key: Dict[str, Dict]):
+        """TS.MADD en un único pipeline, recreando series desaparecidas (un reintento)."""
+        chunks = self._chunks(samples)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for chunk in chunks:
+            pipe.execute_command('TS.MADD', *[arg for sample in chunk for arg in sample])
+        results = await pipe.execute(raise_on_error=False)
+
+        retry = self._failed_samples(chunks, results)
+        if not retry:
+            return
+
+        missing_keys = self._forget_missing(retry)
+        await self._ensure_known([(key, labels_by_key[key]) for key in missing_keys])
+
+        await self.redis.execute_command('TS.MADD', *[arg for sample in retry for arg in sample])
+
+    async def _update_energy(self, updates: list, labels_by_key: Dict[str, Dict]):
+        """Contadores de energía en un único pipeline (ver TimeSeriesRepository._update_energy)."""
+        if not updates:
+            return
+
+        script = self.redis.register_script(ENERGY_UPDATE_LUA)
+        pipe = self.redis.pipeline(transaction=False)
+        for keys, args in updates:
+            await script(keys=keys, args=args, client=pipe)
+        results = await pipe.execute(raise_on_error=False)
+
+        retry = self._failed_energy_updates(updates, results)
+        if not retry:
+            return
+
+        missing_keys = self._forget_missing([(keys[1], None, None) for keys, _ in retry])
+        await self._ensure_known([(key, labels_by_key[key]) for key in missing_keys])
+        for keys, args in retry:
+            await script(keys=keys, args=args)
+
+    async def add_measurements(
+        self, user_id: int, device_id: str, watts: float, volts: float, amps: float,
+        timestamp: int | None = None, energy_total: float | None = None, billing_day: int | None = None
+    ):
+        """Guarda las mediciones de un dispositivo (ver TimeSeriesRepository.add_measurements)."""
+        return await self.add_measurements_batch([{
+            "user_id": user_id,
+            "device_id": device_id,
+            "watts": watts,
+            "volts": volts,
+            "amps": amps,
+            "timestamp": timestamp,
+            "energy_total": energy_total,
+            "billing_day": billing_day
+        }]) == 1
+
+    async def add_measurements_batch(self, readings: List[Dict]) -> int:
+        """Guarda un lote de mediciones. Retorna el número de lecturas guardadas."""
+        if not readings:
+            return 0
+
+        base_timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+        try:
+            samples, labels_by_key, energy_updates = self._build_batch(readings, base_timestamp)
+            await self._ensure_known(list(labels_by_key.items()))
+            await self._madd(samples, labels_by_key)
+            await self._update_energy(energy_updates, labels_by_key)
+
+            logger.debug(
+                f"💾 Lote guardado: {len(readings)} lecturas, "
+                f"{len(labels_by_key) // 3} dispositivos, ts={base_timestamp}"
+            )
+            return len(readings)
+
+        except Exception as e:
+            logger.error(f"❌ Error guardando lote de {len(readings)} lecturas: {e}")
+            return 0
+
+
+def _energy_arg(energy_total) -> str:
+    return "" if energy_total is None else str(energy_total)
+
+
+def _parse_mrange(response) -> Dict[str, list]:
+    """
+    Normaliza la respuesta de TS.MRANGE a {clave: [(ts_ms, valor), ...]}.
+
+    Acepta RESP2 crudo ([clave, labels, muestras]), RESP2 ya parseado por
+    redis-py ({clave: [labels, muestras]}) y RESP3 ({clave: [labels, ..., muestras]}).
+    """
+    if isinstance(response, dict):
+        entries = list(response.items())
+    else:
+        entries = []
+        for entry in response or []:
+            if isinstance(entry, dict):
+                entries.extend(entry.items())
+            else:
+                entries.append((entry[0], entry[1:]))
+
+    series = {}
+    for key, value in entries:
+        key = key.decode() if isinstance(key, bytes) else key
+        series[key] = [(int(ts), float(v)) for ts, v in value[-1]]
+    return series
+
+
+def _is_missing_key_error(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return "does not exist" in error_msg or "no such key" in error_msg
+
 
 # 🔧 Función de utilidad para limpiar series manualmente
 def delete_series(redis_client: Redis, user_id: int, device_id: int):
@@ -157,6 +1088,9 @@ def delete_series(redis_client: Redis, user_id: int, device_id: int):
     - Resetear series con configuración incorrecta
     - Testing y desarrollo
     - Limpieza manual
+
+    Las series compactadas (historial largo) se conservan; al recrear la serie
+    cruda se vuelven a enlazar con TS.CREATERULE.
     
     Uso:
         from app.repositories.timeseries_repository import delete_series
@@ -173,6 +1107,7 @@ def delete_series(redis_client: Redis, user_id: int, device_id: int):
     for key in keys_to_delete:
         try:
             result = redis_client.delete(key)
+            _known_series.discard(key)
             if result:
                 deleted += 1
                 logger.info(f"🗑️ Serie eliminada: {key}")
@@ -1,20 +1,25 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from redis import Redis
+from datetime import datetime, timezone
 
 from app.database import get_db, get_redis_client
-from app.core import TokenData, get_current_user
-from app.schemas import HistoryPeriod, HistoryResponse
-from app.services import get_history_data
+from app.core import TokenData, get_current_user, settings
+from app.core.http_cache import etag_response
+from app.schemas import HistoryPeriod, HistoryResponse, HistoryRangeResponse, ExportFormat
+from app.services import get_history_data, get_history_range, export_device_readings
 from app.services import get_last_7_days_data
 
 router = APIRouter(prefix="/history", tags=["History"])
 
 @router.get("/graph", response_model=HistoryResponse)
-def get_history_graph_route(period:HistoryPeriod = Query(...,description="El periodo de la grafica: 'daily', 'weekly', 'monthly'"),
+def get_history_graph_route(request:Request,
+                            period:HistoryPeriod = Query(...,description="El periodo de la grafica: 'daily', 'weekly', 'monthly'"),
+                            breakdown:bool = Query(False,description="Incluir la serie de cada dispositivo ademas del total"),
                             db:Session = Depends(get_db),redis_client = Depends(get_redis_client),current_user:TokenData = Depends(get_current_user)):
-    history_data = get_history_data(db, redis_client, current_user.user_id,period)
+    history_data = get_history_data(db, redis_client, current_user.user_id,period,breakdown)
 
     if history_data is None:
         raise HTTPException(
@@ -22,11 +27,69 @@ def get_history_graph_route(period:HistoryPeriod = Query(...,description="El per
             detail="No se encontraron datos de consumo para el periodo solicitado o el usuario no tiene dispositivos activados "
         )
     
-    return history_data
+    return etag_response(request, HistoryResponse.model_validate(history_data), settings.HISTORY_HTTP_MAX_AGE_SECONDS)
+
+
+@router.get("/range", response_model=HistoryRangeResponse)
+def get_history_range_route(request:Request,
+                            from_dt:datetime = Query(...,alias="from",description="Inicio del rango (ISO 8601; sin zona = UTC)"),
+                            to_dt:datetime = Query(...,alias="to",description="Fin del rango (ISO 8601; sin zona = UTC)"),
+                            points:int = Query(500,ge=3,le=2000,description="Numero maximo de puntos de la grafica"),
+                            db:Session = Depends(get_db),redis_client = Depends(get_redis_client),current_user:TokenData = Depends(get_current_user)):
+    from_dt = from_dt if from_dt.tzinfo else from_dt.replace(tzinfo=timezone.utc)
+    to_dt = to_dt if to_dt.tzinfo else to_dt.replace(tzinfo=timezone.utc)
+    if from_dt >= to_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' debe ser anterior a 'to'"
+        )
+
+    history_data = get_history_range(db, redis_client, current_user.user_id, from_dt, to_dt, points)
+
+    if history_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontraron datos de consumo para el rango solicitado o el usuario no tiene dispositivos activados"
+        )
+
+    return etag_response(request, HistoryRangeResponse.model_validate(history_data), settings.HISTORY_HTTP_MAX_AGE_SECONDS)
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+@router.get("/export")
+def export_history_route(device_id:int = Query(...,description="Dispositivo a exportar"),
+                         from_dt:datetime = Query(...,alias="from",description="Inicio del rango (ISO 8601; sin zona = UTC)"),
+                         to_dt:datetime = Query(...,alias="to",description="Fin del rango (ISO 8601; sin zona = UTC)"),
+                         format:ExportFormat = Query(ExportFormat.CSV,description="'csv' o 'ndjson'"),
+                         db:Session = Depends(get_db),redis_client = Depends(get_redis_client),current_user:TokenData = Depends(get_current_user)):
+    from_dt = from_dt if from_dt.tzinfo else from_dt.replace(tzinfo=timezone.utc)
+    to_dt = to_dt if to_dt.tzinfo else to_dt.replace(tzinfo=timezone.utc)
+    if from_dt >= to_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' debe ser anterior a 'to'"
+        )
+
+    stream = export_device_readings(db, redis_client, current_user.user_id, device_id, from_dt, to_dt, format)
+    if stream is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dispositivo no encontrado o no pertenece al usuario.")
+
+    filename = f"ecowatt_device_{device_id}_{from_dt:%Y%m%d}_{to_dt:%Y%m%d}.{format.value}"
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @router.get("/last7days")
 def get_last_7_days_graph(
+    request: Request,
     db: Session = Depends(get_db),
     redis_client: Redis = Depends(get_redis_client),
     current_user: TokenData = Depends(get_current_user)
@@ -34,4 +97,4 @@ def get_last_7_days_graph(
     result = get_last_7_days_data(db, redis_client, current_user.user_id)
     if not result:
         raise HTTPException(status_code=404, detail="No hay datos de los últimos 7 días.")
-    return result
\ No newline at end of file
+    return etag_response(request, result, settings.HISTORY_HTTP_MAX_AGE_SECONDS)
\ No newline at end of file
@@ -2,21 +2,28 @@
 
 from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
 from sqlalchemy.orm import Session
-from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
-from app.database import get_db, get_redis_client
-from app.schemas import ShellyIngestData
-from app.services import process_shelly_data
-from app.core import logger
+from app.database import get_db, get_async_redis_client
+from app.schemas import ShellyIngestData, ShellyIngestBatch
+from app.services import process_shelly_data, process_shelly_batch
+from app.core import logger, settings
 
 router = APIRouter(prefix="/ingest", tags=["Ingestion"])
 
-@router.post("/shelly")
+
+def _require_http_ingest():
+    """Rechaza la ingesta HTTP cuando los dispositivos ya publican por MQTT."""
+    if not settings.INGEST_HTTP_ENABLED:
+        raise HTTPException(status_code=503, detail="Ingesta HTTP deshabilitada, usar MQTT.")
+
+
+@router.post("/shelly", dependencies=[Depends(_require_http_ingest)])
 async def ingest_shelly_data(
     data: ShellyIngestData,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_client: AsyncRedis = Depends(get_async_redis_client)
 ):
     """
     Endpoint público para recibir datos de dispositivos Shelly.
@@ -32,4 +39,27 @@ async def ingest_shelly_data(
         return {"status": "received"}
     except Exception as e:
         logger.error(f"Error en el endpoint de ingesta: {e}")
-        raise HTTPException(status_code=500, detail="Error interno al procesar los datos.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error interno al procesar los datos.")
+
+
+@router.post("/shelly/batch", dependencies=[Depends(_require_http_ingest)])
+async def ingest_shelly_batch(
+    batch: ShellyIngestBatch,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    redis_client: AsyncRedis = Depends(get_async_redis_client)
+):
+    """
+    Endpoint público para recibir lotes de lecturas Shelly.
+
+    Pensado para gateways y dispositivos con buffer: acepta lecturas de uno o
+    varios dispositivos y las guarda con un único pipeline de TS.MADD.
+    """
+    try:
+        background_tasks.add_task(process_shelly_batch, db, redis_client, batch.readings)
+
+        return {"status": "received", "readings": len(batch.readings)}
+    except Exception as e:
+        logger.error(f"Error en el endpoint de ingesta por lotes: {e}")
+        raise HTTPException(status_code=500, detail="Error interno al procesar los datos.")
+
@@ -1,6 +1,6 @@
 # app/routers/report_router.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from redis import Redis
 from datetime import datetime, timezone
@@ -10,7 +10,7 @@ from pydantic import BaseModel
 from app.database import get_db, get_redis_client
 from app.core import TokenData, get_current_user
 from app.schemas.monthly_report_schema import MonthlyReport, GenerateReportRequest
-from app.services.report_service import generate_monthly_report
+from app.services.report_service import generate_monthly_report, get_stored_report_json
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
@@ -27,7 +27,8 @@ def generate_monthly_report_route(
     
     ✅ NUEVO COMPORTAMIENTO:
     - Mes actual: Genera en tiempo real desde Redis (no guarda en BD)
-    - Mes anterior: Busca en BD primero, si no existe lo genera y guarda
+    - Mes anterior: Busca en BD primero (se envía el JSON guardado tal cual),
+      si no existe lo genera y guarda
     """
     # Validar mes
     if not 1 <= request.month <= 12:
@@ -43,6 +44,12 @@ def generate_monthly_report_route(
             detail="El año debe estar entre 2020 y 2030"
         )
     
+    # ✅ Mes cerrado ya guardado: el JSON de la BD va directo al cliente
+    # (se validó al guardarse; no pasa otra vez por MonthlyReport)
+    stored_json = get_stored_report_json(db, current_user.user_id, request.month, request.year)
+    if stored_json is not None:
+        return Response(content=stored_json, media_type="application/json")
+    
     # Generar reporte (ahora con lógica de cache)
     report = generate_monthly_report(
         db=db,
@@ -69,7 +76,7 @@ def get_current_month_report_route(
 ):
     """
     Genera el reporte del mes actual automáticamente.
-    Siempre genera en tiempo real (no usa cache).
+    Siempre genera en tiempo real (solo los días ya cerrados salen de cache).
     """
     now = datetime.now(timezone.utc)
     
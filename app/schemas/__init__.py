@@ -14,9 +14,9 @@ from .report_schema import ReportResponse, CreateReport, UpdateReport
 # New Schemas
 from .alert_schema import AlertResponse
 from .recommendation_schema import RecommendationResponse
-from .ingest_schema import ShellySwitchStatus, ShellyIngestData, ShellySysStatus
+from .ingest_schema import ShellySwitchStatus, ShellyIngestData, ShellySysStatus, ShellyIngestBatch, ShellyEnergyCounters
 from .dashboard_schema import DashboardSummary
-from .history_schema import HistoryPeriod, HistoryResponse
+from .history_schema import HistoryPeriod, HistoryResponse, HistoryDeviceSeries, HistoryRangeResponse, ExportFormat
 from .fcm_schema import FCMTokenRegister
 from .device_control_schema import ControlSetRequest, StatusResponse, ControlResponse
 
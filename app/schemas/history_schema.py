@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from datetime import datetime
 from enum import Enum
 
@@ -9,11 +9,28 @@ class HistoryDataPoints(BaseModel):
     value:float
 
 
-#Respuesta que recibira el frontend
+#Serie de un dispositivo (desglose opcional de la grafica)
+class HistoryDeviceSeries(BaseModel):
+    device_id: int
+    device_name: str
+    data_points: List[HistoryDataPoints]
+
+
+#Respuesta que recibira el frontend (data_points = suma de todos los dispositivos activos)
 class HistoryResponse(BaseModel):
     period:str
     unit:str = "kWh"
     data_points: List[HistoryDataPoints]
+    devices: Optional[List[HistoryDeviceSeries]] = None
+
+#Respuesta de la grafica por rango libre (potencia promedio, reducida con LTTB)
+class HistoryRangeResponse(BaseModel):
+    start: datetime
+    end: datetime
+    unit: str = "W"
+    source: str             # "raw", el tier compactado leido ("1m", "1h", "1d") o "archive" (archivo frio + crudos)
+    resolution_ms: int      # Tamaño del bucket leido de Redis
+    data_points: List[HistoryDataPoints]
 
 #Periodos en los que se podra ver la grafica historica[diaria, semanal, mensual]
 class HistoryPeriod(str, Enum):
@@ -22,4 +39,7 @@ class HistoryPeriod(str, Enum):
     MONTHLY = "monthly"
 
 
-
+#Formatos de exportacion de lecturas crudas
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
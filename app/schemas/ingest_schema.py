@@ -1,6 +1,13 @@
 # app/schemas/ingest_schema.py 
 
 from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# Contadores de energía de "switch:0" (aenergy)
+class ShellyEnergyCounters(BaseModel):
+    total: float                                # Wh acumulados desde el arranque
+    by_minute: List[float] = []                 # mWh de los últimos minutos completos
+    minute_ts: Optional[int] = None             # Unix (s) del inicio del minuto actual
 
 # Modelo para la sección "switch:0" del JSON del Shelly
 class ShellySwitchStatus(BaseModel):
@@ -8,12 +15,40 @@ class ShellySwitchStatus(BaseModel):
     apower: float   
     voltage: float  
     current: float  
+    aenergy: Optional[ShellyEnergyCounters] = None
 
 # Modelo para la sección "sys" del JSON del Shelly
 class ShellySysStatus(BaseModel):
     mac: str
+    unixtime: Optional[float] = None            # Hora del dispositivo (None si no tiene NTP)
 
 # El modelo principal que representa todo el cuerpo de la petición
 class ShellyIngestData(BaseModel):
     switch_status: ShellySwitchStatus = Field(..., alias="switch:0")
-    sys_status: ShellySysStatus = Field(..., alias="sys")
\ No newline at end of file
+    sys_status: ShellySysStatus = Field(..., alias="sys")
+
+    def device_timestamp_ms(self) -> Optional[int]:
+        """Hora de la lectura según el dispositivo (sys.unixtime, ms), o None si no la reporta."""
+        if self.sys_status.unixtime:
+            return int(self.sys_status.unixtime * 1000)
+        return None
+
+    def device_minute_ms(self) -> Optional[int]:
+        """
+        Inicio del minuto en curso según el dispositivo (aenergy.minute_ts, ms).
+
+        Solo sirve para validar el reloj: todas las lecturas de un minuto traen
+        el mismo valor, así que nunca se usa como hora de la muestra.
+        """
+        aenergy = self.switch_status.aenergy
+        if aenergy and aenergy.minute_ts:
+            return aenergy.minute_ts * 1000
+        return None
+
+# Límite de lecturas por petición en la ingesta por lotes
+MAX_BATCH_READINGS = 1000
+
+# Lote de lecturas (de uno o varios dispositivos) enviado por un gateway o un
+# dispositivo con buffer local
+class ShellyIngestBatch(BaseModel):
+    readings: List[ShellyIngestData] = Field(..., min_length=1, max_length=MAX_BATCH_READINGS)
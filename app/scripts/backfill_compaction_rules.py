@@ -0,0 +1,87 @@
+# app/scripts/backfill_compaction_rules.py
+"""
+Migración: crea los tiers de compactación (1m / 1h / 1d) en las series que ya
+existían antes de TS.CREATERULE y rellena su historial.
+
+Las reglas solo agregan muestras nuevas, así que para cada regla creada se
+calculan los buckets ya cerrados con TS.RANGE ... AGGREGATION y se escriben con
+TS.MADD. El bucket en curso lo completa la regla (puede quedar parcial si la
+migración corre a mitad del bucket).
+
+Es idempotente: las series que ya tienen sus reglas se omiten.
+
+Uso:
+    python -m app.scripts.backfill_compaction_rules            # aplicar
+    python -m app.scripts.backfill_compaction_rules --dry-run  # solo listar
+"""
+
+import argparse
+import re
+from datetime import datetime, timezone
+
+from app.core import logger
+from app.database.database import redis_client
+from app.repositories.timeseries_repository import TimeSeriesRepository, rule_destinations
+
+RAW_KEY_PATTERN = re.compile(r"^ts:user:(\d+):device:(\d+):(watts|volts|amps)$")
+BACKFILL_CHUNK_SAMPLES = 1000
+
+
+def _backfill(raw_key: str, dest: str, aggregation: str, bucket_ms: int, now_ms: int) -> int:
+    """Copia a `dest` los buckets cerrados de `raw_key`. Retorna el número de buckets."""
+    current_bucket_start = now_ms - now_ms % bucket_ms
+    points = redis_client.execute_command(
+        'TS.RANGE', raw_key, '-', current_bucket_start - 1,
+        'AGGREGATION', aggregation, bucket_ms
+    )
+    for start in range(0, len(points), BACKFILL_CHUNK_SAMPLES):
+        chunk = points[start:start + BACKFILL_CHUNK_SAMPLES]
+        redis_client.execute_command('TS.MADD', *[arg for ts, value in chunk for arg in (dest, ts, value)])
+    return len(points)
+
+
+def migrate(dry_run: bool = False):
+    ts_repo = TimeSeriesRepository(redis_client)
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    series_checked = 0
+    rules_created = 0
+
+    for key in redis_client.scan_iter(match="ts:user:*:device:*", count=1000):
+        key = key.decode() if isinstance(key, bytes) else key
+        match = RAW_KEY_PATTERN.match(key)
+        if not match:
+            continue  # Series compactadas u otras claves
+
+        series_checked += 1
+        user_id, device_id, ts_type = match.groups()
+        labels = {"user_id": user_id, "device_id": device_id, "type": ts_type}
+
+        existing = rule_destinations(redis_client.ts().info(key))
+        commands = ts_repo._compaction_commands(key, labels, existing)
+        rules = [args for args in commands if args[0] == 'TS.CREATERULE']
+        if not rules:
+            continue
+
+        if dry_run:
+            logger.info(f"🔎 {key}: faltan {len(rules)} reglas ({', '.join(args[2] for args in rules)})")
+            continue
+
+        rules_created += ts_repo._ensure_compactions(key, labels, existing)
+
+        for args in rules:
+            # ['TS.CREATERULE', key, dest, 'AGGREGATION', agg, bucket_ms]
+            dest, aggregation, bucket_ms = args[2], args[4], int(args[5])
+            backfilled = _backfill(key, dest, aggregation, bucket_ms, now_ms)
+            logger.info(f"📦 {dest}: {backfilled} buckets rellenados")
+
+    logger.info(
+        f"✅ Migración de compactación {'(dry-run) ' if dry_run else ''}terminada: "
+        f"{series_checked} series revisadas, {rules_created} reglas creadas"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea y rellena los tiers de compactación de Redis TimeSeries")
+    parser.add_argument("--dry-run", action="store_true", help="Solo listar las reglas que faltan")
+    migrate(dry_run=parser.parse_args().dry_run)
@@ -0,0 +1,102 @@
+# app/scripts/bench_energy.py
+"""
+Microbenchmark: ciclos punto a punto (dashboard / reporte) vs. el kernel
+vectorizado de app.core.energy sobre un mes de datos a 1 Hz (~2.6M puntos,
+con el mismo formato que devuelve TS.RANGE).
+
+No se conecta a Redis ni a la base de datos, pero importar app.core carga
+la configuración: necesita las mismas variables de entorno (o el .env) que
+la API.
+
+Uso:
+    python -m app.scripts.bench_energy
+    python -m app.scripts.bench_energy --days 7 --repeat 5
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from app.core.energy import MAX_GAP_SECONDS, integrate_samples
+
+
+def _synthetic_month(days: int, seed: int = 42) -> list:
+    """Serie a 1 Hz con huecos ocasionales (> MAX_GAP_SECONDS), como [[ts_ms, watts], ...]."""
+    rng = random.Random(seed)
+    ts = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    samples = []
+    for _ in range(days * 86_400):
+        samples.append([ts, rng.uniform(50.0, 1500.0)])
+        ts += 1000 if rng.random() > 0.0005 else 120_000  # Desconexión de 2 minutos
+    return samples
+
+
+def _legacy_total(data) -> float:
+    """Ciclo que usaba el dashboard."""
+    watt_seconds = 0.0
+    for i in range(1, len(data)):
+        t0, v0 = data[i - 1]
+        t1, v1 = data[i]
+        dt_seconds = (t1 - t0) / 1000.0
+        if dt_seconds > MAX_GAP_SECONDS:
+            continue
+        watt_seconds += (float(v0) + float(v1)) / 2.0 * dt_seconds
+    return watt_seconds / 3_600_000.0
+
+
+def _legacy_daily(data) -> dict:
+    """Ciclo que usaba el reporte mensual (total + mapa diario)."""
+    daily = defaultdict(float)
+    for i in range(1, len(data)):
+        t0, v0 = data[i - 1]
+        t1, v1 = data[i]
+        dt_seconds = (t1 - t0) / 1000.0
+        if dt_seconds > MAX_GAP_SECONDS:
+            continue
+        day = datetime.fromtimestamp(t0 / 1000, tz=timezone.utc).date()
+        daily[day] += (float(v0) + float(v1)) / 2.0 * dt_seconds / 3_600_000.0
+    return daily
+
+
+def _best_of(repeat: int, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(days: int, repeat: int):
+    data = _synthetic_month(days)
+    print(f"Serie sintética: {len(data):,} puntos ({days} días a 1 Hz)")
+
+    cases = [
+        ("total (dashboard)", _legacy_total, lambda d: integrate_samples(d, daily=False).total_kwh),
+        ("total + diario (reporte)", _legacy_daily, lambda d: integrate_samples(d).daily_kwh),
+        ("total + diario + horario", None, lambda d: integrate_samples(d, hourly=True)),
+    ]
+    for name, legacy, kernel in cases:
+        kernel_s, kernel_result = _best_of(repeat, kernel, data)
+        if legacy is None:
+            print(f"{name:<28} kernel {kernel_s * 1000:9.1f} ms")
+            continue
+        legacy_s, legacy_result = _best_of(repeat, legacy, data)
+        if isinstance(legacy_result, dict):
+            diff = max(abs(legacy_result[day] - kernel_result.get(day, 0.0)) for day in legacy_result)
+        else:
+            diff = abs(legacy_result - kernel_result)
+        print(
+            f"{name:<28} ciclo {legacy_s * 1000:9.1f} ms | kernel {kernel_s * 1000:9.1f} ms | "
+            f"x{legacy_s / kernel_s:6.1f} | dif. máx {diff:.2e} kWh"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la integración de energía")
+    parser.add_argument("--days", type=int, default=30, help="Días de datos a 1 Hz")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+    run(args.days, args.repeat)
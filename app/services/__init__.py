@@ -17,12 +17,15 @@ from .device_service import (
 )
 
 from .ingest_service import(
-    process_shelly_data
+    process_shelly_data,
+    process_shelly_batch
 )
 
 from .dashboard_service import get_dashboard_summary
 
-from .history_service import get_history_data, get_last_7_days_data
+from .history_service import get_history_data, get_history_range, get_last_7_days_data
+
+from .export_service import export_device_readings
 
 from .analysis_service import analyze_consumption_patterns
 
@@ -31,4 +34,4 @@ from .alert_service import get_alerts_by_user_service
 from .recommendation_service import get_recommendations_by_user_service
 
 
-from .report_service import generate_monthly_report
+from .report_service import generate_monthly_report, get_stored_report_json
@@ -0,0 +1,58 @@
+# app/services/archive_service.py
+
+from datetime import datetime, timedelta, timezone
+
+from redis import Redis
+
+from app.core import logger, settings
+from app.repositories import ArchiveRepository, TimeSeriesRepository
+from app.repositories.archive_repository import day_start_ms
+from app.repositories.timeseries_repository import DAY_MS, RETENTION_MS
+
+
+def archive_closed_days(redis_client: Redis, now: datetime | None = None) -> dict:
+    """
+    Copia al archivo frío (settings.ARCHIVE_DIR) los días cerrados de cada serie cruda.
+
+    Un día está cerrado cuando ya no puede recibir lecturas atrasadas
+    (INGEST_MAX_LATE_SECONDS). Se revisan todos los días cerrados que Redis aún
+    conserva completos, así que una noche sin correr se recupera en la siguiente;
+    los días ya archivados se omiten. Redis no se toca: las lecturas expiran
+    solas con RETENTION_MS. Un día sin lecturas se guarda como un .npy vacío
+para no volver a leerlo de Redis cada noche.
+    """
+    now = now or datetime.now(timezone.utc)
+    now_ms = int(now.timestamp() * 1000)
+    ts_repo = TimeSeriesRepository(redis_client)
+    archive = ArchiveRepository(settings.ARCHIVE_DIR)
+
+    last_day = datetime.fromtimestamp((now_ms - settings.INGEST_MAX_LATE_SECONDS * 1000) / 1000, tz=timezone.utc).date() - timedelta(days=1)
+    first_day = datetime.fromtimestamp((now_ms - RETENTION_MS) / 1000, tz=timezone.utc).date() + timedelta(days=1)
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+    stats = {"days": 0, "empty_days": 0, "readings": 0, "errors": 0}
+    series = ts_repo.list_raw_series()
+    logger.info(f"🗄️ Archivando {len(series)} dispositivos, días {first_day} → {last_day}")
+
+    for user_id, device_id in series:
+        for day in days:
+            if archive.has_day(user_id, device_id, day):
+                continue
+            try:
+                start_ms = day_start_ms(day)
+                rows = [
+                    row
+                    for page in ts_repo.iter_device_readings(user_id, device_id, start_ms, start_ms + DAY_MS - 1)
+                    for row in page
+                ]
+                stats["readings"] += archive.write_day(user_id, device_id, day, rows)
+                stats["days" if rows else "empty_days"] += 1
+            except Exception as e:
+                logger.error(f"❌ Error archivando device {device_id} ({day}): {e}")
+                stats["errors"] += 1
+
+    logger.info(
+        f"✅ Archivo: {stats['days']} días ({stats['empty_days']} vacíos aparte), "
+        f"{stats['readings']} lecturas, {stats['errors']} errores"
+    )
+    return stats
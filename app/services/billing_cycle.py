@@ -0,0 +1,32 @@
+# app/services/billing_cycle.py
+
+import calendar
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+
+def billing_cycle_start(now_utc: datetime, billing_day: int) -> datetime:
+    """
+    Inicio (00:00 UTC) del ciclo de facturación que contiene `now_utc`.
+
+    Si el día de corte aún no llega este mes, el ciclo empezó el mes anterior;
+    en meses más cortos que el día de corte se usa su último día (ej. 31 → 28 feb,
+    así que el 28 de febrero ya abre el ciclo nuevo).
+
+    ⚠️ El acumulador del ciclo en Redis replica este cálculo en Lua
+    (billing_cycle_start en timeseries_repository.ENERGY_LUA_FUNCTION).
+    """
+    def cut_off(moment: datetime) -> int:
+        return min(billing_day, calendar.monthrange(moment.year, moment.month)[1])
+
+    base = now_utc if now_utc.day >= cut_off(now_utc) else now_utc - relativedelta(months=1)
+    return base.replace(day=cut_off(base), hour=0, minute=0, second=0, microsecond=0)
+
+
+def current_billing_cycle(now_utc: datetime, billing_day: int) -> tuple[datetime, datetime]:
+    """(inicio, fin) del ciclo en curso. Fin = inicio del ciclo siguiente - 1 segundo."""
+    start_date = billing_cycle_start(now_utc, billing_day)
+    # Último día del mes siguiente: siempre está en o después de su día de corte
+    next_start = billing_cycle_start(start_date + relativedelta(months=1, day=31), billing_day)
+    end_date = next_start - timedelta(seconds=1)
+    return start_date, end_date
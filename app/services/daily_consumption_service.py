@@ -0,0 +1,108 @@
+# app/services/daily_consumption_service.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from redis import Redis
+from sqlalchemy.orm import Session
+
+from app.core import logger, settings
+from app.core.energy import MAX_GAP_SECONDS, summarize_day
+from app.repositories import DailyConsumptionRepository, DeviceRepository, ReportDayCacheRepository, TimeSeriesRepository
+from app.repositories.archive_repository import day_start_ms
+from app.repositories.timeseries_repository import DAY_MS, RETENTION_MS
+from app.services.billing_cycle import billing_cycle_start
+
+
+def _pending_days(days: list, device_ids: list, updated_at: dict, late_seconds: int) -> list:
+    """
+    Días con algún dispositivo sin fila definitiva. Una fila es definitiva si se
+    calculó después de que el día dejó de aceptar lecturas atrasadas.
+    """
+    pending = []
+    for day in days:
+        final_after = datetime.fromtimestamp(day_start_ms(day) / 1000, tz=timezone.utc) + timedelta(days=1, seconds=late_seconds)
+        if any(
+            updated_at.get((device_id, day)) is None or updated_at[(device_id, day)] < final_after
+            for device_id in device_ids
+        ):
+            pending.append(day)
+    return pending
+
+
+def _drop_changed_report_days(report_cache: ReportDayCacheRepository, user_id: int, billing_day: int, rows: list):
+    """
+    Borra del cache del reporte del mes en curso los días cuyo total recalculado
+    cambió (p. ej. lecturas atrasadas). Los días sin cambios se conservan.
+    """
+    daily_by_cycle = defaultdict(lambda: defaultdict(float))
+    for row in rows:
+        day = row["date"]
+        cycle_start = billing_cycle_start(datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc), billing_day).date()
+        daily_by_cycle[cycle_start][day] += row["kwh"]
+
+    for cycle_start, daily_kwh in daily_by_cycle.items():
+        dropped = report_cache.drop_changed(user_id, cycle_start, daily_kwh)
+        if dropped:
+            logger.info(f"🔄 Cache de reporte de user {user_id}: {dropped} días recalculados")
+
+
+def rollup_daily_consumption(db: Session, redis_client: Redis, now: datetime | None = None) -> dict:
+    """
+    Materializa en tbdailyconsumption el consumo por dispositivo y día UTC
+    cerrado que Redis aún conserva completo.
+
+    Es incremental: solo recalcula días sin fila o cuya fila se calculó cuando
+    todavía podían llegar lecturas atrasadas (INGEST_MAX_LATE_SECONDS), así que
+    la primera corrida rellena la retención y las siguientes solo tocan los
+    últimos días. Un día sin lecturas se guarda con 0 kWh.
+    """
+    now = now or datetime.now(timezone.utc)
+    now_ms = int(now.timestamp() * 1000)
+    last_day = now.date() - timedelta(days=1)
+    first_day = datetime.fromtimestamp((now_ms - RETENTION_MS) / 1000, tz=timezone.utc).date() + timedelta(days=1)
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+    devices_by_user = defaultdict(list)
+    billing_day_by_user = {}
+    for device in DeviceRepository(db).get_all_active_devices():
+        devices_by_user[device.dev_user_id].append(device.dev_id)
+        billing_day_by_user[device.dev_user_id] = device.user.user_billing_day
+
+    ts_repo = TimeSeriesRepository(redis_client)
+    rollup_repo = DailyConsumptionRepository(db)
+    report_cache = ReportDayCacheRepository(redis_client)
+    stats = {"users": 0, "rows": 0, "errors": 0}
+    logger.info(f"📆 Consumo diario: {len(devices_by_user)} usuarios, días {first_day} → {last_day}")
+
+    for user_id, device_ids in devices_by_user.items():
+        try:
+            updated_at = rollup_repo.get_updated_at(user_id, first_day, last_day)
+            rows = []
+            for day in _pending_days(days, device_ids, updated_at, settings.INGEST_MAX_LATE_SECONDS):
+                start_ms = day_start_ms(day)
+                # La primera lectura después de medianoche cierra el último intervalo del día
+                series = ts_repo.get_user_series(
+                    user_id, start_ms, start_ms + DAY_MS + int(MAX_GAP_SECONDS * 1000), device_ids=device_ids
+                )
+                if series is None:
+                    raise RuntimeError(f"Redis no respondió para el día {day}")
+                for device_id in device_ids:
+                    samples = series.get(device_id, [])
+                    summary = summarize_day([ts for ts, _ in samples], [watts for _, watts in samples], start_ms)
+                    rows.append({"device_id": device_id, "date": day, **summary})
+
+            if rollup_repo.upsert_many(user_id, rows):
+                _drop_changed_report_days(report_cache, user_id, billing_day_by_user[user_id], rows)
+                stats["rows"] += len(rows)
+                stats["users"] += 1
+            else:
+                stats["errors"] += 1
+        except Exception as e:
+            logger.error(f"❌ Error en consumo diario de user {user_id}: {e}")
+            stats["errors"] += 1
+
+    logger.info(
+        f"✅ Consumo diario: {stats['rows']} filas de {stats['users']} usuarios, {stats['errors']} errores"
+    )
+    return stats
@@ -2,10 +2,11 @@
 
 from sqlalchemy.orm import Session
 from redis import Redis
-from datetime import datetime, timedelta, timezone
-from dateutil.relativedelta import relativedelta
-from app.repositories import TarrifRepository, UserRepository, RecommendationRepository
+from datetime import datetime, timezone
+from app.repositories import TarrifRepository, UserRepository, RecommendationRepository, TimeSeriesRepository
 from app.core import logger, settings
+from app.core.energy import integrate_samples
+from app.services.billing_cycle import current_billing_cycle
 
 def get_dashboard_summary(db: Session, redis_client: Redis, user_id: int):
     try:
@@ -22,32 +23,8 @@ def get_dashboard_summary(db: Session, redis_client: Redis, user_id: int):
         billing_day = user.user_billing_day
         
         # === USAR LA MISMA LÓGICA DEL REPORTE ===
-        try:
-            if now_utc.day >= billing_day:
-                start_date = now_utc.replace(day=billing_day, hour=0, minute=0, second=0, microsecond=0)
-            else:
-                start_date = (now_utc - relativedelta(months=1)).replace(
-                    day=billing_day, hour=0, minute=0, second=0, microsecond=0
-                )
-        except ValueError:
-            # Manejar días inválidos (ej: 31 en febrero)
-            import calendar
-            if now_utc.day >= billing_day:
-                last_day = calendar.monthrange(now_utc.year, now_utc.month)[1]
-                start_date = now_utc.replace(
-                    day=min(billing_day, last_day),
-                    hour=0, minute=0, second=0, microsecond=0
-                )
-            else:
-                prev_month = now_utc - relativedelta(months=1)
-                last_day = calendar.monthrange(prev_month.year, prev_month.month)[1]
-                start_date = prev_month.replace(
-                    day=min(billing_day, last_day),
-                    hour=0, minute=0, second=0, microsecond=0
-                )
-
         # Fin del ciclo: 1 mes después - 1 segundo
-        end_date = (start_date + relativedelta(months=1)) - timedelta(seconds=1)
+        start_date, end_date = current_billing_cycle(now_utc, billing_day)
 
         # ✅ CORRECCIÓN CRÍTICA: Usar NOW para cálculo, pero NO exceder end_date
         # El ciclo puede no haber terminado aún
@@ -73,47 +50,47 @@ def get_dashboard_summary(db: Session, redis_client: Redis, user_id: int):
         # 4️⃣ Calcular consumo TOTAL de TODOS los dispositivos
         total_kwh = 0.0
         devices_with_data = 0
+        ts_repo = TimeSeriesRepository(redis_client)
+
+        # ✅ O(1): acumulado del ciclo que mantiene la ingesta (un solo HGETALL)
+        cycle_kwh = ts_repo.get_cycle_energy(user_id, start_ts, [d.dev_id for d in active_devices])
+        if cycle_kwh is not None:
+            total_kwh = cycle_kwh
+            devices_with_data = len(active_devices)
+            logger.info(f"   ✅ Acumulado del ciclo: {cycle_kwh:.4f} kWh")
         
-        for device in active_devices:
-            watts_key = f"ts:user:{user_id}:device:{device.dev_id}:watts"
-            
-            try:
-                # Obtener datos del periodo
-                data = redis_client.ts().range(watts_key, from_time=start_ts, to_time=end_ts)
+        # Dispositivos sin contador que cubra el ciclo: se integran los watts crudos
+        pending_devices = []
+        for device in (active_devices if cycle_kwh is None else []):
+            # ✅ Contador de energía acumulada: diferencia de dos lecturas puntuales
+            device_kwh = ts_repo.get_energy_between(user_id, device.dev_id, start_ts, end_ts)
+            if device_kwh is not None:
+                total_kwh += device_kwh
+                devices_with_data += 1
+                logger.info(f"   ✅ Device {device.dev_id}: {device_kwh:.4f} kWh (contador)")
+                continue
+            pending_devices.append(device)
+
+        if pending_devices:
+            # ✅ Un solo TS.MRANGE para todos los dispositivos pendientes
+            series = ts_repo.get_user_series(
+                user_id, start_ts, end_ts, device_ids=[d.dev_id for d in pending_devices]
+            ) or {}
+
+            for device in pending_devices:
+                data = series.get(device.dev_id, [])
                 logger.info(f"   Device {device.dev_id} ({device.dev_name}): {len(data)} puntos")
                 
                 if len(data) < 2:
                     logger.warning(f"   ⚠️ Insuficientes datos para device {device.dev_id}")
                     continue
                 
-                # Calcular kWh usando integración trapezoidal
-                device_watt_seconds = 0.0
-                MAX_GAP_SECONDS = 60.0
-                for i in range(1, len(data)):
-                    try:
-                        t0, t1 = data[i-1][0], data[i][0]
-                        v0, v1 = float(data[i-1][1]), float(data[i][1])
-                        dt = (t1 - t0) / 1000.0  # ms → s
-
-                        if dt > MAX_GAP_SECONDS:
-                            # Si hay un salto grande, asumimos que el dispositivo estuvo apagado
-                            # o desconectado. No sumamos nada en este intervalo.
-                            continue
-
-                        avg_watts = (v0 + v1) / 2.0
-                        device_watt_seconds += avg_watts * dt
-                    except Exception as e:
-                        logger.error(f"   Error procesando punto {i}: {e}")
-                
-                device_kwh = device_watt_seconds / 3_600_000.0
+                # Calcular kWh usando integración trapezoidal (kernel vectorizado)
+                device_kwh = integrate_samples(data, daily=False).total_kwh
                 total_kwh += device_kwh
                 devices_with_data += 1
                 
                 logger.info(f"   ✅ Device {device.dev_id}: {device_kwh:.4f} kWh")
-                
-            except Exception as e:
-                logger.error(f"   ❌ Error leyendo {watts_key}: {e}")
-                continue
         
         logger.info(f"💡 Total kWh calculado: {total_kwh:.4f} ({devices_with_data} dispositivos)")
 
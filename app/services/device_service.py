@@ -2,10 +2,20 @@
 
 from sqlalchemy.orm import Session
 from app.models import Device
-from app.repositories import DeviceRepository
+from app.repositories import DeviceRepository, DeviceCacheRepository
 from app.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
 from app.core import logger
 
+def _invalidate_device_cache(hardware_id: str):
+    """Invalida el cache MAC → dispositivo en Redis y en la memoria de todos los workers."""
+    try:
+        from app.database import get_redis_client
+        redis = next(get_redis_client())
+        DeviceCacheRepository(redis).invalidate(hardware_id)
+        logger.info(f"🗑️ Cache invalidado para {hardware_id}")
+    except Exception as e:
+        logger.error(f"❌ No se pudo invalidar el cache de {hardware_id}: {e}")
+
 def get_device_by_id_service(db: Session, dev_id: int, user_id: int) -> DeviceResponse | None:
     device_repo = DeviceRepository(db)
     device = device_repo.get_device_by_id_repository(dev_id)
@@ -39,6 +49,8 @@ def create_device_service(db: Session, user_id: int, device_data: DeviceCreate)
     device = device_repo.create_device_repository(new_device)
     if device:
         logger.info(f"Dispositivo creado para el usuario {user_id}")
+        # La MAC pudo quedar cacheada como "no existe" por la ingesta
+        _invalidate_device_cache(device.dev_hardware_id)
         return DeviceResponse.model_validate(device)
     
     return None
@@ -58,11 +70,7 @@ def update_device_service(db: Session, dev_id: int, user_id: int, device_data: D
     
     if updated_device:
          # === INVALIDAR CACHE ===
-        from app.database import get_redis_client
-        redis = next(get_redis_client())
-        cache_key = f"device:mac:{updated_device.dev_hardware_id}"
-        redis.delete(cache_key)
-        logger.info(f"🗑️ Cache invalidado para device {dev_id}")
+        _invalidate_device_cache(updated_device.dev_hardware_id)
         return DeviceResponse.model_validate(updated_device)
     
     return None
@@ -73,18 +81,25 @@ def delete_device_service(db: Session, dev_id: int, user_id: int) -> bool:
     
     if not device or device.dev_user_id != user_id:
         return False # No se encontró o no pertenece al usuario
-        
-    return device_repo.delete_device_repository(dev_id)
 
+    hardware_id = device.dev_hardware_id
+    deleted = device_repo.delete_device_repository(dev_id)
+    if deleted:
+        _invalidate_device_cache(hardware_id)
+    return deleted
 
-def change_device_status_service(db:Session, dev_id:int, user_id:int) -> bool:
+
+def change_device_status_service(db:Session, dev_id:int, user_id:int) -> Device | None:
     device_repo = DeviceRepository(db)
     device = device_repo.get_device_by_id_repository(dev_id)
 
     if not device or device.dev_user_id != user_id:
-        return False # No se encontró o no pertenece al usuario
-        
-    return device_repo.change_device_status(dev_id)
+        return None # No se encontró o no pertenece al usuario
+
+    updated_device = device_repo.change_device_status(dev_id)
+    if updated_device:
+        _invalidate_device_cache(updated_device.dev_hardware_id)
+    return updated_device
 
     
 
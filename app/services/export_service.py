@@ -0,0 +1,106 @@
+# app/services/export_service.py
+
+import itertools
+import json
+from datetime import datetime, timezone
+from typing import Iterator
+
+import numpy as np
+from redis import Redis
+from sqlalchemy.orm import Session
+
+from app.core import logger, settings
+from app.repositories import ArchiveRepository, DeviceRepository, TimeSeriesRepository
+from app.repositories.timeseries_repository import EXPORT_CHUNK_SAMPLES, RETENTION_MS
+from app.schemas import ExportFormat
+
+CSV_HEADER = "timestamp,ts_ms,watts,volts,amps\n"
+
+
+def _iso(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _csv_value(value: float | None) -> str:
+    return "" if value is None else repr(value)
+
+
+def _csv_chunk(rows: list) -> str:
+    return "".join(
+        f"{_iso(ts)},{ts},{_csv_value(watts)},{_csv_value(volts)},{_csv_value(amps)}\n"
+        for ts, watts, volts, amps in rows
+    )
+
+
+def _ndjson_chunk(rows: list) -> str:
+    return "".join(
+        json.dumps({"timestamp": _iso(ts), "ts_ms": ts, "watts": watts, "volts": volts, "amps": amps}) + "\n"
+        for ts, watts, volts, amps in rows
+    )
+
+
+def _archive_value(value) -> float | None:
+    # str() de un float32 da su representación corta ("230.1", no "230.10000610351562")
+    return None if np.isnan(value) else float(str(value))
+
+
+def _archive_pages(archive: ArchiveRepository, user_id: int, device_id: int, from_ts: int, to_ts: int) -> Iterator[list]:
+    """Lecturas del archivo frío con la misma forma que iter_device_readings (NaN → None)."""
+    for block in archive.iter_day_slices(user_id, device_id, from_ts, to_ts):
+        for offset in range(0, len(block), EXPORT_CHUNK_SAMPLES):
+            page = block[offset:offset + EXPORT_CHUNK_SAMPLES]
+            yield [
+                (int(ts), _archive_value(watts), _archive_value(volts), _archive_value(amps))
+                for ts, watts, volts, amps in page
+            ]
+
+
+def _stream(ts_repo: TimeSeriesRepository, user_id: int, device_id: int, from_ts: int, to_ts: int, fmt: ExportFormat) -> Iterator[str]:
+    """
+    Un bloque de texto por página de TS.RANGE: memoria constante sin importar el rango.
+
+    Lo anterior a la retención de Redis sale del archivo frío.
+    """
+    if fmt == ExportFormat.CSV:
+        yield CSV_HEADER
+    to_text = _csv_chunk if fmt == ExportFormat.CSV else _ndjson_chunk
+
+    hot_from = int(datetime.now(timezone.utc).timestamp() * 1000) - RETENTION_MS
+    pages = []
+    if from_ts < hot_from:
+        pages.append(_archive_pages(ArchiveRepository(settings.ARCHIVE_DIR), user_id, device_id, from_ts, min(to_ts, hot_from - 1)))
+    if to_ts >= hot_from:
+        pages.append(ts_repo.iter_device_readings(user_id, device_id, max(from_ts, hot_from), to_ts))
+
+    exported = 0
+    try:
+        for rows in itertools.chain.from_iterable(pages):
+            exported += len(rows)
+            yield to_text(rows)
+    except Exception as e:
+        # Los headers ya se enviaron: solo se puede cortar el stream
+        logger.error(f"❌ Error exportando device {device_id} de user {user_id}: {e}")
+        raise
+    logger.info(f"📤 Exportación device {device_id} ({fmt.value}): {exported} lecturas")
+
+
+def export_device_readings(
+    db: Session, redis_client: Redis, user_id: int, device_id: int,
+    from_dt: datetime, to_dt: datetime, fmt: ExportFormat
+) -> Iterator[str] | None:
+    """
+    Lecturas crudas (watts, volts, amps) de un dispositivo del usuario como
+    CSV o NDJSON, en un generador para StreamingResponse.
+
+    Retorna None si el dispositivo no existe o no pertenece al usuario.
+    """
+    device = DeviceRepository(db).get_device_by_id_repository(device_id)
+    if not device or device.dev_user_id != user_id:
+        logger.warning(f"Usuario {user_id} intentó exportar el dispositivo {device_id} sin permiso.")
+        return None
+
+    from_ts = int(from_dt.timestamp() * 1000)
+    to_ts = int(to_dt.timestamp() * 1000)
+    logger.info(f"📤 Exportando device {device_id}: {from_dt.isoformat()} → {to_dt.isoformat()} ({fmt.value})")
+
+    return _stream(TimeSeriesRepository(redis_client), user_id, device_id, from_ts, to_ts, fmt)
@@ -2,20 +2,86 @@
 from sqlalchemy.orm import Session
 from redis import Redis
 from datetime import datetime, timezone, timedelta
-from app.repositories import UserRepository
-from app.core import logger
+from app.repositories import UserRepository, TimeSeriesRepository, HistoryCacheRepository, ArchiveRepository
+from app.repositories.timeseries_repository import (
+    COMPACTION_TIERS, DAY_MS, RETENTION_MS, bucket_for_range, resolution_for_range, tier_for_bucket
+)
+from app.core.downsampling import lttb
+from app.core import logger, settings
 from app.schemas import HistoryPeriod
 from collections import defaultdict
 
-def get_history_data(db: Session, redis_client: Redis, user_id: int, period: HistoryPeriod):
+# Buckets que se piden a Redis por cada punto final: material para que LTTB
+# conserve los picos sin que la respuesta de Redis crezca con el rango
+HISTORY_RANGE_OVERSAMPLE = 4
+
+
+def _to_data_points(samples, bucket_duration_ms: int) -> list:
+    """Buckets [(ts_ms, watts promedio)] → puntos de la gráfica en kWh."""
+    # kWh = (Watts promedio * horas en el bucket) / 1000
+    bucket_hours = (bucket_duration_ms / 1000) / 3600.0
+    data_points = []
+    for ts, avg_watts in samples:
+        dt_object = datetime.fromtimestamp(int(ts) / 1000, tz=timezone.utc)
+        kwh_value = (float(avg_watts or 0.0) * bucket_hours) / 1000.0
+        data_points.append({
+            "timestamp": dt_object.isoformat(),
+            "value": round(kwh_value, 6)
+        })
+    return data_points
+
+
+def _read_closed_buckets(ts_repo, user_id: int, device_ids: list, from_ts: int, to_ts: int, bucket_ms: int) -> dict:
+    """
+    Promedio de watts de cada (dispositivo, bucket) cerrado en [from_ts, to_ts).
+    Retorna {(device_id, bucket_start): watts | None} (None = sin lecturas).
+
+    Lee el tier compactado (twa) cuando existe. Un bucket del tier solo es
+    definitivo hasta el último bucket que Redis ya emitió para esa serie (la
+    regla emite un bucket cuando llega una muestra del siguiente); lo posterior
+    se lee de los datos crudos.
+    """
+    starts = list(range(from_ts, to_ts, bucket_ms))
+    result = {(d, s): None for d in device_ids for s in starts}
+    query = dict(aggregation="avg", bucket_ms=bucket_ms)
+
+    tier = tier_for_bucket(bucket_ms, align_ms=from_ts)
+    tier_series = (ts_repo.get_user_series(user_id, from_ts, to_ts - 1, device_ids=device_ids, tier=tier, **query) or {}) if tier else {}
+
+    pending = {}
+    for device_id in device_ids:
+        samples = tier_series.get(device_id, [])
+        result.update(((device_id, ts), avg_watts) for ts, avg_watts in samples)
+        last_emitted = max((ts for ts, _ in samples), default=from_ts - bucket_ms)
+        if last_emitted + bucket_ms < to_ts:
+            pending[device_id] = last_emitted + bucket_ms
+
+    if pending:
+        raw_from = min(pending.values())
+        raw_series = ts_repo.get_user_series(user_id, raw_from, to_ts - 1, device_ids=list(pending), **query) or {}
+        for device_id, samples in raw_series.items():
+            result.update(
+                ((device_id, ts), avg_watts) for ts, avg_watts in samples
+                if ts >= pending[device_id]
+            )
+    return result
+
+
+def get_history_data(db: Session, redis_client: Redis, user_id: int, period: HistoryPeriod, breakdown: bool = False):
     """
-    Obtiene datos históricos agregados por periodo.
+    Obtiene datos históricos agregados por periodo, sumando todos los
+    dispositivos activos del usuario.
     
     ✅ FIXES:
     1. Usa timestamps UTC correctamente
     2. Calcula bucket_duration_ms correcto
     3. Maneja ALIGN correctamente
     4. Convierte watts promedio a kWh correctamente
+    5. Suma todos los dispositivos activos
+    6. Cachea los buckets cerrados (HistoryCacheRepository): en cada consulta
+       solo se leen de Redis TimeSeries los buckets recientes
+
+    Con `breakdown=True` también devuelve la serie de cada dispositivo.
     """
     user_repo = UserRepository(db)
     user = user_repo.get_user_id_repository(user_id)
@@ -23,12 +89,10 @@ def get_history_data(db: Session, redis_client: Redis, user_id: int, period: His
         logger.error(f"Usuario {user_id} no encontrado o sin dispositivos")
         return None
 
-    active_device = next((d for d in user.devices if d.dev_status), None)
-    if not active_device:
+    active_devices = [d for d in user.devices if d.dev_status]
+    if not active_devices:
         logger.error(f"Usuario {user_id} no tiene dispositivos activos")
         return None
-
-    watts_key = f"ts:user:{user_id}:device:{active_device.dev_id}:watts"
     
     # ✅ FIX: Usar UTC correctamente
     now_dt = datetime.now(timezone.utc)
@@ -51,73 +115,232 @@ def get_history_data(db: Session, redis_client: Redis, user_id: int, period: His
         logger.error(f"Periodo inválido: {period}")
         return None
 
+    # ✅ Buckets alineados al reloj (horas / días UTC): los que ya cerraron no
+    # vuelven a cambiar y se leen de la cache; solo se calculan los recientes
     from_ts = int(from_dt.timestamp() * 1000)
+    from_ts -= from_ts % bucket_duration_ms
+    bucket_starts = list(range(from_ts, now_ts, bucket_duration_ms))
+
+    # "Cerrado" = terminó hace más de HISTORY_CACHE_SETTLE_SECONDS (lecturas en tránsito)
+    settled_ts = now_ts - settings.HISTORY_CACHE_SETTLE_SECONDS * 1000
+    closed_starts = [start for start in bucket_starts if start + bucket_duration_ms <= settled_ts]
+    recent_from = closed_starts[-1] + bucket_duration_ms if closed_starts else from_ts
     
     logger.info(
         f"📊 Consultando {period.value}: "
         f"from={from_dt.isoformat()} to={now_dt.isoformat()} "
-        f"(bucket={bucket_duration_ms}ms, esperados={expected_buckets} buckets)"
+        f"(bucket={bucket_duration_ms}ms, esperados={expected_buckets} buckets, "
+        f"dispositivos={len(active_devices)})"
     )
 
     try:
-        # Verificar que la serie existe
-        if not redis_client.exists(watts_key):
-            logger.error(f"Serie no existe: {watts_key}")
-            return None
+        ts_repo = TimeSeriesRepository(redis_client)
+        cache_repo = HistoryCacheRepository(redis_client)
+        device_ids = [d.dev_id for d in active_devices]
+
+        # 1. Buckets cerrados: cache; los que faltan se leen una vez y se guardan
+        values = cache_repo.get_many(user_id, bucket_duration_ms, device_ids, closed_starts)
+        missing = [s for s in closed_starts if any((d, s) not in values for d in device_ids)]
+        if missing:
+            fresh = _read_closed_buckets(ts_repo, user_id, device_ids, missing[0], recent_from, bucket_duration_ms)
+            cache_repo.set_many(user_id, bucket_duration_ms, fresh)
+            values.update(fresh)
 
-        # ✅ FIX: Usar TS.RANGE con agregación correcta
-        raw_result = redis_client.execute_command(
-            'TS.RANGE', 
-            watts_key, 
-            from_ts,  # Desde
-            now_ts,   # Hasta
-            'ALIGN', 'start',  # Alinear al inicio de cada bucket
-            'AGGREGATION', 'avg', bucket_duration_ms  # Promedio por bucket
+        # 2. Bucket en curso (y los recién cerrados): siempre de los datos crudos.
+        # Sin desglose Redis ya devuelve el total (GROUPBY user_id REDUCE sum)
+        totals = defaultdict(float)
+        if breakdown:
+            recent = ts_repo.get_user_series(
+                user_id, recent_from, now_ts, device_ids=device_ids,
+                aggregation="avg", bucket_ms=bucket_duration_ms  # Promedio por bucket
+            ) or {}
+            for device_id, samples in recent.items():
+                values.update(((device_id, ts), avg_watts) for ts, avg_watts in samples)
+        else:
+            recent_total = ts_repo.get_user_total_series(
+                user_id, recent_from, now_ts, device_ids=device_ids,
+                aggregation="avg", bucket_ms=bucket_duration_ms
+            ) or []
+            totals.update(recent_total)
+
+        logger.info(
+            f"✅ Buckets cerrados: {len(closed_starts)} ({len(closed_starts) - len(missing)} en cache), "
+            f"recientes desde {recent_from}"
         )
 
+        # 3. Serie de cada dispositivo y total del usuario (los buckets cerrados
+        # se cachean por dispositivo, así que su total se suma aquí)
+        series = {
+            device_id: [
+                (start, values[(device_id, start)]) for start in bucket_starts
+                if values.get((device_id, start)) is not None
+            ]
+            for device_id in device_ids
+        }
+        for samples in series.values():
+            for ts, avg_watts in samples:
+                totals[ts] += avg_watts
+        raw_result = sorted(totals.items())
+
         if not raw_result:
-            logger.warning(f"No se obtuvieron datos de {watts_key}")
+            logger.warning(f"No se obtuvieron datos de los dispositivos de user {user_id}")
             return None
 
         logger.info(f"✅ Buckets obtenidos: {len(raw_result)} (esperados: {expected_buckets})")
 
         # ✅ FIX: Procesar correctamente watts → kWh
-        data_points = []
-        for item in raw_result:
-            ts = int(item[0])
-            avg_watts = float(item[1]) if item[1] is not None else 0.0
-            
-            # Convertir timestamp a datetime UTC
-            dt_object = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
-            
-            # ✅ FIX: Convertir watts promedio a kWh correctamente
-            # kWh = (Watts promedio * horas en el bucket) / 1000
-            bucket_hours = (bucket_duration_ms / 1000) / 3600.0
-            kwh_value = (avg_watts * bucket_hours) / 1000.0
-            
-            data_points.append({
-                "timestamp": dt_object.isoformat(),
-                "value": round(kwh_value, 6)
-            })
-            
-            logger.debug(
-                f"  Bucket: ts={dt_object.isoformat()}, "
-                f"avg_watts={avg_watts:.2f}W, kwh={kwh_value:.6f}"
-            )
-
+        data_points = _to_data_points(raw_result, bucket_duration_ms)
         logger.info(f"✅ {len(data_points)} puntos procesados correctamente")
         
-        return {
+        response = {
             "period": period.value,
             "unit": "kWh",
             "data_points": data_points
         }
+        if breakdown:
+            response["devices"] = [
+                {
+                    "device_id": device.dev_id,
+                    "device_name": device.dev_name,
+                    "data_points": _to_data_points(series[device.dev_id], bucket_duration_ms)
+                }
+                for device in active_devices
+            ]
+        return response
 
     except Exception as e:
         logger.exception(f"❌ Error en get_history_data: {e}")
         return None
 
 
+def _archive_and_raw_series(ts_repo, archive, user_id: int, device_ids: list, from_ts: int, to_ts: int, cold_to: int, bucket_ms: int) -> list:
+    """
+    Watts promedio por bucket (suma de dispositivos): archivo frío hasta el
+    bucket que contiene `cold_to` y crudos de Redis desde ahí.
+    """
+    # Corte en un límite de bucket: ningún bucket mezcla las dos fuentes
+    split = from_ts + -(-(cold_to - from_ts) // bucket_ms) * bucket_ms
+    totals = defaultdict(float)
+
+    for device_id in device_ids:
+        averages = archive.bucket_averages(user_id, device_id, from_ts, min(split - 1, to_ts), bucket_ms, align_ms=from_ts)
+        for start, avg_watts in averages.items():
+            totals[start] += avg_watts
+
+    if split <= to_ts:
+        hot = ts_repo.get_user_total_series(
+            user_id, split, to_ts, device_ids=device_ids,
+            aggregation="avg", bucket_ms=bucket_ms, align=from_ts
+        ) or []
+        for ts, avg_watts in hot:
+            totals[ts] += avg_watts
+
+    return sorted(totals.items())
+
+
+def get_history_range(db: Session, redis_client: Redis, user_id: int, from_dt: datetime, to_dt: datetime, points: int):
+    """
+    Potencia promedio (W) de todos los dispositivos activos en un rango arbitrario.
+
+    1. Elige la fuente más barata (crudos o tier 1m / 1h / 1d) y el bucket para
+       que Redis devuelva ~points × HISTORY_RANGE_OVERSAMPLE buckets.
+    2. Reduce con LTTB a `points` puntos conservando picos y valles.
+
+    La respuesta y el trabajo en Redis quedan acotados sin importar el rango.
+    """
+    user_repo = UserRepository(db)
+    user = user_repo.get_user_id_repository(user_id)
+    if not user or not getattr(user, "devices", None):
+        logger.error(f"Usuario {user_id} no encontrado o sin dispositivos")
+        return None
+
+    active_devices = [d for d in user.devices if d.dev_status]
+    if not active_devices:
+        logger.error(f"Usuario {user_id} no tiene dispositivos activos")
+        return None
+
+    now_ts = int(datetime.now(timezone.utc).timestamp() * 1000)
+    from_ts = int(from_dt.timestamp() * 1000)
+    to_ts = min(int(to_dt.timestamp() * 1000), now_ts)
+    if from_ts >= to_ts:
+        return None
+
+    device_ids = [d.dev_id for d in active_devices]
+    tier, bucket_ms = resolution_for_range(from_ts, to_ts, points * HISTORY_RANGE_OVERSAMPLE, now_ts)
+
+    tier_bucket_ms = next((b for name, b, _ in COMPACTION_TIERS if name == tier), 1000)
+
+    # ✅ Si los crudos ya expiraron en Redis y el tier que queda es más grueso que
+    # lo pedido, la parte vieja del rango se lee del archivo frío
+    archive = ArchiveRepository(settings.ARCHIVE_DIR)
+    raw_bucket_ms = bucket_for_range(from_ts, to_ts, points * HISTORY_RANGE_OVERSAMPLE)
+    cold_to = min(to_ts, now_ts - RETENTION_MS)
+    use_archive = (
+        tier is not None and tier_bucket_ms > raw_bucket_ms and from_ts < cold_to
+        and archive.has_range(user_id, device_ids, from_ts, cold_to)
+    )
+    if use_archive:
+        tier, bucket_ms = None, raw_bucket_ms
+
+    # Buckets en múltiplos fijos de bucket_ms (que a su vez lo es del tier): dos
+    # consultas con casi el mismo rango leen los mismos buckets
+    from_ts -= from_ts % bucket_ms
+    end_ts = to_ts
+    if to_ts == now_ts and to_ts - to_ts % bucket_ms > from_ts:
+        # Rango abierto (hasta ahora): cortar en el último bucket cerrado para
+        # que la respuesta, y su ETag, no cambie en cada consulta
+        end_ts = to_ts - to_ts % bucket_ms
+        to_ts = end_ts - 1
+
+    logger.info(
+        f"📊 Rango {from_dt.isoformat()} → {to_dt.isoformat()}: "
+        f"fuente={'archivo + crudos' if use_archive else tier or 'crudos'}, bucket={bucket_ms}ms, puntos={points}"
+    )
+
+    try:
+        ts_repo = TimeSeriesRepository(redis_client)
+        if use_archive:
+            samples = _archive_and_raw_series(ts_repo, archive, user_id, device_ids, from_ts, to_ts, cold_to, bucket_ms)
+            source = "archive"
+        else:
+            query = dict(
+                device_ids=device_ids,
+                aggregation="avg", bucket_ms=bucket_ms, align=from_ts
+            )
+            samples = ts_repo.get_user_total_series(user_id, from_ts, to_ts, tier=tier, **query)
+            if not samples and tier:
+                # Series sin migrar: sin tiers compactados, solo crudos
+                samples = ts_repo.get_user_total_series(user_id, from_ts, to_ts, **query)
+                tier = None
+            source = tier or "raw"
+
+        if not samples:
+            logger.warning(f"No se obtuvieron datos de los dispositivos de user {user_id}")
+            return None
+
+        downsampled = lttb(sorted(samples), points)
+        logger.info(f"✅ {len(samples)} buckets → {len(downsampled)} puntos (LTTB)")
+
+        return {
+            "start": datetime.fromtimestamp(from_ts / 1000, tz=timezone.utc),
+            "end": datetime.fromtimestamp(end_ts / 1000, tz=timezone.utc),
+            "unit": "W",
+            "source": source,
+            "resolution_ms": bucket_ms,
+            "data_points": [
+                {
+                    "timestamp": datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat(),
+                    "value": round(watts, 2)
+                }
+                for ts, watts in downsampled
+            ]
+        }
+
+    except Exception as e:
+        logger.exception(f"❌ Error en get_history_range: {e}")
+        return None
+
+
 def get_last_7_days_data(db, redis_client, user_id: int):
     """
     Recupera datos de los últimos 7 días con promedios diarios.
@@ -126,6 +349,8 @@ def get_last_7_days_data(db, redis_client, user_id: int):
     1. Maneja timezone UTC correctamente
     2. Agrupa por fecha correctamente
     3. Devuelve labels en formato ISO
+    4. Sin KEYS: las series se resuelven por labels (TS.MRANGE FILTER user_id=X)
+       y Redis calcula suma y conteo por día (AGGREGATION sum / count 86400000)
     """
     now = datetime.now(timezone.utc)
     start_time = now - timedelta(days=7)
@@ -134,58 +359,37 @@ def get_last_7_days_data(db, redis_client, user_id: int):
 
     logger.info(f"📊 Consultando últimos 7 días: {start_time.isoformat()} → {now.isoformat()}")
 
-    # Buscar series del usuario
-    keys = redis_client.keys(f"ts:user:{user_id}:device:*:watts")
-    if not keys:
+    # Buckets diarios (UTC) de todos los dispositivos combinados por tipo
+    ts_repo = TimeSeriesRepository(redis_client)
+    daily = ts_repo.get_user_series_by_type(
+        user_id, start_ts, end_ts, aggregations=("sum", "count"), bucket_ms=DAY_MS
+    )
+    if not daily or not daily["count"].get("watts"):
         logger.warning(f"No se encontraron series para user {user_id}")
         return None
 
-    # Diccionario global por fecha
-    grouped = defaultdict(lambda: {"watts": [], "volts": [], "amps": []})
-
-    for key in keys:
-        key = key.decode() if isinstance(key, bytes) else key
-        device_id = key.split(":")[5]
-
-        # Obtener datos de las 3 series
-        watts_data = redis_client.ts().range(key, start_ts, end_ts)
-        volts_data = redis_client.ts().range(key.replace("watts", "volts"), start_ts, end_ts)
-        amps_data  = redis_client.ts().range(key.replace("watts", "amps"),  start_ts, end_ts)
-
-        logger.info(f"  Device {device_id}: {len(watts_data)} watts, {len(volts_data)} volts, {len(amps_data)} amps")
-
-        # Agrupar por fecha (solo la parte de la fecha, sin hora)
-        for ts, value in watts_data:
-            date = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
-            grouped[date]["watts"].append(float(value))
-        
-        for ts, value in volts_data:
-            date = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
-            grouped[date]["volts"].append(float(value))
-        
-        for ts, value in amps_data:
-            date = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
-            grouped[date]["amps"].append(float(value))
+    # Promedio del día = suma de todas las muestras / número de muestras
+    averages = {}
+    for ts_type in ("watts", "volts", "amps"):
+        sums = dict(daily["sum"].get(ts_type, []))
+        averages[ts_type] = {
+            ts: sums.get(ts, 0.0) / count
+            for ts, count in daily["count"].get(ts_type, []) if count
+        }
 
     # Calcular promedios diarios
-    sorted_dates = sorted(grouped.keys())
+    sorted_days = sorted(averages["watts"].keys())
     labels, watts_list, volts_list, amps_list = [], [], [], []
 
-    logger.info(f"📅 Días con datos: {len(sorted_dates)}")
+    logger.info(f"📅 Días con datos: {len(sorted_days)}")
 
-    for date in sorted_dates:
-        measures = grouped[date]
-        
-        avg_watts = sum(measures["watts"]) / len(measures["watts"]) if measures["watts"] else 0
-        avg_volts = sum(measures["volts"]) / len(measures["volts"]) if measures["volts"] else 0
-        avg_amps  = sum(measures["amps"]) / len(measures["amps"]) if measures["amps"] else 0
+    for day_ts in sorted_days:
+        avg_watts = averages["watts"].get(day_ts, 0)
+        avg_volts = averages["volts"].get(day_ts, 0)
+        avg_amps  = averages["amps"].get(day_ts, 0)
         
         # ✅ FIX: Convertir fecha a formato ISO con timezone UTC
-        date_iso = (
-            datetime.strptime(date, "%Y-%m-%d")
-            .replace(tzinfo=timezone.utc)
-            .isoformat()
-        )
+        date_iso = datetime.fromtimestamp(day_ts / 1000, tz=timezone.utc).isoformat()
         
         labels.append(date_iso)
         watts_list.append(round(avg_watts, 2))
@@ -193,8 +397,7 @@ def get_last_7_days_data(db, redis_client, user_id: int):
         amps_list.append(round(avg_amps, 2))
         
         logger.debug(
-            f"  {date}: watts={avg_watts:.2f}W, volts={avg_volts:.2f}V, amps={avg_amps:.2f}A "
-            f"({len(measures['watts'])} mediciones)"
+            f"  {date_iso}: watts={avg_watts:.2f}W, volts={avg_volts:.2f}V, amps={avg_amps:.2f}A"
         )
 
     logger.info(f"✅ {len(labels)} días procesados correctamente")
@@ -204,4 +407,4 @@ def get_last_7_days_data(db, redis_client, user_id: int):
         "watts": watts_list,
         "volts": volts_list,
         "amps": amps_list
-    }
\ No newline at end of file
+    }
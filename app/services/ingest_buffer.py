@@ -0,0 +1,228 @@
+# app/services/ingest_buffer.py
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.core import logger, settings
+from app.repositories import AsyncTimeSeriesRepository, AsyncHistoryCacheRepository
+
+METRICS_LOG_INTERVAL_SECONDS = 60
+
+
+def settled_before_ms() -> int:
+    """Lecturas con hora anterior a esto caen en buckets del historial que ya pudieron cachearse."""
+    return int(datetime.now(timezone.utc).timestamp() * 1000) - settings.HISTORY_CACHE_SETTLE_SECONDS * 1000
+
+
+class IngestBuffer:
+    """
+    Buffer write-behind de la ingesta (uno por worker).
+
+    Junta las lecturas de todos los dispositivos durante una ventana corta
+    (`window_ms`) o hasta `max_batch` lecturas, y las escribe con un único
+    pipeline de TS.MADD. `max_pending` acota la memoria: si se alcanza, quien
+    agrega espera a que un flush libere espacio (backpressure). Si Redis falla,
+    el lote vuelve al buffer hasta ese mismo tope y el resto se descarta.
+    """
+
+    def __init__(self, window_ms: int, max_batch: int, max_pending: int):
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+
+        self._pending: List[Dict] = []
+        self._has_data = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._redis = None
+
+        # Métricas
+        self._flushes = 0
+        self._readings_written = 0
+        self._readings_failed = 0
+        self._flush_errors = 0
+        self._last_batch_size = 0
+        self._max_batch_size = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._last_metrics_log = time.monotonic()
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self, redis_client):
+        if self._task:
+            return
+        self._redis = redis_client
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"🧺 Buffer de ingesta iniciado: ventana={self.window_seconds * 1000:.0f}ms, "
+            f"lote={self.max_batch}, tope={self.max_pending}"
+        )
+
+    async def stop(self):
+        """
+        Detiene el loop y escribe lo que quede pendiente (llamado desde el lifespan).
+
+        El loop se detiene cooperativamente: si hay un flush en curso termina
+        su escritura antes de salir (cancelarlo perdería el lote en vuelo).
+        """
+        if not self._task:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"❌ Flush final del buffer de ingesta falló, {len(self._pending)} lecturas perdidas: {e}")
+        logger.info(f"🧺 Buffer de ingesta detenido. {self.stats()}")
+
+    async def add(self, measurements: List[Dict]):
+        """
+        Encola lecturas ({user_id, device_id, watts, volts, amps}).
+
+        Las lecturas sin hora del dispositivo se marcan con el momento de
+        llegada, no el de escritura (+1 ms por lectura sucesiva, igual que en
+        la escritura directa).
+        """
+        if not measurements:
+            return
+
+        received_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+        for offset, measurement in enumerate(measurements):
+            if not measurement.get("timestamp"):
+                measurement["timestamp"] = received_at + offset
+
+        async with self._space:
+            # Backpressure: esperar a que haya lugar (un lote mayor al tope
+            # entra solo con el buffer vacío)
+            while self._pending and len(self._pending) + len(measurements) > self.max_pending:
+                self._batch_full.set()  # que el loop escriba ya, sin esperar la ventana
+                await self._space.wait()
+            self._pending.extend(measurements)
+
+        self._has_data.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+
+    async def flush(self):
+        """Escribe todas las lecturas pendientes en un solo pipeline de TS.MADD."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, []
+            self._has_data.clear()
+            self._batch_full.clear()
+
+            started = time.perf_counter()
+            try:
+                saved = await AsyncTimeSeriesRepository(self._redis).add_measurements_batch(batch)
+            except asyncio.CancelledError:
+                # Cancelación externa (p. ej. cierre del event loop): el lote
+                # vuelve al buffer para el flush final en lugar de perderse
+                self._pending = batch + self._pending
+                self._has_data.set()
+                raise
+            except Exception:
+                self._requeue(batch)
+                raise
+            finally:
+                await self._notify_space()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            self._record_flush(len(batch), saved, elapsed_ms)
+            await AsyncHistoryCacheRepository(self._redis).invalidate_late(batch, settled_before_ms())
+
+    def _requeue(self, batch: List[Dict]):
+        """Devuelve al buffer un lote que no se pudo escribir, sin pasar de `max_pending`."""
+        keep = max(0, self.max_pending - len(self._pending))
+        dropped = max(0, len(batch) - keep)
+        self._pending = batch[:keep] + self._pending
+        self._flush_errors += 1
+        self._readings_failed += dropped
+        self._has_data.set()
+        if dropped:
+            logger.error(f"❌ Buffer de ingesta lleno tras un error de Redis: {dropped} lecturas descartadas")
+
+    async def _notify_space(self):
+        async with self._space:
+            self._space.notify_all()
+
+    async def _wait_any(self, *events: asyncio.Event, timeout: Optional[float] = None):
+        """Espera a que se active cualquiera de los eventos (o el timeout)."""
+        waiters = [asyncio.create_task(event.wait()) for event in events]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                # Esperar la primera lectura y luego la ventana (o un lote lleno);
+                # stop() despierta ambas esperas
+                await self._wait_any(self._has_data, self._stopping)
+                if self._stopping.is_set():
+                    break
+                await self._wait_any(self._batch_full, self._stopping, timeout=self.window_seconds)
+
+                await self.flush()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en el buffer de ingesta: {e}")
+                # No reintentar en seguida contra un Redis caído
+                await self._wait_any(self._stopping, timeout=self.window_seconds)
+
+    def _record_flush(self, batch_size: int, saved: int, elapsed_ms: float):
+        self._flushes += 1
+        self._readings_written += saved
+        self._readings_failed += batch_size - saved
+        self._last_batch_size = batch_size
+        self._max_batch_size = max(self._max_batch_size, batch_size)
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+        now = time.monotonic()
+        if now - self._last_metrics_log >= METRICS_LOG_INTERVAL_SECONDS:
+            self._last_metrics_log = now
+            logger.info(f"🧺 Métricas buffer de ingesta: {self.stats()}")
+
+    def stats(self) -> Dict:
+        """Métricas de este worker: tamaño de lote y latencia de flush."""
+        return {
+            "running": self.is_running,
+            "pending": len(self._pending),
+            "flushes": self._flushes,
+            "readings_written": self._readings_written,
+            "readings_failed": self._readings_failed,
+            "flush_errors": self._flush_errors,
+            "avg_batch_size": round((self._readings_written + self._readings_failed) / self._flushes, 2) if self._flushes else 0.0,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size": self._max_batch_size,
+            "avg_flush_ms": round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "max_flush_ms": round(self._max_flush_ms, 3),
+        }
+
+
+# Instancia global (una por worker)
+ingest_buffer = IngestBuffer(
+    window_ms=settings.INGEST_BUFFER_WINDOW_MS,
+    max_batch=settings.INGEST_BUFFER_MAX_BATCH,
+    max_pending=settings.INGEST_BUFFER_MAX_PENDING
+)
@@ -1,74 +1,238 @@
 # app/services/ingest_service.py
 
 from sqlalchemy.orm import Session
-from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timezone
 import json
 
-from app.repositories import DeviceRepository, TimeSeriesRepository
+from app.repositories import (
+    DeviceRepository, AsyncTimeSeriesRepository, AsyncDeviceCacheRepository, AsyncIngestScriptRepository,
+    AsyncHistoryCacheRepository
+)
+from app.repositories.device_cache_repository import device_to_cache
+from app.repositories.ingest_script_repository import LIVE_CHANNEL
 from app.schemas import ShellyIngestData
-from app.core import logger
-from app.core.websocket_manager import manager 
+from app.database import SessionLocal
+from app.core import logger, settings, pubsub_listener
+from app.core.websocket_manager import manager
+from app.services.ingest_buffer import ingest_buffer, settled_before_ms
+
+
+def _reading_timestamp(data: ShellyIngestData, received_at: int) -> tuple[bool, int | None]:
+    """
+    Valida la hora reportada por el Shelly contra la del servidor.
+
+    Retorna (aceptar, timestamp_ms):
+    - Sin hora del dispositivo → (True, None): se usa la hora de llegada. Si
+      trae aenergy.minute_ts solo se usa para avisar de un reloj desfasado.
+    - Adelantada más de INGEST_MAX_CLOCK_SKEW_SECONDS → (True, None): reloj
+      del dispositivo desfasado, se usa la hora de llegada.
+    - Atrasada más de INGEST_MAX_LATE_SECONDS → (False, None): se descarta.
+    - En otro caso → (True, hora del dispositivo). Las lecturas atrasadas
+      (reintentos, buffer del dispositivo) se insertan en su momento real.
+    """
+    device_ts = data.device_timestamp_ms()
+    if device_ts is None:
+        minute_ts = data.device_minute_ms()
+        skew_ms = settings.INGEST_MAX_CLOCK_SKEW_SECONDS * 1000
+        if minute_ts is not None and not minute_ts - skew_ms <= received_at < minute_ts + 60_000 + skew_ms:
+            logger.warning(
+                f"⏰ minute_ts de {data.sys_status.mac} fuera del minuto de llegada: "
+                f"{(received_at - minute_ts) / 1000:.0f}s, usando hora del servidor"
+            )
+        return True, None
+
+    if device_ts > received_at + settings.INGEST_MAX_CLOCK_SKEW_SECONDS * 1000:
+        logger.warning(
+            f"⏰ Reloj adelantado en {data.sys_status.mac}: "
+            f"{(device_ts - received_at) / 1000:.0f}s, usando hora del servidor"
+        )
+        return True, None
+
+    if device_ts < received_at - settings.INGEST_MAX_LATE_SECONDS * 1000:
+        logger.warning(
+            f"⏰ Lectura demasiado atrasada de {data.sys_status.mac}: "
+            f"{(received_at - device_ts) / 1000:.0f}s, descartada"
+        )
+        return False, None
+
+    return True, device_ts
+
+
+def _energy_total(data: ShellyIngestData) -> float | None:
+    """Energía acumulada reportada por el Shelly (aenergy.total, Wh), si viene."""
+    aenergy = data.switch_status.aenergy
+    return aenergy.total if aenergy else None
+
+
+def _is_live(timestamp: int | None, received_at: int) -> bool:
+    """Solo las lecturas recientes se envían al WebSocket como valor en vivo."""
+    return timestamp is None or timestamp >= received_at - settings.INGEST_MAX_CLOCK_SKEW_SECONDS * 1000
+
+
+async def _relay_live_reading(payload: str):
+    """
+    Reenvía a los WebSockets de este worker una lectura publicada por el script
+    de ingesta (cada worker solo tiene sus propias conexiones).
+    """
+    reading = json.loads(payload)
+    message_to_broadcast = {
+        "watts": reading["watts"],
+        "volts": reading["volts"],
+        "amps": reading["amps"]
+    }
+    await manager.broadcast_to_device(int(reading["device_id"]), json.dumps(message_to_broadcast))
+
+
+if settings.INGEST_REDIS_SCRIPT_ENABLED:
+    pubsub_listener.subscribe(LIVE_CHANNEL, _relay_live_reading)
+
+
+async def _ingest_with_script(
+    redis_client: AsyncRedis, hardware_id: str, watts: float, volts: float, amps: float,
+    timestamp: int | None, energy_total: float | None
+) -> bool:
+    """
+    Intenta la ingesta completa en un solo round trip (script Lua en Redis).
+
+    Retorna True si la lectura quedó resuelta (guardada, o descartada por
+    dispositivo inactivo / no registrado). Retorna False si debe encargarse la
+    ruta Python: MAC no cacheada, series sin crear, script no disponible o error.
+    """
+    try:
+        status, device_id = await AsyncIngestScriptRepository(redis_client).ingest(
+            hardware_id, watts, volts, amps, timestamp, energy_total
+        )
+    except Exception as e:
+        logger.error(f"❌ Error en script de ingesta, usando ruta Python: {e}")
+        return False
+
+    if status == "ok":
+        logger.info(f"📡 Lectura guardada y publicada (script) Device {device_id}: {watts}W")
+        return True
+    if status in ("inactive", "not_found"):
+        return True
+
+    # miss | ts_missing | unavailable
+    return False
+
+
+async def _store_measurements(redis_client: AsyncRedis, measurements: list[dict]) -> int:
+    """
+    Guarda lecturas en Redis TimeSeries.
+
+    Con el buffer write-behind activo solo se encolan (se escriben en lote cada
+    pocos ms); si no, se escriben de inmediato en un único pipeline.
+    """
+    if ingest_buffer.is_running:
+        await ingest_buffer.add(measurements)
+        return len(measurements)
+
+    ts_repo = AsyncTimeSeriesRepository(redis_client)
+    saved = await ts_repo.add_measurements_batch(measurements)
+    # Lecturas atrasadas: sus buckets del historial ya pudieron cachearse como cerrados
+    await AsyncHistoryCacheRepository(redis_client).invalidate_late(measurements, settled_before_ms())
+    return saved
+
+
+def _load_device(db: Session | None, hardware_id: str) -> dict | None:
+    """
+    Consulta el dispositivo (y el día de corte de su dueño) en la BD. Corre en el threadpool.
+    Sin sesión (ingesta MQTT) abre una solo para esta consulta.
+    """
+    if db is None:
+        with SessionLocal() as session:
+            return _load_device(session, hardware_id)
+    device = DeviceRepository(db).get_device_by_hardware_id_repository(hardware_id)
+    return device_to_cache(device) if device else None
+
+
+async def _resolve_device(db: Session | None, redis_client: AsyncRedis, hardware_id: str) -> dict | None:
+    """
+    Resuelve MAC → datos del dispositivo usando el cache de Redis (o la BD en un MISS).
+
+    Retorna el dict cacheado ({id, user_id, active, name, billing_day, exists}) o None si el
+    dispositivo no está registrado.
+
+    ✅ Redis asíncrono y consulta SQL en el threadpool: nunca bloquea el event loop.
+    """
+    device_cache = AsyncDeviceCacheRepository(redis_client)
+
+    device_data = await device_cache.get(hardware_id)
+    if device_data:
+        # logger.debug(f"📦 Cache HIT: {hardware_id}")
+        return device_data if device_data.get("exists", True) else None
+
+    logger.info(f"🔍 Cache MISS: {hardware_id}, consultando BD")
+    device_data = await run_in_threadpool(_load_device, db, hardware_id)
+
+    if not device_data:
+        logger.warning(f"❌ Dispositivo no registrado: {hardware_id}")
+        # Guardamos "no existe" por 5 minutos para no saturar la BD
+        await device_cache.set_not_found(hardware_id)
+        return None
+
+    await device_cache.set(hardware_id, device_data)
+    return device_data
 
-DEVICE_CACHE_TTL = 3600
 
 # 🔥 CAMBIO 1: Convertimos la función a ASYNC
-async def process_shelly_data(db: Session, redis_client: Redis, data: ShellyIngestData):
+async def process_shelly_data(db: Session | None, redis_client: AsyncRedis, data: ShellyIngestData):
     """
     Procesa los datos del Shelly y los envía al WebSocket en tiempo real.
+
+    ✅ Todo el I/O de Redis es asíncrono (redis.asyncio).
     """
     hardware_id = data.sys_status.mac
     watts = data.switch_status.apower
     volts = data.switch_status.voltage
     amps = data.switch_status.current
+    energy_total = _energy_total(data)
+
+    received_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+    accepted, timestamp = _reading_timestamp(data, received_at)
+    if not accepted:
+        return
 
     try:
+        # 0. Ruta rápida: búsqueda + TS.MADD + publish en el servidor Redis.
+        # Las lecturas atrasadas van por la ruta Python, que invalida la cache
+        # del historial (el script no conoce al usuario)
+        is_late = timestamp is not None and timestamp < settled_before_ms()
+        if settings.INGEST_REDIS_SCRIPT_ENABLED and not is_late and await _ingest_with_script(
+            redis_client, hardware_id, watts, volts, amps, timestamp, energy_total
+        ):
+            return
+
         # 1. Buscar el dispositivo (con cache)
-        cache_key = f"device:mac:{hardware_id}"
-        cached_device = redis_client.get(cache_key)
-
-        if cached_device:
-            device_data = json.loads(cached_device)
-            device_id = device_data["id"]
-            user_id = device_data["user_id"]
-            is_active = device_data["active"]
-            # logger.debug(f"📦 Cache HIT: {hardware_id}")
-        else:
-            logger.info(f"🔍 Cache MISS: {hardware_id}, consultando BD")
-            device_repo = DeviceRepository(db)
-            device = device_repo.get_device_by_hardware_id_repository(hardware_id)
-            
-            if not device:
-                logger.warning(f"❌ Dispositivo no registrado: {hardware_id}")
-                # Guardamos "no existe" por 5 minutos para no saturar la BD
-                redis_client.setex(cache_key, 300, json.dumps({"exists": False}))
-                return
-            
-            device_data = {
-                "id": device.dev_id,
-                "user_id": device.dev_user_id,
-                "active": device.dev_status,
-                "name": device.dev_name,
-                "exists": True
-            }
-            redis_client.setex(cache_key, DEVICE_CACHE_TTL, json.dumps(device_data))
-            device_id = device.dev_id
-            user_id = device.dev_user_id
-            is_active = device.dev_status
+        device_data = await _resolve_device(db, redis_client, hardware_id)
+        if not device_data:
+            return
+
+        device_id = device_data["id"]
+        user_id = device_data["user_id"]
 
         # 2. Validar estado
-        if not is_active:
+        if not device_data["active"]:
             # logger.debug(f"⏸️ Dispositivo inactivo: {hardware_id}")
             return
-        
-        # 3. Guardar en Redis TimeSeries (Operación Síncrona, pero rápida)
-        ts_repo = TimeSeriesRepository(redis_client)
-        ts_repo.add_measurements(
-            user_id=user_id,
-            device_id=device_id,
-            watts=watts,
-            volts=volts,
-            amps=amps
-        )
+
+        # 3. Guardar en Redis TimeSeries (buffer write-behind o escritura directa)
+        await _store_measurements(redis_client, [{
+            "user_id": user_id,
+            "device_id": device_id,
+            "watts": watts,
+            "volts": volts,
+            "amps": amps,
+            "timestamp": timestamp,
+            "energy_total": energy_total,
+            "billing_day": device_data.get("billing_day")
+        }])
+
+        # Una lectura atrasada (reintento / replay) no es el valor en vivo
+        if not _is_live(timestamp, received_at):
+            return
 
         # 4. ✅ ENVIAR A WEBSOCKET (NATIVO)
         # Al ser una función async, podemos usar 'await' directamente.
@@ -78,13 +242,81 @@ async def process_shelly_data(db: Session, redis_client: Redis, data: ShellyInge
             "volts": volts,
             "amps": amps
         }
-        
+
         await manager.broadcast_to_device(device_id, json.dumps(message_to_broadcast))
-        
+
         logger.info(f"📡 WS enviado Device {device_id}: {watts}W")
 
-    except json.JSONDecodeError as e:
-        logger.error(f"❌ Error decodificando cache para {hardware_id}: {e}")
-        redis_client.delete(cache_key)
     except Exception as e:
-        logger.error(f"❌ Error procesando datos de Shelly: {e}")
\ No newline at end of file
+        logger.error(f"❌ Error procesando datos de Shelly: {e}")
+
+
+async def process_shelly_batch(db: Session, redis_client: AsyncRedis, readings: list[ShellyIngestData]):
+    """
+    Procesa un lote de lecturas Shelly (de uno o varios dispositivos).
+
+    Resuelve cada MAC una sola vez, guarda todas las muestras con un único
+    pipeline de TS.MADD y envía al WebSocket la última lectura de cada dispositivo.
+    Cada lectura conserva la hora del dispositivo si la trae (ver _reading_timestamp).
+    """
+    received_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    try:
+        # 1. Resolver cada dispositivo una sola vez por lote
+        devices = {}
+        for hardware_id in {r.sys_status.mac for r in readings}:
+            devices[hardware_id] = await _resolve_device(db, redis_client, hardware_id)
+
+        # 2. Filtrar lecturas de dispositivos no registrados o inactivos
+        measurements = []
+        latest_by_device = {}
+        for reading in readings:
+            device_data = devices.get(reading.sys_status.mac)
+            if not device_data or not device_data["active"]:
+                continue
+
+            accepted, timestamp = _reading_timestamp(reading, received_at)
+            if not accepted:
+                continue
+
+            measurement = {
+                "user_id": device_data["user_id"],
+                "device_id": device_data["id"],
+                "watts": reading.switch_status.apower,
+                "volts": reading.switch_status.voltage,
+                "amps": reading.switch_status.current,
+                "timestamp": timestamp,
+                "energy_total": _energy_total(reading),
+                "billing_day": device_data.get("billing_day")
+            }
+            measurements.append(measurement)
+
+            # Las lecturas pueden venir desordenadas: la más reciente es la de mayor hora
+            latest = latest_by_device.get(device_data["id"])
+            if latest is None or (timestamp or received_at) >= (latest["timestamp"] or received_at):
+                latest_by_device[device_data["id"]] = measurement
+
+        if not measurements:
+            return
+
+        # 3. Guardar todo el lote en Redis TimeSeries
+        saved = await _store_measurements(redis_client, measurements)
+
+        # 4. WebSocket: solo el valor más reciente de cada dispositivo
+        for device_id, measurement in latest_by_device.items():
+            if not _is_live(measurement["timestamp"], received_at):
+                continue
+            message_to_broadcast = {
+                "watts": measurement["watts"],
+                "volts": measurement["volts"],
+                "amps": measurement["amps"]
+            }
+            await manager.broadcast_to_device(device_id, json.dumps(message_to_broadcast))
+
+        logger.info(
+            f"📦 Lote procesado: {saved}/{len(readings)} lecturas guardadas, "
+            f"{len(latest_by_device)} dispositivos"
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Error procesando lote de Shelly: {e}")
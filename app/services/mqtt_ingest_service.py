@@ -0,0 +1,79 @@
+# app/services/mqtt_ingest_service.py
+
+from typing import Dict
+
+from app.core import logger
+from app.core.local_cache import LocalTTLCache
+from app.database.database import async_redis_client
+from app.schemas import ShellyIngestData
+from app.services.ingest_service import process_shelly_data
+
+# NotifyStatus solo trae los campos que cambiaron: guardamos el último estado
+# completo de `switch:0` por MAC para reconstruir la lectura.
+SWITCH_STATE_MAX = 10_000
+SWITCH_STATE_TTL = 600   # Un valor más viejo que esto ya no se reutiliza
+
+STATUS_METHODS = ("NotifyStatus", "NotifyFullStatus")
+MEASUREMENT_FIELDS = ("apower", "voltage", "current")
+
+_switch_state = LocalTTLCache(max_size=SWITCH_STATE_MAX, ttl_seconds=SWITCH_STATE_TTL)
+
+
+def _mac_from_source(src: str) -> str | None:
+    """
+    Extrae la MAC del `src` del Shelly (ej. "shellyplus1pm-a8032ab12345").
+
+    Se normaliza a mayúsculas, igual que `sys.mac` en el POST HTTP, que es
+    como queda registrado `dev_hardware_id`.
+    """
+    if not src or "-" not in src:
+        return None
+    return src.rsplit("-", 1)[1].upper()
+
+
+async def process_shelly_mqtt_message(topic: str, payload: Dict):
+    """
+    Procesa un frame de `{prefix}-{mac}/events/rpc` recibido por MQTT.
+
+    Solo interesan NotifyStatus / NotifyFullStatus con `switch:0`; el resto
+    (NotifyEvent, otros componentes) se ignora. La lectura reconstruida entra
+    al mismo pipeline que el POST /ingest/shelly, con `params.ts` (hora del
+    dispositivo) como timestamp. Sin sesión de BD: solo se abre una si la MAC
+    no está en el cache de dispositivos.
+    """
+    if payload.get("method") not in STATUS_METHODS:
+        return
+
+    switch_frame = payload.get("params", {}).get("switch:0")
+    if not switch_frame:
+        return
+
+    hardware_id = _mac_from_source(payload.get("src") or topic.split("/", 1)[0])
+    if not hardware_id:
+        logger.warning(f"⚠️ Telemetría MQTT sin MAC reconocible: {topic}")
+        return
+
+    state = {**_switch_state.get(hardware_id, {}), **switch_frame}
+    _switch_state.set(hardware_id, state)
+
+    # Frames que no tocan la medición (ej. solo temperatura) no generan lectura
+    if not any(field in switch_frame for field in MEASUREMENT_FIELDS):
+        return
+    if not all(field in state for field in MEASUREMENT_FIELDS):
+        # logger.debug(f"⏳ Esperando estado completo de {hardware_id}")
+        return
+
+    try:
+        data = ShellyIngestData.model_validate({
+            "switch:0": {
+                "id": state.get("id", 0),
+                "aenergy": state.get("aenergy"),
+                **{f: state[f] for f in MEASUREMENT_FIELDS}
+            },
+            "sys": {"mac": hardware_id, "unixtime": payload["params"].get("ts")}
+        })
+    except Exception as e:
+        logger.error(f"❌ Frame MQTT inválido de {hardware_id}: {e}")
+        return
+
+    await process_shelly_data(None, async_redis_client, data)
@@ -2,14 +2,17 @@
 
 from sqlalchemy.orm import Session
 from redis import Redis
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
-from collections import defaultdict
 import calendar
 
-from app.repositories import UserRepository, TarrifRepository, AlertRepository, RecommendationRepository, ReportRepository
+from app.repositories import UserRepository, TarrifRepository, AlertRepository, RecommendationRepository, ReportRepository, TimeSeriesRepository, DailyConsumptionRepository, ReportDayCacheRepository
+from app.repositories.archive_repository import day_start_ms
+from app.repositories.timeseries_repository import DAY_MS
 from app.schemas.monthly_report_schema import MonthlyReport, ReportHeader, ExecutiveSummary, ConsumptionDetails, CostBreakdown, EnvironmentalImpact, MonthAlert, MonthRecommendation, DailyConsumptionPoint, TariffLevel
 from app.core import logger, settings
+from app.core.energy import MAX_GAP_SECONDS, integrate_samples
 
 
 def generate_monthly_report(db: Session, redis_client: Redis, user_id: int, month: int, year: int) -> MonthlyReport | None:
@@ -17,7 +20,7 @@ def generate_monthly_report(db: Session, redis_client: Redis, user_id: int, mont
     Genera reporte mensual.
     
     ✅ LÓGICA:
-    - Mes actual: genera desde Redis (no guarda)
+    - Mes actual: genera al vuelo (no guarda en BD; los días cerrados se cachean en Redis)
     - Mes anterior: busca en BD primero, si no existe lo genera y guarda
     """
     try:
@@ -29,7 +32,7 @@ def generate_monthly_report(db: Session, redis_client: Redis, user_id: int, mont
         # ✅ Mes actual: generar sin guardar
         if is_current_month:
             logger.info(f"📊 Generando reporte MES ACTUAL: {month}/{year} (tiempo real)")
-            return _generate_report_from_redis(db, redis_client, user_id, month, year)
+            return _generate_report_from_redis(db, redis_client, user_id, month, year, cache_closed_days=True)
         
         # ✅ Mes anterior: buscar en BD
         logger.info(f"🔍 Buscando reporte guardado: {month}/{year}")
@@ -60,10 +63,28 @@ def generate_monthly_report(db: Session, redis_client: Redis, user_id: int, mont
         return None
     
 
-def _generate_report_from_redis(db: Session, redis_client: Redis, user_id: int, month: int, year: int) -> MonthlyReport | None:
+def get_stored_report_json(db: Session, user_id: int, month: int, year: int) -> str | None:
+    """
+    Reporte guardado de un mes cerrado como texto JSON, listo para enviarse.
+
+    Se validó con MonthlyReport al generarse (model_dump antes de guardar), así
+    que no se reconstruye el modelo ni se vuelve a serializar. Retorna None si
+    es el mes en curso o no hay reporte guardado.
+    """
+    now = datetime.now(timezone.utc)
+    if month == now.month and year == now.year:
+        return None
+    return ReportRepository(db).get_report_json(user_id, month, year)
+
+
+def _generate_report_from_redis(
+    db: Session, redis_client: Redis, user_id: int, month: int, year: int, cache_closed_days: bool = False
+) -> MonthlyReport | None:
     """
     Genera reporte mensual optimizado (Single Pass).
     Calcula total y desglose diario en una sola iteración para máximo rendimiento.
+
+    `cache_closed_days`: reutiliza los días cerrados cacheados (mes en curso).
     """
     try:
         logger.info(f"📄 Generando reporte optimizado para user {user_id} - {month}/{year}")
@@ -80,8 +101,6 @@ def _generate_report_from_redis(db: Session, redis_client: Redis, user_id: int,
             return None
         
         start_date, end_date = billing_cycle
-        start_ts = int(start_date.timestamp() * 1000)
-        end_ts = int(end_date.timestamp() * 1000)
         
         # 3. Dispositivos activos
         active_devices = [d for d in user.devices if d.dev_status]
@@ -89,51 +108,13 @@ def _generate_report_from_redis(db: Session, redis_client: Redis, user_id: int,
             return None
         
         # =========================================================================
-        # 🚀 LÓGICA OPTIMIZADA: Idéntica al Dashboard + Anti-Huecos
+        # 🚀 Días cerrados desde tbdailyconsumption; crudos solo para los que faltan
         # =========================================================================
-        grand_total_watt_seconds = 0.0 
-        daily_kwh_map = defaultdict(float) 
-        MAX_GAP_SECONDS = 60.0           
-
-        for device in active_devices:
-            watts_key = f"ts:user:{user_id}:device:{device.dev_id}:watts"
-            try:
-                data = redis_client.ts().range(watts_key, start_ts, end_ts)
-                
-                if len(data) < 2:
-                    continue
-
-                # Acumulador temporal para este dispositivo
-                device_watt_seconds = 0.0
-
-                for i in range(1, len(data)):
-                    t0, v0 = data[i-1]
-                    t1, v1 = data[i]
-                    
-                    v0, v1 = float(v0), float(v1)
-                    dt_seconds = (t1 - t0) / 1000.0
-                    
-                    if dt_seconds > MAX_GAP_SECONDS:
-                        continue
-                    
-                    avg_watts = (v0 + v1) / 2.0
-                    
-                    # 1. Sumamos Watt-Segundos (Números grandes = Mejor precisión)
-                    interval_ws = avg_watts * dt_seconds
-                    device_watt_seconds += interval_ws
-                    
-                    # 2. Para el mapa diario, sí convertimos al vuelo (solo es visual)
-                    # Usamos t0 para asignar el día
-                    day_key = datetime.fromtimestamp(t0 / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
-                    daily_kwh_map[day_key] += (interval_ws / 3_600_000.0)
-
-                # Sumamos al gran total de Watt-Segundos
-                grand_total_watt_seconds += device_watt_seconds
-
-            except Exception as e:
-                logger.error(f"Error procesando device {device.dev_id}: {e}")
-
-        grand_total_kwh = grand_total_watt_seconds / 3_600_000.0
+        daily_kwh_map = _get_daily_kwh(
+            db, redis_client, user_id, [d.dev_id for d in active_devices], start_date, end_date,
+            cache_closed_days=cache_closed_days
+        )
+        grand_total_kwh = sum(daily_kwh_map.values())
         logger.info(f"   ⚡ Cálculo de Alta Precisión. Total: {grand_total_kwh:.4f} kWh")
         
         # =========================================================================
@@ -144,8 +125,7 @@ def _generate_report_from_redis(db: Session, redis_client: Redis, user_id: int,
         daily_consumption = []
         current_iter_date = start_date.date()
         while current_iter_date <= end_date.date():
-            date_str = current_iter_date.strftime("%Y-%m-%d")
-            kwh_val = daily_kwh_map.get(date_str, 0.0)
+            kwh_val = daily_kwh_map.get(current_iter_date, 0.0)
             daily_consumption.append(DailyConsumptionPoint(date=current_iter_date, kwh=round(kwh_val, 4)))
             current_iter_date += timedelta(days=1)
 
@@ -178,6 +158,98 @@ def _generate_report_from_redis(db: Session, redis_client: Redis, user_id: int,
         logger.exception(f"Error en reporte optimizado: {e}")
         return None
 
+def _contiguous_runs(days: list) -> list[list]:
+    """Agrupa fechas ordenadas en tramos de días consecutivos."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _get_daily_kwh(
+    db: Session, redis_client: Redis, user_id: int, device_ids: list, start_date, end_date,
+    cache_closed_days: bool = False
+) -> dict:
+    """
+    kWh por día del ciclo (suma de dispositivos).
+
+    Los días cerrados salen de tbdailyconsumption en una consulta indexada. Solo
+    los (dispositivo, día) sin fila (el día en curso, o uno que el job todavía no
+    materializa) se integran desde las lecturas crudas de Redis, con un
+    TS.MRANGE por tramo de días consecutivos.
+
+    Con `cache_closed_days` (reporte del mes en curso) los días cerrados hace más
+    de REPORT_DAY_CACHE_SETTLE_SECONDS se guardan en Redis: en cada consulta
+    solo se calculan hoy y los días que aún no están en cache.
+    """
+    first_day, last_day = start_date.date(), end_date.date()
+    now = datetime.now(timezone.utc)
+    today = now.date()
+
+    day_cache = ReportDayCacheRepository(redis_client) if cache_closed_days else None
+    cached, cache_version = day_cache.get(user_id, first_day, device_ids) if day_cache else ({}, None)
+
+    daily_kwh = defaultdict(float)
+    todo = []
+    day = first_day
+    while day <= min(last_day, today):
+        if day in cached:
+            daily_kwh[day] = cached[day]
+        else:
+            todo.append(day)
+        day += timedelta(days=1)
+
+    if not todo:
+        return dict(daily_kwh)
+
+    # El día en curso nunca está materializado
+    rolled = defaultdict(set)
+    closed_todo = [day for day in todo if day < today]
+    if closed_todo:
+        for row in DailyConsumptionRepository(db).get_range(user_id, closed_todo[0], closed_todo[-1], device_ids):
+            if row.dc_date in cached:
+                continue
+            daily_kwh[row.dc_date] += float(row.dc_kwh)
+            rolled[row.dc_date].add(row.dc_device_id)
+
+    pending = {}
+    for day in todo:
+        missing = set(device_ids) - rolled[day]
+        if missing:
+            pending[day] = missing
+
+    if pending:
+        logger.info(f"   📥 Días sin consumo materializado: {len(pending)} (se leen de Redis)")
+
+    ts_repo = TimeSeriesRepository(redis_client)
+    end_ts = int(end_date.timestamp() * 1000)
+    for run in _contiguous_runs(sorted(pending)):
+        run_devices = sorted(set().union(*(pending[day] for day in run)))
+        # La primera lectura después de medianoche cierra el último intervalo del tramo
+        run_end_ts = day_start_ms(run[-1]) + DAY_MS + int(MAX_GAP_SECONDS * 1000)
+        series = ts_repo.get_user_series(
+            user_id, day_start_ms(run[0]), min(run_end_ts, end_ts), device_ids=run_devices
+        ) or {}
+        for device_id, data in series.items():
+            # Cada intervalo cuenta para el día de su inicio, como en el rollup
+            daily = integrate_samples(data, from_ms=day_start_ms(run[0]), to_ms=day_start_ms(run[-1]) + DAY_MS).daily_kwh
+            for day, kwh in daily.items():
+                if device_id in pending.get(day, ()):
+                    daily_kwh[day] += kwh
+
+    if day_cache:
+        settled_before_ms = int(now.timestamp() * 1000) - settings.REPORT_DAY_CACHE_SETTLE_SECONDS * 1000
+        day_cache.set_many(user_id, first_day, device_ids, {
+            day: daily_kwh.get(day, 0.0)
+            for day in todo if day_start_ms(day) + DAY_MS <= settled_before_ms
+        }, cache_version)
+
+    return dict(daily_kwh)
+
+
 def _calculate_billing_cycle_for_month(billing_day: int, month: int, year: int) -> tuple | None:
     """Calcula las fechas de inicio y fin del ciclo de facturación para un mes específico"""
     try:
@@ -241,76 +313,6 @@ def _generate_header(user, devices, start_date, end_date, month, year) -> Report
     )
 
 
-def _get_daily_consumption_from_redis(redis_client: Redis, user_id: int, devices, start_date, end_date) -> list:
-    """Obtiene el consumo diario de Redis para el periodo especificado"""
-    start_ts = int(start_date.timestamp() * 1000)
-    end_ts = int(end_date.timestamp() * 1000)
-    
-    # Diccionario para acumular mediciones por día
-    daily_measurements = defaultdict(list)
-    
-    # Procesar cada dispositivo
-    for device in devices:
-        watts_key = f"ts:user:{user_id}:device:{device.dev_id}:watts"
-        
-        try:
-            if not redis_client.exists(watts_key):
-                logger.warning(f"Key no existe: {watts_key}")
-                continue
-            
-            # Obtener todos los puntos del periodo
-            data = redis_client.ts().range(watts_key, start_ts, end_ts)
-            logger.info(f"   Device {device.dev_id}: {len(data)} puntos obtenidos")
-            
-            # Agrupar por fecha
-            for ts, value in data:
-                dt = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
-                date_str = dt.strftime("%Y-%m-%d")
-                daily_measurements[date_str].append({
-                    "timestamp": ts,
-                    "watts": float(value)
-                })
-        except Exception as e:
-            logger.error(f"Error obteniendo datos de {watts_key}: {e}")
-            continue
-    
-    # Calcular kWh por día
-    daily_consumption = []
-    current_date = start_date.date()
-    
-    while current_date <= end_date.date():
-        date_str = current_date.strftime("%Y-%m-%d")
-        measurements = daily_measurements.get(date_str, [])
-        
-        if not measurements:
-            kwh = 0.0
-        else:
-            # Calcular kWh usando integración trapezoidal
-            measurements.sort(key=lambda x: x["timestamp"])
-            total_watt_seconds = 0.0
-            
-            for i in range(1, len(measurements)):
-                t0 = measurements[i-1]["timestamp"]
-                t1 = measurements[i]["timestamp"]
-                w0 = measurements[i-1]["watts"]
-                w1 = measurements[i]["watts"]
-                
-                dt_seconds = (t1 - t0) / 1000.0
-                avg_watts = (w0 + w1) / 2.0
-                total_watt_seconds += avg_watts * dt_seconds
-            
-            kwh = total_watt_seconds / 3_600_000.0
-        
-        daily_consumption.append(DailyConsumptionPoint(
-            date=current_date,
-            kwh=round(kwh, 4)
-        ))
-        
-        current_date += timedelta(days=1)
-    
-    return daily_consumption
-
-
 def _generate_consumption_details(daily_consumption: list, start_date, end_date) -> ConsumptionDetails:
     """Genera los detalles de consumo con estadísticas"""
     if not daily_consumption:
@@ -429,47 +431,35 @@ def _calculate_environmental_impact(total_kwh: float) -> EnvironmentalImpact:
 
 
 def _get_month_alerts(db: Session, user_id: int, start_date, end_date) -> list:
-    """Obtiene las alertas del mes"""
+    """Obtiene las alertas del mes (filtradas por fecha en SQL)"""
     alert_repo = AlertRepository(db)
-    alerts = alert_repo.get_alerts_by_user(user_id)
+    alerts = alert_repo.get_alerts_by_user_between(user_id, start_date, end_date)
     
-    # Filtrar alertas del periodo
-    month_alerts = []
-    for alert in alerts:
-        # Asegurar que la fecha tenga timezone UTC
-        alert_date = alert.ale_created_at
-        if not alert_date.tzinfo:
-            alert_date = alert_date.replace(tzinfo=timezone.utc)
-        
-        if start_date <= alert_date <= end_date:
-            month_alerts.append(MonthAlert(
-                date=alert.ale_created_at,
-                title=alert.ale_title,
-                body=alert.ale_body
-            ))
+    month_alerts = [
+        MonthAlert(
+            date=alert.ale_created_at,
+            title=alert.ale_title,
+            body=alert.ale_body
+        )
+        for alert in alerts
+    ]
     
     logger.info(f"   Alertas del mes: {len(month_alerts)}")
     return month_alerts
 
 
 def _get_month_recommendations(db: Session, user_id: int, start_date, end_date) -> list:
-    """Obtiene las recomendaciones del mes"""
+    """Obtiene las recomendaciones del mes (filtradas por fecha en SQL)"""
     rec_repo = RecommendationRepository(db)
-    recommendations = rec_repo.get_recommendations_by_user(user_id)
+    recommendations = rec_repo.get_recommendations_by_user_between(user_id, start_date, end_date)
     
-    # Filtrar recomendaciones del periodo
-    month_recs = []
-    for rec in recommendations:
-        # Asegurar que la fecha tenga timezone UTC
-        rec_date = rec.rec_created_at
-        if not rec_date.tzinfo:
-            rec_date = rec_date.replace(tzinfo=timezone.utc)
-        
-        if start_date <= rec_date <= end_date:
-            month_recs.append(MonthRecommendation(
-                date=rec.rec_created_at,
-                text=rec.rec_text
-            ))
+    month_recs = [
+        MonthRecommendation(
+            date=rec.rec_created_at,
+            text=rec.rec_text
+        )
+        for rec in recommendations
+    ]
     
     logger.info(f"   Recomendaciones del mes: {len(month_recs)}")
-    return month_recs
\ No newline at end of file
+    return month_recs
@@ -6,6 +6,7 @@ from app.repositories import UserRepository
 from app.schemas import UserResponse, UserCreate, UserUpdate
 from passlib.context import CryptContext
 from app.core import logger
+from app.services.device_service import _invalidate_device_cache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -56,6 +57,10 @@ def update_user_service(db: Session, user_id: int, user_data: UserUpdate) -> Use
 
     user = user_repo.update_user_repository(user_id, update_data)
     if user:
+        if "user_billing_day" in update_data:
+            # La ingesta cachea el día de corte junto a cada dispositivo
+            for device in user.devices:
+                _invalidate_device_cache(device.dev_hardware_id)
         logger.info("Usuario actualizado exitosamente en servicio")
         return UserResponse.model_validate(user)
     
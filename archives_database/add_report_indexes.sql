@@ -0,0 +1,8 @@
+-- Índices (usuario, fecha) para las consultas de alertas y recomendaciones
+-- del reporte mensual. Para una base existente; CONCURRENTLY no bloquea las
+-- escrituras (no se puede correr dentro de una transacción).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_user_created
+    ON tbAlerts(ale_user_id, ale_created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_recommendations_user_created
+    ON tbRecommendations(rec_user_id, rec_created_at);
@@ -52,6 +52,8 @@ CREATE TABLE tbAlerts (
     CONSTRAINT fk_alert_user FOREIGN KEY(ale_user_id) REFERENCES tbUsers(user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX idx_alerts_user_created ON tbAlerts(ale_user_id, ale_created_at);
+
 -- 5. NUEVA: Tabla para Recomendaciones de la IA
 CREATE TABLE tbRecommendations (
     rec_id SERIAL PRIMARY KEY,
@@ -62,6 +64,8 @@ CREATE TABLE tbRecommendations (
     CONSTRAINT fk_rec_user_id FOREIGN KEY(rec_user_id) REFERENCES tbUsers(user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX idx_recommendations_user_created ON tbRecommendations(rec_user_id, rec_created_at);
+
 -- 6. NUEVA Y CRÍTICA: Tabla para Tokens de Refresco (Para mantener la sesión abierta)
 CREATE TABLE tbRefreshTokens (
     ref_id SERIAL PRIMARY KEY,
@@ -120,4 +124,27 @@ CREATE TABLE tbMonthlyReports (
         ON DELETE CASCADE,
     CONSTRAINT unique_user_month_year 
         UNIQUE(mr_user_id, mr_month, mr_year)
-);
\ No newline at end of file
+);
+
+CREATE TABLE tbDailyConsumption (
+    dc_id SERIAL PRIMARY KEY,
+    dc_user_id INT NOT NULL,
+    dc_device_id INT NOT NULL,
+    dc_date DATE NOT NULL,
+    dc_kwh DECIMAL(12, 5) NOT NULL DEFAULT 0,
+    dc_peak_watts DECIMAL(10, 2),
+    dc_min_watts DECIMAL(10, 2),
+    dc_sample_count INT NOT NULL DEFAULT 0,
+    dc_gap_seconds INT NOT NULL DEFAULT 0,
+    dc_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    CONSTRAINT fk_daily_consumption_user
+        FOREIGN KEY(dc_user_id)
+        REFERENCES tbUsers(user_id)
+        ON DELETE CASCADE,
+    CONSTRAINT fk_daily_consumption_device
+        FOREIGN KEY(dc_device_id)
+        REFERENCES tbDevice(dev_id)
+        ON DELETE CASCADE,
+    CONSTRAINT unique_daily_consumption
+        UNIQUE(dc_user_id, dc_date, dc_device_id)
+);
@@ -6,4 +6,27 @@ CREATE TABLE tbPasswordResetTokens (
     prt_created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     CONSTRAINT unique_reset_token UNIQUE(prt_token),
     CONSTRAINT fk_reset_token_user FOREIGN KEY(prt_user_id) REFERENCES tbUsers(user_id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+CREATE TABLE tbDailyConsumption (
+    dc_id SERIAL PRIMARY KEY,
+    dc_user_id INT NOT NULL,
+    dc_device_id INT NOT NULL,
+    dc_date DATE NOT NULL,
+    dc_kwh DECIMAL(12, 5) NOT NULL DEFAULT 0,
+    dc_peak_watts DECIMAL(10, 2),
+    dc_min_watts DECIMAL(10, 2),
+    dc_sample_count INT NOT NULL DEFAULT 0,
+    dc_gap_seconds INT NOT NULL DEFAULT 0,
+    dc_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    CONSTRAINT fk_daily_consumption_user
+        FOREIGN KEY(dc_user_id)
+        REFERENCES tbUsers(user_id)
+        ON DELETE CASCADE,
+    CONSTRAINT fk_daily_consumption_device
+        FOREIGN KEY(dc_device_id)
+        REFERENCES tbDevice(dev_id)
+        ON DELETE CASCADE,
+    CONSTRAINT unique_daily_consumption
+        UNIQUE(dc_user_id, dc_date, dc_device_id)
+);
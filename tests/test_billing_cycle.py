@@ -0,0 +1,65 @@
+# tests/test_billing_cycle.py
+
+import calendar
+from datetime import datetime, timezone
+
+import pytest
+
+from app.repositories.timeseries_repository import ENERGY_LUA_FUNCTION
+from app.services.billing_cycle import billing_cycle_start, current_billing_cycle
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("now, billing_day, expected", [
+    (_utc(2026, 5, 20, 15, 30), 10, _utc(2026, 5, 10)),     # Ya pasó el corte
+    (_utc(2026, 5, 10, 0, 0), 10, _utc(2026, 5, 10)),       # El día de corte abre el ciclo
+    (_utc(2026, 5, 9, 23, 59), 10, _utc(2026, 4, 10)),      # Aún no llega: ciclo del mes anterior
+    (_utc(2026, 1, 5), 15, _utc(2025, 12, 15)),             # Cruza de año
+    (_utc(2026, 2, 28, 12), 31, _utc(2026, 2, 28)),         # Mes corto: su último día abre el ciclo
+    (_utc(2026, 2, 27, 12), 31, _utc(2026, 1, 31)),
+    (_utc(2026, 4, 30), 31, _utc(2026, 4, 30)),
+    (_utc(2026, 3, 15), 31, _utc(2026, 2, 28)),             # Ciclo abierto en un mes corto
+    (_utc(2028, 3, 1), 30, _utc(2028, 2, 29)),              # Bisiesto
+    (_utc(2026, 7, 1), 1, _utc(2026, 7, 1)),
+])
+def test_billing_cycle_start(now, billing_day, expected):
+    assert billing_cycle_start(now, billing_day) == expected
+
+
+def test_current_billing_cycle_ends_one_second_before_next_start():
+    start, end = current_billing_cycle(_utc(2026, 5, 20), 10)
+    assert start == _utc(2026, 5, 10)
+    assert end == _utc(2026, 6, 9, 23, 59, 59)
+
+
+@pytest.mark.parametrize("billing_day", [1, 15, 28, 29, 30, 31])
+def test_every_moment_falls_inside_its_cycle(billing_day):
+    for year, month in [(2026, m) for m in range(1, 13)] + [(2028, 2)]:
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            now = _utc(year, month, day, 12)
+            start, end = current_billing_cycle(now, billing_day)
+            assert start <= now <= end, (now, billing_day)
+
+
+def test_lua_copy_matches_python():
+    """El acumulador del ciclo en Redis replica billing_cycle_start en Lua."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    redis_client = fakeredis.FakeRedis()
+    script = redis_client.register_script(
+        ENERGY_LUA_FUNCTION + "\nreturn billing_cycle_start(tonumber(ARGV[1]), tonumber(ARGV[2]))"
+    )
+
+    cases = [
+        (_utc(year, month, day, 6), billing_day)
+        for year in (2026, 2028)
+        for month in range(1, 13)
+        for day in (1, 9, 10, 28, 29, 30, 31) if day <= calendar.monthrange(year, month)[1]
+        for billing_day in (1, 10, 29, 30, 31)
+    ]
+    for now, billing_day in cases:
+        expected = int(billing_cycle_start(now, billing_day).timestamp() * 1000)
+        assert script(args=[int(now.timestamp() * 1000), billing_day]) == expected, (now, billing_day)
@@ -0,0 +1,65 @@
+# tests/test_downsampling.py
+
+import math
+
+import pytest
+
+from app.core.downsampling import lttb
+
+
+def _sine(count: int) -> list:
+    return [(1_000_000 + i * 1000, math.sin(i / 25) * 100) for i in range(count)]
+
+
+def test_short_series_is_returned_unchanged():
+    samples = [(1000, 1), (2000, 2.5), (3000, 3)]
+    assert lttb(samples, 5) == [(1000, 1.0), (2000, 2.5), (3000, 3.0)]
+
+
+def test_threshold_below_three_returns_everything():
+    samples = _sine(10)
+    assert len(lttb(samples, 2)) == 10
+
+
+def test_reduces_to_threshold_and_keeps_endpoints():
+    samples = _sine(1000)
+    result = lttb(samples, 50)
+
+    assert len(result) == 50
+    assert result[0] == samples[0]
+    assert result[-1] == samples[-1]
+
+
+def test_selected_points_come_from_the_series_in_order():
+    samples = _sine(1000)
+    result = lttb(samples, 80)
+
+    assert set(result) <= set(samples)
+    timestamps = [ts for ts, _ in result]
+    assert timestamps == sorted(timestamps) and len(set(timestamps)) == len(timestamps)
+
+
+@pytest.mark.parametrize("threshold", [3, 10, 99])
+def test_spike_is_preserved(threshold):
+    samples = [(i * 1000, 10.0) for i in range(500)]
+    samples[237] = (237 * 1000, 5000.0)
+
+    assert (237 * 1000, 5000.0) in lttb(samples, threshold)
+
+
+def test_peak_and_valley_are_preserved():
+    samples = [(i * 1000, 10.0) for i in range(500)]
+    samples[120] = (120 * 1000, 5000.0)
+    samples[411] = (411 * 1000, -5000.0)
+
+    values = [value for _, value in lttb(samples, 10)]
+
+    assert 5000.0 in values and -5000.0 in values
+
+
+def test_one_point_per_bucket():
+    samples = _sine(102)
+    result = lttb(samples, 12)  # 100 puntos intermedios → 10 buckets de 10
+    for i, (ts, _) in enumerate(result[1:-1]):
+        index = (ts - 1_000_000) // 1000
+        assert 1 + i * 10 <= index < 1 + (i + 1) * 10
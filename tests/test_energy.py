@@ -0,0 +1,115 @@
+# tests/test_energy.py
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.core.energy import DAY_MS, HOUR_MS, MAX_GAP_SECONDS, integrate_energy, integrate_samples, summarize_day
+
+DAY0 = 1_780_012_800_000  # 2026-05-29 00:00 UTC
+DAY0_DATE = date(2026, 5, 29)
+
+
+def _series(start_ms: int, seconds: int, watts: float, step_s: int = 1) -> tuple[list, list]:
+    timestamps = list(range(start_ms, start_ms + seconds * 1000 + 1, step_s * 1000))
+    return timestamps, [watts] * len(timestamps)
+
+
+def test_constant_power_integrates_to_power_times_time():
+    timestamps, watts = _series(DAY0, 3600, 1000.0)
+    result = integrate_energy(timestamps, watts)
+    assert result.total_kwh == pytest.approx(1.0)
+    assert result.daily_kwh == {DAY0_DATE: pytest.approx(1.0)}
+
+
+def test_trapezoid_between_samples():
+    result = integrate_energy([DAY0, DAY0 + 10_000], [0.0, 360.0])
+    assert result.total_kwh == pytest.approx(180.0 * 10 / 3_600_000)
+
+
+def test_gap_longer_than_max_adds_nothing():
+    gap_ms = int((MAX_GAP_SECONDS + 1) * 1000)
+    result = integrate_energy([DAY0, DAY0 + 10_000, DAY0 + 10_000 + gap_ms], [3600.0] * 3)
+    assert result.total_kwh == pytest.approx(3600.0 * 10 / 3_600_000)
+
+
+def test_gap_at_the_limit_still_counts():
+    gap_ms = int(MAX_GAP_SECONDS * 1000)
+    result = integrate_energy([DAY0, DAY0 + gap_ms], [3600.0, 3600.0])
+    assert result.total_kwh == pytest.approx(MAX_GAP_SECONDS / 1000)
+
+
+def test_interval_crossing_midnight_counts_for_its_start_day():
+    result = integrate_energy([DAY0 + DAY_MS - 20_000, DAY0 + DAY_MS + 20_000], [3600.0, 3600.0])
+    assert result.daily_kwh == {DAY0_DATE: pytest.approx(0.04)}
+
+
+def test_fewer_than_two_samples():
+    assert integrate_energy([], []).total_kwh == 0.0
+    assert integrate_energy([DAY0], [100.0]).daily_kwh == {}
+
+
+def test_days_without_energy_are_zero_bins():
+    first, _ = _series(DAY0, 60, 3600.0)
+    second, _ = _series(DAY0 + 2 * DAY_MS, 60, 3600.0)
+    result = integrate_energy(first + second, [3600.0] * (len(first) + len(second)), hourly=True)
+
+    assert list(result.daily_kwh) == [DAY0_DATE, date(2026, 5, 30), date(2026, 5, 31)]
+    assert result.daily_kwh[date(2026, 5, 30)] == 0.0
+    assert len(result.hourly_kwh) == 2 * 24 + 1
+    assert sum(result.hourly_kwh.values()) == pytest.approx(result.total_kwh)
+
+
+def test_requested_range_is_filled_with_zero_bins():
+    timestamps, watts = _series(DAY0 + DAY_MS, 60, 3600.0)
+    result = integrate_energy(timestamps, watts, from_ms=DAY0 - DAY_MS, to_ms=DAY0 + 4 * DAY_MS)
+    assert list(result.daily_kwh.values()) == [0.0, 0.0, pytest.approx(0.06), 0.0, 0.0]
+
+
+def test_empty_series_over_a_range_is_all_zeros():
+    result = integrate_energy([], [], hourly=True, from_ms=DAY0, to_ms=DAY0 + 2 * DAY_MS)
+    assert result.daily_kwh == {DAY0_DATE: 0.0, date(2026, 5, 30): 0.0}
+    assert len(result.hourly_kwh) == 48
+    assert next(iter(result.hourly_kwh)) == datetime(2026, 5, 29, tzinfo=timezone.utc)
+
+
+def test_empty_range_has_no_bins():
+    assert integrate_energy([], [], from_ms=DAY0, to_ms=DAY0).daily_kwh == {}
+
+
+def test_integrate_samples_accepts_ts_range_pairs():
+    samples = [[DAY0 + i * HOUR_MS // 60, 60.0] for i in range(61)]  # 1 h a 60 W, una muestra por minuto
+    result = integrate_samples(samples, max_gap_seconds=120)
+    assert result.total_kwh == pytest.approx(0.06)
+
+
+def test_summarize_day_counts_only_the_day_and_reports_gaps():
+    # Medio día a 1 Hz y 1000 W, luego nada
+    timestamps, watts = _series(DAY0, 12 * 3600, 1000.0)
+    summary = summarize_day(timestamps, watts, DAY0)
+
+    assert summary["kwh"] == pytest.approx(12.0)
+    assert summary["peak_watts"] == summary["min_watts"] == 1000.0
+    assert summary["sample_count"] == len(timestamps)
+    assert summary["gap_seconds"] == 12 * 3600
+
+
+def test_summarize_day_closes_the_last_interval_after_midnight():
+    timestamps = [DAY0 - 10_000, DAY0 + DAY_MS - 30_000, DAY0 + DAY_MS + 30_000]
+    summary = summarize_day(timestamps, [3600.0, 3600.0, 3600.0], DAY0)
+
+    # El intervalo que empieza antes de medianoche del día anterior no cuenta;
+    # el que empieza a las 23:59:30 sí, completo
+    assert summary["kwh"] == pytest.approx(0.06)
+    assert summary["sample_count"] == 1
+
+
+def test_summarize_day_without_samples():
+    summary = summarize_day([], [], DAY0)
+    assert summary == {"kwh": 0.0, "peak_watts": None, "min_watts": None, "sample_count": 0, "gap_seconds": 86400}
+
+
+def test_summarize_day_matches_integrate_energy():
+    timestamps, watts = _series(DAY0 - 3600_000, 30 * 3600, 500.0, step_s=5)
+    daily = integrate_energy(timestamps, watts).daily_kwh
+    assert summarize_day(timestamps, watts, DAY0)["kwh"] == pytest.approx(daily[DAY0_DATE])
@@ -0,0 +1,166 @@
+# tests/test_ingest_buffer.py
+
+import asyncio
+
+import pytest
+
+from app.services import ingest_buffer as buffer_module
+from app.services.ingest_buffer import IngestBuffer
+
+
+def _readings(count: int, device_id: int = 1) -> list:
+    return [
+        {"user_id": 1, "device_id": device_id, "watts": 100.0, "volts": 120.0, "amps": 0.8, "timestamp": 1_000 + i}
+        for i in range(count)
+    ]
+
+
+class FakeTimeSeries:
+    """Sustituye a AsyncTimeSeriesRepository.add_measurements_batch: guarda los lotes en memoria."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.fail = False
+        self.batches = []
+
+    async def add_measurements_batch(self, batch):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Redis caído")
+        self.batches.append(list(batch))
+        return len(batch)
+
+    @property
+    def written(self) -> int:
+        return sum(len(batch) for batch in self.batches)
+
+
+@pytest.fixture
+def timeseries(monkeypatch):
+    fake = FakeTimeSeries()
+
+    async def invalidate_late(repo, measurements, settled_before_ms):
+        return 0
+
+    # Método ligado: la instancia del repositorio no se pasa como argumento
+    monkeypatch.setattr(buffer_module.AsyncTimeSeriesRepository, "add_measurements_batch", fake.add_measurements_batch)
+    monkeypatch.setattr(buffer_module.AsyncHistoryCacheRepository, "invalidate_late", invalidate_late)
+    return fake
+
+
+def test_flush_writes_pending_in_one_batch(timeseries):
+    async def scenario():
+        buffer = IngestBuffer(window_ms=10, max_batch=100, max_pending=1000)
+        await buffer.add(_readings(5, device_id=1))
+        await buffer.add(_readings(3, device_id=2))
+        await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+
+    assert len(timeseries.batches) == 1
+    assert timeseries.written == 8
+    stats = buffer.stats()
+    assert stats["pending"] == 0
+    assert stats["flushes"] == 1
+    assert stats["readings_written"] == 8
+    assert stats["last_batch_size"] == 8
+
+
+def test_add_stamps_readings_without_timestamp(timeseries):
+    async def scenario():
+        buffer = IngestBuffer(window_ms=10, max_batch=100, max_pending=1000)
+        readings = [{"user_id": 1, "device_id": 1, "watts": 1.0, "volts": 1.0, "amps": 1.0} for _ in range(3)]
+        await buffer.add(readings)
+        return readings
+
+    readings = asyncio.run(scenario())
+
+    stamps = [reading["timestamp"] for reading in readings]
+    assert stamps[1] == stamps[0] + 1 and stamps[2] == stamps[0] + 2
+
+
+def test_backpressure_keeps_pending_under_max(timeseries):
+    timeseries.delay = 0.005
+
+    async def scenario():
+        buffer = IngestBuffer(window_ms=20, max_batch=1000, max_pending=40)
+        buffer.start(redis_client=None)
+        peak = 0
+
+        async def producer(device_id: int):
+            nonlocal peak
+            for _ in range(10):
+                await buffer.add(_readings(5, device_id))
+                peak = max(peak, len(buffer._pending))
+
+        await asyncio.gather(*(producer(device_id) for device_id in range(8)))
+        await buffer.stop()
+        return buffer, peak
+
+    buffer, peak = asyncio.run(scenario())
+
+    assert peak <= 40
+    assert timeseries.written == 8 * 10 * 5
+    assert buffer.stats()["readings_failed"] == 0
+
+
+def test_failed_flush_requeues_batch(timeseries):
+    timeseries.fail = True
+
+    async def scenario():
+        buffer = IngestBuffer(window_ms=10, max_batch=100, max_pending=10)
+        await buffer.add(_readings(6))
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+
+    stats = buffer.stats()
+    assert stats["pending"] == 6
+    assert stats["flush_errors"] == 1
+    assert stats["readings_failed"] == 0
+    assert timeseries.written == 0
+
+
+def test_failed_flush_drops_only_what_does_not_fit(timeseries):
+    timeseries.fail = True
+    timeseries.delay = 0.01
+
+    async def scenario():
+        buffer = IngestBuffer(window_ms=10, max_batch=100, max_pending=10)
+        await buffer.add(_readings(8, device_id=1))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)  # El flush ya tomó el lote; llegan más lecturas
+        await buffer.add(_readings(5, device_id=2))
+        with pytest.raises(ConnectionError):
+            await flush
+        return buffer
+
+    buffer = asyncio.run(scenario())
+
+    stats = buffer.stats()
+    assert stats["pending"] == 10
+    assert stats["readings_failed"] == 3
+    # Las lecturas nuevas se conservan completas; se descarta la cola del lote viejo
+    assert [r["device_id"] for r in buffer._pending] == [1] * 5 + [2] * 5
+
+
+def test_stop_writes_in_flight_and_pending_readings(timeseries):
+    timeseries.delay = 0.02
+
+    async def scenario():
+        buffer = IngestBuffer(window_ms=1, max_batch=5, max_pending=1000)
+        buffer.start(redis_client=None)
+        await buffer.add(_readings(5))
+        await asyncio.sleep(0.005)  # Flush del lote lleno en curso
+        await buffer.add(_readings(3, device_id=2))
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+
+    assert not buffer.is_running
+    assert timeseries.written == 8
+    assert buffer.stats()["pending"] == 0
@@ -0,0 +1,56 @@
+# tests/test_reading_timestamp.py
+
+import logging
+
+import pytest
+
+from app.core import settings
+from app.schemas import ShellyIngestData
+from app.services.ingest_service import _reading_timestamp
+
+RECEIVED_AT = 1_780_000_000_000  # ms
+
+
+def _data(unixtime: float | None = None, minute_ts: int | None = None) -> ShellyIngestData:
+    switch = {"id": 0, "apower": 100.0, "voltage": 120.0, "current": 0.8}
+    if minute_ts is not None:
+        switch["aenergy"] = {"total": 10.0, "minute_ts": minute_ts}
+    return ShellyIngestData.model_validate({"switch:0": switch, "sys": {"mac": "A8032AB12345", "unixtime": unixtime}})
+
+
+def test_device_time_is_used_when_in_range():
+    device_ts = RECEIVED_AT - 30_000
+    assert _reading_timestamp(_data(unixtime=device_ts / 1000), RECEIVED_AT) == (True, device_ts)
+
+
+def test_late_reading_inside_window_keeps_its_time():
+    device_ts = RECEIVED_AT - (settings.INGEST_MAX_LATE_SECONDS - 60) * 1000
+    assert _reading_timestamp(_data(unixtime=device_ts / 1000), RECEIVED_AT) == (True, device_ts)
+
+
+def test_reading_older_than_late_window_is_rejected():
+    device_ts = RECEIVED_AT - (settings.INGEST_MAX_LATE_SECONDS + 1) * 1000
+    assert _reading_timestamp(_data(unixtime=device_ts / 1000), RECEIVED_AT) == (False, None)
+
+
+def test_clock_ahead_falls_back_to_arrival_time():
+    device_ts = RECEIVED_AT + (settings.INGEST_MAX_CLOCK_SKEW_SECONDS + 1) * 1000
+    assert _reading_timestamp(_data(unixtime=device_ts / 1000), RECEIVED_AT) == (True, None)
+
+
+def test_small_clock_lead_is_tolerated():
+    device_ts = RECEIVED_AT + 5_000
+    assert _reading_timestamp(_data(unixtime=device_ts / 1000), RECEIVED_AT) == (True, device_ts)
+
+
+def test_without_device_time_uses_arrival_time():
+    assert _reading_timestamp(_data(), RECEIVED_AT) == (True, None)
+
+
+@pytest.mark.parametrize("offset_s, warns", [(-10, False), (-90, False), (-3600, True), (3600, True)])
+def test_minute_ts_is_only_a_clock_check(caplog, offset_s, warns):
+    """Todas las lecturas de un minuto traen el mismo minute_ts: nunca es la hora de la muestra."""
+    minute_ts = (RECEIVED_AT // 1000 + offset_s) // 60 * 60
+    with caplog.at_level(logging.WARNING, logger="ecowatt"):
+        assert _reading_timestamp(_data(minute_ts=minute_ts), RECEIVED_AT) == (True, None)
+    assert ("minute_ts" in caplog.text) == warns